@@ -6,7 +6,7 @@ from brush_manager.globals import GLOBALS
 
 from brush_manager.data.addon_data import callback__AddonDataSave, callback__AddonDataInit, callback__AddonDataLoad
 from brush_manager.data.cats import callback__CatsAdd, callback__CatsRemove
-from brush_manager.data.items import callback__ItemsAdd, callback__ItemsRemove, callback__ItemsMovePre, callback__ItemsMovePost
+from brush_manager.data.items import callback__ItemsAdd, callback__ItemsAddBatch, callback__ItemsRemove, callback__ItemsMovePre, callback__ItemsMovePost, callback__ItemsUpdate
 
 import brush_manager.ops as bm_ops
 
@@ -15,6 +15,7 @@ BM_UI = bm_types.UIProps
 BM_DATA = bm_types.AddonData # Utility like the 
 
 get_bm_data = bm_types.AddonData.get_data_by_context
+get_bm_item = bm_types.AddonData.get_item # Item by UUID, from any category.
 
 
 
@@ -30,9 +31,11 @@ class BM_SUB:
 
     class Items:
         ADD = callback__ItemsAdd
+        ADD_BATCH = callback__ItemsAddBatch # Items imported from a library.
         REMOVE = callback__ItemsRemove
         MOVE_PRE = callback__ItemsMovePre
         MOVE_POST = callback__ItemsMovePost
+        UPDATE = callback__ItemsUpdate # Item was renamed, selected...
 
 
 class BM_OPS:
@@ -78,6 +81,19 @@ class BM_OPS:
     def clear_data():
         bm_ops.ClearData.run('EXEC_DEFAULT')
 
+    @staticmethod
+    def search_items(
+                     query: str,
+                     limit: int = 50,
+                     ui_context_mode: str = '',
+                     ui_context_item: str = '',
+                     wait: bool = False) -> list[bm_types.BrushItem | bm_types.TextureItem]:
+        ''' Brushes and textures (or only the ones of 'ui_context_item': 'BRUSH' or 'TEXTURE')
+            from every category, whose name, type or tags match the query. Best matches first.
+            Items are indexed in the background the first time, use 'wait' to index all of them first. '''
+        addon_data = get_bm_data(ui_context_mode if ui_context_mode else None)
+        return addon_data.search_items(query, limit=limit, item_type=ui_context_item, wait=wait)
+
     # ------------------------------------------------------
 
     @staticmethod
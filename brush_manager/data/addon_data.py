@@ -12,6 +12,11 @@ from brush_manager.pg.pg_ui import UIProps
 from brush_manager.paths import Paths
 from .cats import Category, BrushCat, TextureCat, BrushCat_Collection, TextureCat_Collection
 from .items import BrushItem, TextureItem
+from .item_index import ItemIndex
+from .search import SearchIndex
+from .save_scheduler import save_scheduler
+from .store import DataStore
+from .records import conform_active_item
 
 from brush_manager.globals import GLOBALS, CM_UIContext
 from ..utils.callback import CallbackSetCollection
@@ -42,9 +47,14 @@ def init_load_defaults(addon_data: 'AddonDataByMode'):
 
     from ..api import BM_OPS
     from ..paths import Paths
+    from ..ops.op_library_actions import get_import_job
     BM_OPS.import_library_default(libpath=Paths.Lib.DEFAULT_BLEND(), ui_context_mode=addon_data.mode)
 
-    callback__AddonDataInit(addon_data)
+    # The import runs in the background, data is initialized once it finishes.
+    if job := get_import_job(Paths.Lib.DEFAULT_BLEND(), addon_data):
+        job.on_finish.append(partial(callback__AddonDataInit, addon_data))
+    else:
+        callback__AddonDataInit(addon_data)
 
 
 
@@ -59,44 +69,56 @@ class AddonDataByMode(object):
             #### print(f"[brush_manager] Loaded BM_DATA.{data.mode}@[{id(data)}] from cache")
             return data
 
-        # Try to load data from file.
-        data_filepath: Path = DataPath / mode_name
+        # Try to load data from the store.
+        store = DataStore(mode_name)
 
-        if not data_filepath.exists() or data_filepath.stat().st_size == 0:
-            print(f"[brush_manager] BM_DATA.{mode_name} not found in path: '{str(data_filepath)}'")
-            _addon_data_cache[mode_name] = data = cls(mode_name)
-        else:
-            with data_filepath.open('rb') as data_file:
+        # Data from older versions was pickled as a whole into a single file.
+        legacy_filepath: Path = DataPath / mode_name
+
+        if store.exists:
+            _addon_data_cache[mode_name] = data = cls(mode_name, init_defaults=False)
+            data.store = store
+            store.load(data)
+            print(f"[brush_manager] Loaded BM_DATA.{mode_name}@[{id(data)}] from store: '{str(store.path)}'")
+            callback__AddonDataLoad(data)
+
+        elif legacy_filepath.exists() and legacy_filepath.stat().st_size != 0:
+            with legacy_filepath.open('rb') as data_file:
                 data: AddonDataByMode = pickle.load(data_file)
+                data.store = store
                 data.ensure_owners()
+                data._active_brush = conform_active_item(data._active_brush, data.brush_cats.cats)
+                data._active_texture = conform_active_item(data._active_texture, data.texture_cats.cats)
                 _addon_data_cache[mode_name] = data
-            print(f"[brush_manager] Loaded BM_DATA.{mode_name}@[{id(data)}] from file: '{str(data_filepath)}'")
+            print(f"[brush_manager] Loaded BM_DATA.{mode_name}@[{id(data)}] from file: '{str(legacy_filepath)}'")
+            # Move it to the new store.
+            store.compact(data, full=True)
+            legacy_filepath.rename(legacy_filepath.with_name(mode_name + '.legacy'))
             callback__AddonDataLoad(data)
+
+        else:
+            print(f"[brush_manager] BM_DATA.{mode_name} not found in path: '{str(store.path)}'")
+            _addon_data_cache[mode_name] = data = cls(mode_name)
         return data
 
 
     def save(self, save_items_id_data: bool = True) -> None:
-        data_filepath: Path = DataPath / self.mode
-
-        print(f"[brush_manager] Saving BM_DATA.{self.mode}@[{id(self)}] to file: '{data_filepath}'")
-
+        ''' Save right away. See 'schedule_save' to save in the background. '''
         if save_items_id_data:
-            for cat in self.brush_cats:
-                for item in cat.items:
-                    item.save()
+            # Only the items whose datablocks changed.
+            save_scheduler.enqueue_changes(self)
+            save_scheduler.flush()
+        self.commit()
 
-            for cat in self.texture_cats:
-                for item in cat.items:
-                    item.save()
+    def schedule_save(self) -> None:
+        ''' Save the items whose datablocks changed, and then the data, in timer steps. '''
+        save_scheduler.schedule(self)
 
-        # Avoid multiple references to objects since pickle doesn't work really well with that.
-        self.clear_owners()
+    def commit(self) -> None:
+        print(f"[brush_manager] Saving BM_DATA.{self.mode}@[{id(self)}] to store: '{str(self.store.path)}'")
 
-        with data_filepath.open('wb') as data_file:
-            pickle.dump(self, data_file)
-
-        # Restore references...
-        self.ensure_owners()
+        # Only what changed since the last save is written.
+        self.store.commit(self)
 
         callback__AddonDataSave(self)
 
@@ -108,15 +130,23 @@ class AddonDataByMode(object):
     def ensure_owners(self) -> None:
         self.brush_cats.ensure_owners(self)
         self.texture_cats.ensure_owners(self)
+        self.item_index = ItemIndex(self)
+        self.item_index.rebuild()
+        if (search_index := getattr(self, 'search_index', None)) is not None:
+            search_index.clear()
+        self.search_index = SearchIndex(self)
 
 
     # ----------------------------------------------------------------
     # Initializing data and properties.
 
     mode: ContextModes
+    store: DataStore
+    item_index: ItemIndex
+    search_index: SearchIndex
 
-    brush_cats:     BrushCat_Collection     # OrderedDict[BrushCat]
-    texture_cats:   TextureCat_Collection   # OrderedDict[TextureCat]
+    brush_cats:     BrushCat_Collection     # IndexedDict[BrushCat]
+    texture_cats:   TextureCat_Collection   # IndexedDict[TextureCat]
 
     ## brushes: BrushItem_Collection
     ## textures: TextureItem_Collection
@@ -129,27 +159,27 @@ class AddonDataByMode(object):
     def active_brush(self) -> BrushItem | None:
         if self._active_brush is None:
             return None
-        cat_id, brush_id = self._active_brush
-        if cat := self.brush_cats.get(cat_id):
-            return cat.items.get(brush_id)
+        _cat_id, brush_id = self._active_brush
+        return self.item_index.get(brush_id)
 
     @property
     def active_texture(self) -> TextureItem | None:
         if self._active_texture is None:
             return None
-        cat_id, texture_id = self._active_texture
-        if cat := self.texture_cats.get(cat_id):
-            return cat.items.get(texture_id)
+        _cat_id, texture_id = self._active_texture
+        return self.item_index.get(texture_id)
 
 
     @active_brush.setter
     def active_brush(self, brush_item: BrushItem) -> None:
-        self._active_brush = brush_item.uuid, brush_item.cat_id
+        self._active_brush = brush_item.cat_id, brush_item.uuid
+        self.store.tag_meta()
         brush_item.set_active(bpy.context)
 
     @active_texture.setter
     def active_texture(self, texture_item: TextureItem) -> None:
-        self._active_texture = texture_item.uuid, texture_item.cat_id
+        self._active_texture = texture_item.cat_id, texture_item.uuid
+        self.store.tag_meta()
         texture_item.set_active(bpy.context)
 
 
@@ -174,13 +204,16 @@ class AddonDataByMode(object):
         cat_coll.select(cat)
 
 
-    def __init__(self, mode: str) -> None:
+    def __init__(self, mode: str, init_defaults: bool = True) -> None:
         print(f"[brush_manager] New BM_DATA.{mode}@[{id(self)}]")
 
         self.mode = mode
+        self.store = DataStore(mode)
+        self.item_index = ItemIndex(self)
+        self.search_index = SearchIndex(self)
 
-        self.brush_cats     = BrushCat_Collection(self)   # OrderedDict()
-        self.texture_cats   = TextureCat_Collection(self) # OrderedDict()
+        self.brush_cats     = BrushCat_Collection(self)   # IndexedDict()
+        self.texture_cats   = TextureCat_Collection(self) # IndexedDict()
 
         self._active_brush = None
         self._active_texture = None
@@ -188,7 +221,8 @@ class AddonDataByMode(object):
         ## self.brushes = BrushItem_Collection(self) # OrderedDict
         ## self.textures = TextureItem_Collection(self)
 
-        timer_register(partial(init_load_defaults, self))
+        if init_defaults:
+            timer_register(partial(init_load_defaults, self))
 
 
     def add_bl_texture(self, context, bl_texture: BlTexture, set_active: bool = False) -> TextureItem:
@@ -208,6 +242,24 @@ class AddonDataByMode(object):
     # ----------------------------------------------------------------
     # Local Methods (per context mode).
 
+    def get_item(self, item_uuid: str) -> BrushItem | TextureItem | None:
+        ''' Brush or texture item from any category. '''
+        return self.item_index.get(item_uuid)
+
+    def search_items(self, query: str, limit: int = 50, item_type: str = '', wait: bool = False) -> list[BrushItem | TextureItem]:
+        ''' Brushes and/or textures ('BRUSH', 'TEXTURE' or '' for both) from any category,
+            whose name, type or tags match the query. Best matches first.
+            The first search starts indexing the items in the background, meanwhile only the ones
+            indexed so far are found, unless 'wait' is enabled. '''
+        search_index = self.search_index
+        if wait:
+            search_index.finish()
+        else:
+            search_index.start()
+        # NOTE: only the categories of the found items are loaded.
+        get_item = self.item_index.get
+        return [item for uuid in search_index.search(query, limit=limit, kind=item_type) if (item := get_item(uuid)) is not None]
+
     def get_cats(self, skip_active: bool = False) -> list[Category]:
         cat_coll = self.brush_cats if GLOBALS.ui_context_item == 'BRUSH' else self.texture_cats
         if skip_active:
@@ -300,10 +352,20 @@ class AddonData:
             raise ValueError(f"Invalid mode! Expected: {VALID_CONTEXT_MODES}; But got: {mode}")
         return AddonDataByMode.get_data(mode=mode)
 
+    @classmethod
+    def get_item(cls, item_uuid: str, ctx: Context | UIProps | str | None = None) -> BrushItem | TextureItem | None:
+        ''' Brush or texture item from any category of the context mode. '''
+        if addon_data := cls.get_data_by_context(ctx):
+            return addon_data.get_item(item_uuid)
+        return None
+
     @staticmethod
-    def save_all(save_items_id_data: bool = True) -> None:
+    def save_all(save_items_id_data: bool = True, background: bool = False) -> None:
         for data in _addon_data_cache.values():
-            data.save(save_items_id_data=save_items_id_data)
+            if background and save_items_id_data:
+                data.schedule_save()
+            else:
+                data.save(save_items_id_data=save_items_id_data)
 
 
 # ----------------------------------------------------------------
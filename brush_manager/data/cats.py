@@ -1,9 +1,11 @@
-from collections import OrderedDict
 from typing import Iterator
 
+from brush_manager.icons import prefetch_previews, pin_icons
 from .common import IconHolder, IconPath
 from .items import Item, BrushItem, TextureItem, BrushItem_Collection, TextureItem_Collection, Item_Collection
 from ..utils.callback import CallbackSetCollection
+from ..utils.indexed_dict import IndexedDict
+from ..utils.sortedcontainers import SortedDict
 
 # ----------------------------------------------------------------
 # Category Types.
@@ -14,30 +16,96 @@ callback__CatsRemove = CallbackSetCollection.init('Category_Collection', 'cats.r
 
 class Category(IconHolder):
     # Internal props.
-    owner: object # 'AddonDataByMode'
-    items: Item_Collection # OrderedDict[str, Item]
+    cat_type: str = ''
+    owner: object # 'Cat_Collection'
+    items: Item_Collection # IndexedDict[str, Item]
 
     flags: set
 
     # User properties.
-    fav: bool
+    _fav: bool = False
 
     @property
     def collection(self) -> 'Cat_Collection':
         return self.owner
 
+    @property
+    def fav(self) -> bool:
+        return self._fav
+
+    @fav.setter
+    def fav(self, state: bool) -> None:
+        state = bool(state)
+        if state != self._fav:
+            self._fav = state
+            if self.owner is not None:
+                self.collection._update_flags(self)
+
+    @property
+    def store(self):
+        ''' DataStore of the context mode this category belongs to. '''
+        if self.owner is not None:
+            return self.owner.store
+
+    @property
+    def items(self) -> Item_Collection:
+        if self._items is None:
+            # Items are loaded from the store the first time they are needed.
+            self.store.load_items(self)
+        return self._items
+
+    @items.setter
+    def items(self, item_collection: Item_Collection) -> None:
+        self._items = item_collection
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._items is not None
+
     def __init__(self, name: str) -> None:
         super().__init__(name)
         self.flags = set()
 
+    def __getstate__(self) -> dict:
+        # Items and owner are stored apart.
+        state = self.__dict__.copy()
+        state.pop('owner', None)
+        state.pop('_items', None)
+        state['fav'] = state.pop('_fav', False)
+        # Slots of IdHolder.
+        state['uuid'] = self.uuid
+        state['name'] = self.name
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        # Data from older versions kept the items in the category state.
+        if 'items' in state:
+            state['_items'] = state.pop('items')
+        state['_fav'] = state.pop('fav', False)
+        self.uuid = state.pop('uuid')
+        self.name = state.pop('name')
+        self.__dict__.update(state)
+
     def __del__(self) -> None:
-        del self.items
+        self._items = None
         self.owner = None
 
 
     def set_active(self):
         self.collection.select(self)
 
+    def tag_dirty(self) -> None:
+        ''' Mark the category to be written on the next save. '''
+        if store := self.store:
+            store.tag_cat(self)
+
+    def prefetch_icons(self) -> None:
+        ''' Load the icons of the items in the background, before they are drawn,
+            and keep them in memory while this category is active. '''
+        icons = [(item.uuid, item.icon_filepath) for item in self.items]
+        pin_icons(uuid for uuid, _filepath in icons)
+        prefetch_previews(icons)
+
 
     def save_default(self, compress: bool = True) -> None:
         for item in self.items:
@@ -59,8 +127,9 @@ class Category(IconHolder):
 
 
 class BrushCat(Category):
+    cat_type: str = 'BRUSH'
     icon_path: IconPath = IconPath.CAT_BRUSH
-    items: BrushItem_Collection # OrderedDict[str, BrushItem]
+    items: BrushItem_Collection # IndexedDict[str, BrushItem]
 
     def __init__(self, name: str) -> None:
         super().__init__(name)
@@ -68,8 +137,9 @@ class BrushCat(Category):
 
 
 class TextureCat(Category):
+    cat_type: str = 'TEXTURE'
     icon_path: IconPath = IconPath.CAT_TEXTURE
-    items: TextureItem_Collection # OrderedDict[str, TextureItem]
+    items: TextureItem_Collection # IndexedDict[str, TextureItem]
 
     def __init__(self, name: str) -> None:
         super().__init__(name)
@@ -81,17 +151,29 @@ class TextureCat(Category):
 
 class Cat_Collection:
     active: Category
-    cats: OrderedDict[str, Category]
+    cats: IndexedDict[str, Category]
     owner: object
 
+    # Favourite categories, by their sequence number in 'cats' (so they keep the collection order).
+    _favs: SortedDict # [int, Category]
+
     @property
     def count(self) -> int:
         return len(self.cats)
 
+    @property
+    def store(self):
+        if self.owner is not None:
+            return self.owner.store
+
     # - Fav ___________________________
     @property
-    def favs(self):
-        return [cat for cat in self.cats.values() if cat.fav]
+    def favs(self) -> list[Category]:
+        return list(self._favs.values())
+
+    @property
+    def fav_count(self) -> int:
+        return len(self._favs)
 
     # - Active ___________________________
     @property
@@ -110,14 +192,26 @@ class Cat_Collection:
         if not isinstance(cat, (str, Category)):
             raise TypeError("Expected a Category instance or a string (uuid)")
         self._active = cat if isinstance(cat, str) else cat.uuid
+        if store := self.store:
+            store.tag_meta()
 
     # - Collection class methods ___________________________
     def __init__(self, addon_data_by_mode) -> None:
-        self.cats = OrderedDict()
+        self.cats = IndexedDict()
+        self._favs = SortedDict()
         self._active = ''
         self._selected_items: list[str] = []
         self.owner = addon_data_by_mode
 
+    def __setstate__(self, state: dict) -> None:
+        # Data from older versions kept the categories in an OrderedDict.
+        cats = state.pop('cats')
+        self.__dict__.update(state)
+        self.cats = IndexedDict()
+        self._favs = SortedDict()
+        for cat in cats.values():
+            self._link(cat)
+
     def __iter__(self) -> Iterator[Category]:
         return iter(self.cats.values())
 
@@ -128,9 +222,28 @@ class Cat_Collection:
             index: int = uuid_or_index
             if index < 0 or index >= len(self.cats):
                 return None
-            return list(self.cats.values())[index]
+            return self.cats.value_at(index)
         raise TypeError("Expected int (index) or string (uuid)")
 
+    def _link(self, cat: Category) -> None:
+        self.cats[cat.uuid] = cat
+        self._update_flags(cat)
+
+    def _unlink(self, uuid: str) -> Category:
+        self._favs.pop(self.cats.seq(uuid), None)
+        return self.cats.pop(uuid)
+
+    def _update_flags(self, cat: Category) -> None:
+        ''' Keep the favourite set in sync with the category toggle. '''
+        if self.cats.get(cat.uuid) is not cat:
+            # Not linked yet, will be updated by '_link'.
+            return
+        seq = self.cats.seq(cat.uuid)
+        if cat.fav:
+            self._favs[seq] = cat
+        else:
+            self._favs.pop(seq, None)
+
     def get(self, uuid: str) -> Category | None:
         ''' Wrapper for __getitem__ method. '''
         return self[uuid]
@@ -140,35 +253,46 @@ class Cat_Collection:
             return self.select(cat.uuid)
         if isinstance(cat, int):
             index: int = cat
-            return self.select(list(self.cats.keys())[index])
-        if isinstance(cat, str) and cat in self.cats:
+            return self.select(self.cats.key_at(index))
+        if isinstance(cat, str) and cat in self.cats and cat != self._active:
             self._active = cat
+            if store := self.store:
+                store.tag_meta()
+            self.cats[cat].prefetch_icons()
 
     def add(self, name: str, _type = Category, custom_uuid: str | None = None) -> Category:
         cat = _type(name)
         if custom_uuid is not None and isinstance(custom_uuid, str) and custom_uuid != '':
             cat.uuid = custom_uuid
-        self.cats[cat.uuid] = cat
         cat.owner = self
+        self._link(cat)
         cat.set_active()
+        cat.tag_dirty()
         callback__CatsAdd(cat)
         return cat
 
     def remove(self, uuid_or_index: int | str | Category) -> None:
         if isinstance(uuid_or_index, str):
             if uuid_or_index in self.cats:
-                callback__CatsRemove(self.cats[uuid_or_index])
-                del self.cats[uuid_or_index]
+                cat = self.cats[uuid_or_index]
+                callback__CatsRemove(cat)
+                if store := self.store:
+                    store.tag_cat_removed(cat)
+                # Items of a category that was never loaded still own files to be removed.
+                cat.items.clear()
+                del cat
+                self._unlink(uuid_or_index)
             return
         if isinstance(uuid_or_index, Category):
             return self.remove(uuid_or_index.uuid)
         if isinstance(uuid_or_index, int):
             index: int = uuid_or_index
-            return self.remove(list(self.cats.keys())[index])
+            return self.remove(self.cats.key_at(index))
         raise TypeError("Expected int (index) or string (uuid)")
 
     def clear(self) -> None:
         self.cats.clear()
+        self._favs.clear()
         self.active = None
 
     def __del__(self) -> None:
@@ -193,7 +317,7 @@ class Cat_Collection:
 
 class BrushCat_Collection(Cat_Collection):
     active: BrushCat
-    cats: OrderedDict[str, BrushCat]
+    cats: IndexedDict[str, BrushCat]
 
     def get(self, uuid_or_index: str | int) -> BrushCat | None: return super().get(uuid_or_index)
     def add(self, name: str, custom_uuid: str | None = None) -> BrushCat: return super().add(name, BrushCat, custom_uuid=custom_uuid)
@@ -201,7 +325,7 @@ class BrushCat_Collection(Cat_Collection):
 
 class TextureCat_Collection(Cat_Collection):
     active: TextureCat
-    cats: OrderedDict[str, TextureCat]
+    cats: IndexedDict[str, TextureCat]
 
     def get(self, uuid_or_index: str | int) -> TextureCat | None: return super().get(uuid_or_index)
     def add(self, name: str, custom_uuid: str | None = None) -> TextureCat: return super().add(name, TextureCat, custom_uuid=custom_uuid)
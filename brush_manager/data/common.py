@@ -4,6 +4,8 @@ from gpu.types import GPUTexture
 from bpy.props import StringProperty
 
 from enum import Enum, auto
+from sys import intern
+from typing import Iterable
 from uuid import uuid4
 
 from brush_manager.paths import Paths
@@ -41,7 +43,43 @@ def ensure_temp_property(context: Context, item: 'IconHolder', attr: str):
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 
+# Tags of the items, as bits of their 'flags' mask (see 'Item.flags').
+_flag_bits: dict[str, int] = {}
+_flag_names: list[str] = []
+
+
+def get_flag_bit(flag: str) -> int:
+    if (bit := _flag_bits.get(flag)) is None:
+        bit = _flag_bits[flag] = 1 << len(_flag_names)
+        _flag_names.append(intern(flag))
+    return bit
+
+
+def flags_to_mask(flags: Iterable[str]) -> int:
+    mask = 0
+    for flag in flags:
+        mask |= get_flag_bit(flag)
+    return mask
+
+
+def mask_to_flags(mask: int) -> frozenset[str]:
+    flags = []
+    while mask:
+        bit = mask & -mask
+        flags.append(_flag_names[bit.bit_length() - 1])
+        mask ^= bit
+    return frozenset(flags)
+
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
 class IdHolder:
+    # NOTE: slotted so items can be too, categories still have a '__dict__'.
+    __slots__ = ('uuid', 'name')
+
     # Internal props.
     uuid: str
 
@@ -61,6 +99,8 @@ class IdHolder:
 
 
 class IconHolder(IdHolder):
+    __slots__ = ()
+
     icon_path: IconPath = None
 
     @property
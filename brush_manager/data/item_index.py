@@ -0,0 +1,54 @@
+from typing import Iterator
+
+from .items import Item
+
+
+class ItemIndex:
+    ''' UUID -> Item of every category of a context mode.
+        Item collections keep it updated as items are added, moved or removed. '''
+    owner: object # AddonDataByMode
+
+    def __init__(self, addon_data) -> None:
+        self.owner = addon_data
+        self._items: dict[str, Item] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Item]:
+        ''' Only the items of the categories that are loaded. '''
+        return iter(self._items.values())
+
+    def get(self, uuid: str, load: bool = True) -> Item | None:
+        ''' With 'load' disabled, items of categories that were not loaded are not found. '''
+        if item := self._items.get(uuid):
+            return item
+        # The item may be in a category whose items were not loaded yet.
+        addon_data = self.owner
+        if not load or addon_data is None or (cat_key := addon_data.store.find_unloaded_item(uuid)) is None:
+            return None
+        cat_type, cat_uuid = cat_key
+        cat_coll = addon_data.brush_cats if cat_type == 'BRUSH' else addon_data.texture_cats
+        if cat := cat_coll.get(cat_uuid):
+            # Loading the items links them to the index.
+            cat.items
+        return self._items.get(uuid)
+
+    def add(self, item: Item) -> None:
+        self._items[item.uuid] = item
+
+    def discard(self, item: Item) -> None:
+        if self._items.get(item.uuid) is item:
+            del self._items[item.uuid]
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def rebuild(self) -> None:
+        ''' Index the items of the loaded categories from scratch. '''
+        self._items.clear()
+        for cat_coll in (self.owner.brush_cats, self.owner.texture_cats):
+            for cat in cat_coll:
+                if cat.is_loaded:
+                    for item in cat.items:
+                        self.add(item)
@@ -1,41 +1,101 @@
 import bpy
 from bpy.types import ID, Brush as BlBrush, Texture as BlTexture, ImageTexture as BlImageTexture, Context
 
-from collections import OrderedDict
 from shutil import copyfile
-from typing import Iterator
+from sys import intern
+from typing import Iterator, Iterable
 from os.path import exists
 
 from brush_manager.paths import Paths
-from .common import IconHolder, IconPath
+from brush_manager.utils.cas import release_blob_ref
+from brush_manager.icons import tag_icon_file
+from brush_manager.rna_sub import dirty_tracker
+from .common import IconHolder, IconPath, get_flag_bit, flags_to_mask, mask_to_flags
 from brush_manager.utils.tool_settings import get_ts, get_ts_brush, get_ts_brush_texture_slot, set_ts_brush
 from ..utils.callback import CallbackSetCollection
+from ..utils.indexed_dict import IndexedDict
+from ..utils.sortedcontainers import SortedDict
 
 
 callback__ItemsAdd = CallbackSetCollection.init('Item_Collection', 'items.add')
+callback__ItemsAddBatch = CallbackSetCollection.init('Item_Collection', 'items.add(batch)')
 callback__ItemsRemove = CallbackSetCollection.init('Item_Collection', 'items.remove')
 callback__ItemsMovePre = CallbackSetCollection.init('Item_Collection', 'items.move(pre)')
 callback__ItemsMovePost = CallbackSetCollection.init('Item_Collection', 'items.move(post)')
+callback__ItemsUpdate = CallbackSetCollection.init('Item_Collection', 'items.update') # Item data changed (eg. renamed, selected).
 
 
 class Item(IconHolder):
+    # Items have a fixed set of attributes and no '__dict__', as there can be many thousands of them.
+    __slots__ = ('owner', 'type', '_flags', '_fav', '_select')
+
     # Internal props.
     lib_path: Paths.Data
     owner: object # 'Category'
 
     # Toggles.
-    fav: bool
-    select: bool
-    flags: set
+    _fav: bool
+    _select: bool
+    # Tags, as a mask of bits (see 'common.get_flag_bit').
+    _flags: int
 
     # Item data.
-    type: str
+    type: str # Interned, many items share it.
+
+    # Keys of the states pickled by older versions.
+    _state_keys = frozenset({'owner', 'uuid', 'name', 'type', 'flags', 'fav', 'select'})
+    # Renamed keys, old -> current.
+    _legacy_state_keys = {'_fav': 'fav', '_select': 'select', '_texture': 'texture'}
+    # Keys that are not used anymore.
+    _obsolete_state_keys = frozenset({'texture_uuid'})
 
 
     @property
     def id_data(self) -> ID:
         return None
 
+    @property
+    def fav(self) -> bool:
+        return self._fav
+
+    @fav.setter
+    def fav(self, state: bool) -> None:
+        state = bool(state)
+        if state != self._fav:
+            self._fav = state
+            if self.owner is not None:
+                self.collection._update_flags(self)
+
+    @property
+    def select(self) -> bool:
+        return self._select
+
+    @select.setter
+    def select(self, state: bool) -> None:
+        state = bool(state)
+        if state != self._select:
+            self._select = state
+            if self.owner is not None:
+                self.collection._update_flags(self)
+
+    @property
+    def flags(self) -> frozenset[str]:
+        return mask_to_flags(self._flags)
+
+    @flags.setter
+    def flags(self, flags: Iterable[str]) -> None:
+        self._flags = flags_to_mask(flags)
+
+    def has_flag(self, flag: str) -> bool:
+        return bool(self._flags & get_flag_bit(flag))
+
+    def set_flag(self, flag: str, state: bool = True) -> None:
+        bit = get_flag_bit(flag)
+        flags = self._flags | bit if state else self._flags & ~bit
+        if flags != self._flags:
+            self._flags = flags
+            self.tag_dirty()
+
     @property
     def collection(self) -> 'BrushItem_Collection':
         return self.owner
@@ -51,24 +111,74 @@ class Item(IconHolder):
     def cat_id(self) -> str:
         return self.cat.uuid
 
+    @property
+    def store(self):
+        ''' DataStore of the context mode this item belongs to. '''
+        if self.owner is not None:
+            return self.collection.store
+
     def __init__(self, collection: 'Item_Collection', name: str, **kwargs) -> None:
         #### print("New", type(self), "Item")
         #### print("\t> name:", name)
         super().__init__(name)
         self.owner = collection
 
-        self.fav = False
-        self.select = False
-        self.flags = set()
+        self.type = ''
+        self._flags = 0
+        self._fav = False
+        self._select = False
 
         # Custom Data.
         for key, value in kwargs.items():
             setattr(self, key, value)
             #### print(f"\t> {key}: {value}")
+        self.type = intern(self.type)
+
+    def __getstate__(self) -> dict:
+        return {
+            'uuid': self.uuid,
+            'name': self.name,
+            'type': self.type,
+            'flags': set(self.flags),
+            'fav': self._fav,
+            'select': self._select,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        # NOTE: data pickled by older versions has more (or less) attributes.
+        self._load_state(self._conform_state(state))
+
+    @classmethod
+    def _conform_state(cls, state: dict) -> dict:
+        ''' State pickled by any version, with the keys of the current one. '''
+        state = {cls._legacy_state_keys.get(key, key): value for key, value in state.items()}
+        if unknown_keys := state.keys() - cls._state_keys - cls._obsolete_state_keys:
+            print(f"[brush_manager] WARN! Ignoring unknown attributes of {cls.__name__} '{state.get('name', '')}': {', '.join(sorted(unknown_keys))}")
+        return state
+
+    def _load_state(self, state: dict) -> None:
+        self.owner = state.get('owner', None)
+        self.uuid = state['uuid']
+        self.name = state['name']
+        self.type = intern(state.get('type', ''))
+        self.flags = state.get('flags', ())
+        self._fav = state.get('fav', False)
+        self._select = state.get('select', False)
 
     def set_active(self, context: Context) -> None:
         pass
 
+    def tag_dirty(self) -> None:
+        ''' Mark the item to be written on the next save, and notify that it changed. '''
+        self._tag_store()
+        callback__ItemsUpdate(self)
+
+    def _tag_store(self) -> None:
+        ''' Mark the item to be written on the next save, without notifying.
+            Used when it is added or moved, which have their own notifications. '''
+        if store := self.store:
+            store.tag_item(self.cat, self)
+
     def load(self, link: bool = False) -> None:
         raise NotImplementedError
 
@@ -112,6 +222,8 @@ class Item(IconHolder):
 
 
 class BrushItem(Item):
+    __slots__ = ('use_custom_icon', '_texture')
+
     # Internal props.
     lib_path = Paths.Data.BRUSH
     icon_path = IconPath.BRUSH
@@ -121,6 +233,30 @@ class BrushItem(Item):
     texture: 'TextureItem'
     texture_uuid: str
 
+    _state_keys = Item._state_keys | {'texture', 'use_custom_icon'}
+
+    @property
+    def texture(self) -> 'TextureItem | None':
+        tex = self._texture
+        if isinstance(tex, tuple):
+            # Texture reference (cat_id, tex_id) is resolved the first time it is needed,
+            # that way its category doesn't need to be loaded until then.
+            if self.owner is None:
+                return None
+            self._texture = tex = self._find_texture(*tex)
+        return tex
+
+    @texture.setter
+    def texture(self, texture: 'TextureItem | tuple[str, str] | None') -> None:
+        self._texture = texture
+
+    def _find_texture(self, cat_id: str, tex_id: str) -> 'TextureItem | None':
+        bm_data = self.cat.collection.owner
+        if tex := bm_data.get_item(tex_id):
+            return tex
+        # WARN! The texture could not be found!
+        return None
+
     @property
     def texture_uuid(self) -> str:
         if tex := self.texture:
@@ -135,6 +271,7 @@ class BrushItem(Item):
                  name: str = 'Brush',
                  texture: 'TextureItem' = None,
                  **kwargs) -> None:
+        self.use_custom_icon = False
         super().__init__(collection, name, **kwargs)
         self.texture = texture
 
@@ -147,6 +284,7 @@ class BrushItem(Item):
         bm_data = self.cat.collection.owner
         if bm_data.active_brush != self:
             bm_data._active_brush = self.cat_id, self.uuid
+            bm_data.store.tag_meta()
 
         if tex := self.texture:
             tex.set_active(context)
@@ -159,8 +297,10 @@ class BrushItem(Item):
             del bl_brush
 
         # Load datablock from library.
-        filename = self.uuid + '.default.blend' if from_default else self.uuid + '.blend'
-        filepath = self.lib_path(filename, as_path=True)
+        # NOTE: the working copy only exists once the brush was modified, until then we use the default.
+        filepath = self.lib_path(self.uuid + '.blend', as_path=True)
+        if from_default or not filepath.exists():
+            filepath = self.lib_path(self.uuid + '.default.blend', as_path=True)
         if not filepath.exists():
             print("WARN! Could not find Brush .blend lib-file at", str(filepath))
             return None
@@ -181,11 +321,14 @@ class BrushItem(Item):
             raise RuntimeError(f"Can't save! No BlBrush was found with the uuid '{self.uuid}', in the blend data")
 
         if not save_default:
+            # NOTE: flushes the pending changes too, .blend libraries are written as a whole anyway.
+            dirty_tracker.consume_changes(bl_brush.name)
             if 'dirty' not in bl_brush:
                 return
             del bl_brush['dirty']
 
         # Write Library with the datablock.
+        # NOTE: the first save of a modified brush materializes its working copy.
         filename = self.uuid + '.default.blend' if save_default else self.uuid + '.blend'
         filepath = self.lib_path(filename, as_path=False)
         bpy.data.libraries.write(
@@ -195,18 +338,17 @@ class BrushItem(Item):
             compress=compress
         )
 
-    def save_default(self) -> None:
-        self.save(compress=True, save_default=True)
+    def save_default(self, compress: bool = True) -> None:
+        self.save(compress=compress, save_default=True)
 
     def reset(self) -> None:
         # This will remove current datablock and load the default from library.
         self.load(from_default=True)
 
-        # Still we need to replace the active library .blend file with the default.
-        copyfile(
-            self.lib_path(self.uuid + '.default.blend', as_path=False),
-            self.lib_path(self.uuid + '.blend', as_path=False)
-        )
+        # Without a working copy, the default is used from now on.
+        data_path = self.lib_path(self.uuid + '.blend', as_path=True)
+        if data_path.exists() and data_path.is_file():
+            data_path.unlink()
 
     def copy_data_from(self, item: 'BrushItem') -> None:
         self.type = item.type
@@ -219,6 +361,7 @@ class BrushItem(Item):
             if exists(src_path):
                 dst_path = self.icon_filepath
                 copyfile(src_path, dst_path)
+                tag_icon_file(dst_path)
 
     def __del__(self) -> None:
         super().__del__()
@@ -230,29 +373,53 @@ class BrushItem(Item):
 
     # --------------------------
 
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        # Store the texture as a reference, (cat_id, tex_id).
+        tex = self._texture
+        if isinstance(tex, TextureItem):
+            tex = (tex.cat_id, tex.uuid) if tex.owner is not None else None
+        state['texture'] = tex
+        state['use_custom_icon'] = self.use_custom_icon
+        return state
+
+    def _load_state(self, state: dict) -> None:
+        super()._load_state(state)
+        self._texture = state.get('texture', None)
+        self.use_custom_icon = state.get('use_custom_icon', False)
+
     def clear_owners(self) -> None:
+        if isinstance(tex := self._texture, TextureItem):
+            self._texture = (tex.cat_id, tex.uuid) if tex.owner is not None else None
         super().clear_owners()
-        if tex := self.texture:
-            self.texture = tex.cat_id, tex.uuid
-
-    def ensure_owners(self, collection: 'Item_Collection') -> None:
-        super().ensure_owners(collection)
-        if self.texture is not None:
-            cat_id, tex_id = self.texture
-            bm_data = self.cat.collection.owner
-            if tex_cat := bm_data.texture_cats.get(cat_id):
-                if tex_item := tex_cat.items.get(tex_id):
-                    self.texture = tex_item
-                    return
-            # WARN! The texture could not be found!
-            self.texture = None
 
 
 class TextureItem(Item):
+    __slots__ = ('content_hash',)
+
     # Internal props.
     lib_path = Paths.Data.TEXTURE
     icon_path = IconPath.TEXTURE
-    format: str
+
+    # Hash of the image content. Textures with the same image share it (and the icon), from a library where
+    # the image is named after this hash, while each one keeps its own texture datablock (and settings).
+    # Empty for textures that are not shared.
+    content_hash: str
+
+    _state_keys = Item._state_keys | {'content_hash'}
+
+    def __init__(self, collection: 'Item_Collection', name: str = 'Texture', **kwargs) -> None:
+        self.content_hash = ''
+        super().__init__(collection, name, **kwargs)
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        state['content_hash'] = self.content_hash
+        return state
+
+    def _load_state(self, state: dict) -> None:
+        super()._load_state(state)
+        self.content_hash = state.get('content_hash', '')
 
     @property
     def id_data(self) -> BlTexture:
@@ -269,29 +436,46 @@ class TextureItem(Item):
         bm_data = self.cat.collection.owner
         if bm_data.active_texture != self:
             bm_data._active_texture = self.cat_id, self.uuid
+            bm_data.store.tag_meta()
 
     def load(self, link: bool = False) -> None:
         # Remove datablock if it exists.
+        # NOTE: the shared image stays, other textures may be using it.
         bl_texture = self.id_data
         if bl_texture is not None:
-            if isinstance(bl_texture, BlImageTexture) and bl_texture.image is not None:
+            if not self.content_hash and isinstance(bl_texture, BlImageTexture) and bl_texture.image is not None:
                 bpy.data.images.remove(bl_texture.image)
             bpy.data.textures.remove(bl_texture)
             del bl_texture
 
         # Load datablock from library.
+        # NOTE: a linked texture can't get the shared image assigned, so it is appended instead.
         filename = self.uuid + '.blend'
         filepath = self.lib_path(filename, as_path=False)
-        with bpy.data.libraries.load(filepath, link=link) as (data_from, data_to):
+        with bpy.data.libraries.load(filepath, link=link and not self.content_hash) as (data_from, data_to):
             data_to.textures = data_from.textures
             data_to.images = data_from.images
 
         bl_texture: BlImageTexture = self.id_data
-        if bl_texture is not None:
-            bl_texture['name'] = self.name
+        if bl_texture is None:
+            return None
 
+        if self.content_hash:
+            bl_texture.image = self._load_shared_image(link)
+        bl_texture['name'] = self.name
         return bl_texture
 
+    def _load_shared_image(self, link: bool):
+        if image := bpy.data.images.get(self.content_hash, None):
+            return image
+        filepath = Paths.Data.CAS_TEXTURE(self.content_hash + '.blend', as_path=False)
+        if not exists(filepath):
+            print("WARN! Could not find the shared image .blend lib-file at", filepath)
+            return None
+        with bpy.data.libraries.load(filepath, link=link) as (data_from, data_to):
+            data_to.images = data_from.images
+        return bpy.data.images.get(self.content_hash, None)
+
     def save(self, compress: bool = True) -> None:
         # Get datablock from blend data.
         bl_texture = self.id_data
@@ -304,18 +488,36 @@ class TextureItem(Item):
         del bl_texture['dirty']
 
         # Write Library with the datablock.
+        # NOTE: the shared image has its own library, so it is left out.
         filename = self.uuid + '.blend'
         filepath = self.lib_path(filename, as_path=False)
-        bpy.data.libraries.write(
-            filepath,
-            {bl_texture},
-            fake_user=False,
-            compress=compress
-        )
+        image = bl_texture.image if self.content_hash else None
+        if image is not None:
+            bl_texture.image = None
+        try:
+            bpy.data.libraries.write(
+                filepath,
+                {bl_texture},
+                fake_user=False,
+                compress=compress
+            )
+        finally:
+            if image is not None:
+                bl_texture.image = image
 
     def copy_data_from(self, item: 'TextureItem') -> None:
         self.type = item.type
 
+    @staticmethod
+    def release_content(content_hash: str, uuid: str) -> None:
+        ''' The texture is gone for good, remove the shared image and icon if no other texture uses them. '''
+        release_blob_ref(
+            Paths.Data.CAS_TEXTURE(content_hash + '.refs', as_path=True),
+            uuid,
+            Paths.Data.CAS_TEXTURE(content_hash + '.blend', as_path=True),
+            IconPath.CAS_TEXTURE(content_hash + '.png', as_path=True)
+        )
+
 
     def __del__(self) -> None:
         super().__del__()
@@ -332,20 +534,44 @@ class TextureItem(Item):
 
 class Item_Collection:
     active: Item
-    items: OrderedDict[str, Item]
+    items: IndexedDict[str, Item]
     owner: object # AddonDataByMode
 
+    # Items with the toggle enabled, by their sequence number in 'items' (so they keep the collection order).
+    _favs: SortedDict # [int, Item]
+    _selected: SortedDict # [int, Item]
+
     @property
     def count(self) -> int:
         return len(self.items)
 
+    @property
+    def store(self):
+        if self.owner is not None:
+            return self.owner.store
+
+    @property
+    def item_index(self):
+        ''' ItemIndex of the context mode this collection belongs to. '''
+        if self.owner is not None and (cat_coll := self.owner.owner) is not None and cat_coll.owner is not None:
+            # NOTE: data pickled by older versions has no index until 'AddonDataByMode.ensure_owners'.
+            return getattr(cat_coll.owner, 'item_index', None)
+
     @property
     def favs(self) -> list[Item]:
-        return [item for item in self if item.fav]
+        return list(self._favs.values())
+
+    @property
+    def fav_count(self) -> int:
+        return len(self._favs)
 
     @property
     def selected(self) -> list[Item]:
-        return [item for item in self if item.select]
+        return list(self._selected.values())
+
+    @property
+    def selected_count(self) -> int:
+        return len(self._selected)
 
     @property
     def active(self) -> Item:
@@ -363,12 +589,26 @@ class Item_Collection:
         if not isinstance(item, (str, Item)):
             raise TypeError("Expected an Item instance or a string (uuid) but got:", type(item))
         self._active = item if isinstance(item, str) else item.uuid
+        if self.owner is not None:
+            self.owner.tag_dirty()
 
     def __init__(self, cat: object) -> None:
-        self.items = OrderedDict()
+        self.items = IndexedDict()
+        self._favs = SortedDict()
+        self._selected = SortedDict()
         self._active = ''
         self.owner = cat
 
+    def __setstate__(self, state: dict) -> None:
+        # Data from older versions kept the items in an OrderedDict.
+        items = state.pop('items')
+        self.__dict__.update(state)
+        self.items = IndexedDict()
+        self._favs = SortedDict()
+        self._selected = SortedDict()
+        for item in items.values():
+            self._link(item)
+
     def __iter__(self) -> Iterator[Item]:
         return iter(self.items.values())
 
@@ -379,9 +619,41 @@ class Item_Collection:
             index: int = uuid_or_index
             if index < 0 or index >= len(self.items):
                 return None
-            return list(self.items.values())[index]
+            return self.items.value_at(index)
         raise TypeError("Expected int (index) or string (uuid)")
 
+    def _link(self, item: Item) -> None:
+        self.items[item.uuid] = item
+        self._update_flags(item)
+        if (item_index := self.item_index) is not None:
+            item_index.add(item)
+
+    def _unlink(self, uuid: str) -> Item:
+        seq = self.items.seq(uuid)
+        self._favs.pop(seq, None)
+        self._selected.pop(seq, None)
+        item = self.items.pop(uuid)
+        if (item_index := self.item_index) is not None:
+            item_index.discard(item)
+        # Not part of the collection anymore, eg. for anything that still holds it (save scheduler).
+        item.owner = None
+        return item
+
+    def _update_flags(self, item: Item) -> None:
+        ''' Keep the favourite and selected sets in sync with the item toggles. '''
+        if self.items.get(item.uuid) is not item:
+            # Not linked yet, will be updated by '_link'.
+            return
+        seq = self.items.seq(item.uuid)
+        if item.fav:
+            self._favs[seq] = item
+        else:
+            self._favs.pop(seq, None)
+        if item.select:
+            self._selected[seq] = item
+        else:
+            self._selected.pop(seq, None)
+
     def get(self, uuid: str) -> Item | None:
         # Wrapper for __getitem__ method.
         return self[uuid]
@@ -391,41 +663,63 @@ class Item_Collection:
             return self.select(item.uuid)
         if isinstance(item, int):
             index: int = item
-            return self.select(list(self.items.keys())[index])
-        if isinstance(item, str) and item in self.items:
+            return self.select(self.items.key_at(index))
+        if isinstance(item, str) and item in self.items and item != self._active:
             self._active = item
+            if self.owner is not None:
+                self.owner.tag_dirty()
 
     def add(self, name: str, _type = Item, **kwargs) -> Item:
         # Construct a new Item.
         item = _type(self, name, **kwargs)
         # Link the item to this category.
-        self.items[item.uuid] = item
+        self._link(item)
+        item._tag_store()
         callback__ItemsAdd(item)
         return item
 
+    def add_batch(self, items_data: Iterable[dict], _type = Item) -> list[Item]:
+        ''' Bulk version of 'add'. Each dict holds the constructor arguments of an item.
+            Subscribers are notified once, with the list of new items (callback__ItemsAddBatch). '''
+        link = self._link
+        new_items: list[Item] = []
+        for item_data in items_data:
+            item = _type(self, **item_data)
+            link(item)
+            item._tag_store()
+            new_items.append(item)
+        if new_items:
+            callback__ItemsAddBatch(new_items)
+        return new_items
+
     def move(self, item_uuid: str, other_coll: 'Item_Collection') -> None:
         if not isinstance(other_coll, Item_Collection):
             raise TypeError("Trying to move an item to another collection but the given type is not Item_Collection! but", type(other_coll))
         callback__ItemsMovePre(self.items.get(item_uuid))
         item = self.remove(item_uuid, perma_remove=False)
-        other_coll.items[item.uuid] = item
         item.owner = other_coll
+        other_coll._link(item)
+        item._tag_store()
         callback__ItemsMovePost(item)
 
     def remove(self, uuid_or_index: int, perma_remove: bool = True) -> None | Item:
         if isinstance(uuid_or_index, str):
             if uuid_or_index in self.items:
-                callback__ItemsRemove(self.items[uuid_or_index])
+                item = self.items[uuid_or_index]
+                callback__ItemsRemove(item)
+                if store := self.store:
+                    store.tag_item_removed(self.owner, item)
+                del item
                 if perma_remove:
-                    del self.items[uuid_or_index]
+                    self._unlink(uuid_or_index)
                 else:
-                    return self.items.pop(uuid_or_index)
+                    return self._unlink(uuid_or_index)
             return
         if isinstance(uuid_or_index, Item):
             return self.remove(uuid_or_index.uuid)
         if isinstance(uuid_or_index, int):
             index: int = uuid_or_index
-            return self.remove(list(self.items.keys())[index])
+            return self.remove(self.items.key_at(index))
         raise TypeError("Expected int (index) or string (uuid)")
 
     def duplicate(self, item: Item | str) -> Item | None:
@@ -434,9 +728,19 @@ class Item_Collection:
         item = self.get(item) if isinstance(item, str) else item
         copy = self.add(item.name + ' Copy')
         copy.copy_data_from(item)
+        # Its data changed after it was added.
+        copy.tag_dirty()
+        return copy
 
     def clear(self) -> None:
+        item_index = self.item_index
+        for item in self:
+            if item_index is not None:
+                item_index.discard(item)
+            item.owner = None
         self.items.clear()
+        self._favs.clear()
+        self._selected.clear()
         self.active = None
 
     def __del__(self) -> None:
@@ -460,18 +764,20 @@ class Item_Collection:
 
 class BrushItem_Collection(Item_Collection):
     active: BrushItem
-    items: OrderedDict[str, BrushItem]
+    items: IndexedDict[str, BrushItem]
 
     def get(self, uuid: str) -> BrushItem | None: return super().get(uuid)
     def add(self, name: str = 'New Brush', **data) -> BrushItem: return super().add(name, BrushItem, **data)
+    def add_batch(self, items_data: Iterable[dict]) -> list[BrushItem]: return super().add_batch(items_data, BrushItem)
 
 
 class TextureItem_Collection(Item_Collection):
     active: TextureItem
-    items: OrderedDict[str, TextureItem]
+    items: IndexedDict[str, TextureItem]
 
     def get(self, uuid: str) -> TextureItem | None: return super().get(uuid)
     def add(self, name: str = 'New Texture', **data) -> TextureItem: return super().add(name, TextureItem, **data)
+    def add_batch(self, items_data: Iterable[dict]) -> list[TextureItem]: return super().add_batch(items_data, TextureItem)
     
     def add_from_id_data(self, bl_texture: BlImageTexture) -> TextureItem:
         new_item: TextureItem = self.add(
@@ -0,0 +1,198 @@
+''' Versioned records of the categories and items, as written by the DataStore.
+
+    Objects are stored as tuples of plain values (str, bool, tuple, None) in the order of the fields
+    of their schema, never as pickled instances, so moving or refactoring the classes doesn't break
+    the stored data. Every file (and journal batch) is written with the record version and the fields
+    of each kind of record:
+    - Fields that were added since are filled with their defaults, the ones that were removed are ignored.
+    - Any other change needs a migration, from the version before it ('MIGRATIONS').
+    Records are read back with an unpickler that refuses anything but builtin values.
+'''
+from io import BytesIO
+import pickle
+from sys import intern
+from typing import Callable, Container
+
+from .common import flags_to_mask, mask_to_flags
+
+
+# 1: schema rows.
+RECORD_VERSION = 1
+
+# Kinds of records.
+CAT = 'CAT'
+BRUSH = 'BRUSH'
+TEXTURE = 'TEXTURE'
+
+
+class RecordError(ValueError):
+    pass
+
+
+# ----------------------------------------------------------------
+# Encoding.
+
+
+class _RecordUnpickler(pickle.Unpickler):
+    # Protocols older than 4 reference these by name.
+    SAFE_GLOBALS = {('builtins', 'set'), ('builtins', 'frozenset'), ('__builtin__', 'set'), ('__builtin__', 'frozenset')}
+
+    def find_class(self, module: str, name: str):
+        if (module, name) in self.SAFE_GLOBALS:
+            return super().find_class(module, name)
+        raise RecordError(f"Unexpected object '{module}.{name}' in the records")
+
+
+def dumps(data) -> bytes:
+    return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data: bytes):
+    return _RecordUnpickler(BytesIO(data)).load()
+
+
+def _dump_set(value: set) -> tuple:
+    return tuple(sorted(value))
+
+
+def _dump_mask(mask: int) -> tuple:
+    # Bits are not the same between sessions, flags are stored by name.
+    return tuple(sorted(mask_to_flags(mask)))
+
+
+def _dump_texture(texture) -> tuple[str, str] | None:
+    # Stored as a reference, (cat_id, tex_id).
+    if texture is None or isinstance(texture, tuple):
+        return texture
+    return (texture.cat_id, texture.uuid) if texture.owner is not None else None
+
+
+# ----------------------------------------------------------------
+# Schemas.
+
+
+class Field:
+    def __init__(self, name: str, default=None, attr: str | None = None,
+                 dump: Callable | None = None, load: Callable | None = None) -> None:
+        self.name = name
+        self.default = default
+        # Instance attribute, when it is not the same as the field name.
+        self.attr = attr or name
+        self.dump = dump
+        self.load = load
+
+
+class RecordSchema:
+    ''' Fields of a kind of record. The first one is always the UUID. '''
+
+    def __init__(self, kind: str, *fields: Field) -> None:
+        assert fields[0].name == 'uuid'
+        self.kind = kind
+        self.fields = fields
+        self.names = tuple(field.name for field in fields)
+        self.attrs = tuple(field.attr for field in fields)
+        self._defaults = tuple(field.default for field in fields)
+        self._dumpers = tuple((i, field.dump) for i, field in enumerate(fields) if field.dump is not None)
+        self._loaders = tuple((field.attr, field.load) for field in fields if field.load is not None)
+        # Fields of older layouts -> function that converts their rows to this one.
+        self._conformers: dict[tuple[str, ...], Callable[[tuple], tuple]] = {}
+
+    def dump(self, obj) -> tuple:
+        values = [getattr(obj, attr, default) for attr, default in zip(self.attrs, self._defaults)]
+        for i, dump in self._dumpers:
+            values[i] = dump(values[i])
+        return tuple(values)
+
+    def build(self, cls: type, row: tuple):
+        ''' Instance of the class with the values of the row, without calling its constructor. '''
+        instance = cls.__new__(cls)
+        for attr, value in zip(self.attrs, row):
+            setattr(instance, attr, value)
+        for attr, load in self._loaders:
+            setattr(instance, attr, load(getattr(instance, attr)))
+        return instance
+
+    def get_conformer(self, names: tuple[str, ...]) -> Callable[[tuple], tuple] | None:
+        ''' Converts rows with the given fields to the current ones, None if they are the same. '''
+        names = tuple(names)
+        if names == self.names:
+            return None
+        if (conformer := self._conformers.get(names)) is None:
+            positions = {name: i for i, name in enumerate(names)}
+            if 'uuid' not in positions:
+                raise RecordError(f"Records of kind '{self.kind}' without UUID")
+            getters = tuple(
+                (positions[name], None) if name in positions else (None, default)
+                for name, default in zip(self.names, self._defaults)
+            )
+            def conformer(row: tuple) -> tuple:
+                return tuple(row[i] if i is not None else default for i, default in getters)
+            self._conformers[names] = conformer
+        return conformer
+
+
+ITEM_FIELDS = (
+    Field('uuid', ''),
+    Field('name', ''),
+    Field('type', '', load=intern),
+    Field('flags', (), attr='_flags', dump=_dump_mask, load=flags_to_mask),
+    Field('fav', False, attr='_fav'),
+    Field('select', False, attr='_select'),
+)
+
+SCHEMAS: dict[str, RecordSchema] = {
+    CAT: RecordSchema(
+        CAT,
+        Field('uuid', ''),
+        Field('name', ''),
+        Field('flags', (), dump=_dump_set, load=set),
+        Field('fav', False, attr='_fav'),
+    ),
+    BRUSH: RecordSchema(
+        BRUSH,
+        *ITEM_FIELDS,
+        Field('use_custom_icon', False),
+        Field('texture', None, attr='_texture', dump=_dump_texture),
+    ),
+    TEXTURE: RecordSchema(
+        TEXTURE,
+        *ITEM_FIELDS,
+        Field('content_hash', ''),
+    ),
+}
+
+
+def get_layout() -> dict[str, tuple[str, ...]]:
+    ''' Fields of every kind of record, written along with them. '''
+    return {kind: schema.names for kind, schema in SCHEMAS.items()}
+
+
+# ----------------------------------------------------------------
+# Migrations.
+
+
+# Version -> function that converts (kind, fields, rows) of that version to the next one.
+MIGRATIONS: dict[int, Callable] = {}
+
+
+def upgrade(version: int, kind: str, names: tuple[str, ...], rows: list) -> list[tuple]:
+    ''' Rows of any version and layout, as rows of the current ones. '''
+    if version > RECORD_VERSION:
+        raise RecordError(f"Records version {version} is newer than the supported one ({RECORD_VERSION})")
+    while version < RECORD_VERSION:
+        names, rows = MIGRATIONS[version](kind, names, rows)
+        version += 1
+    if conformer := SCHEMAS[kind].get_conformer(names):
+        return [conformer(row) for row in rows]
+    return rows if isinstance(rows, list) else list(rows)
+
+
+def upgrade_row(version: int, kind: str, names: tuple[str, ...], row) -> tuple:
+    return upgrade(version, kind, names, [row])[0]
+
+
+def conform_active_item(ref: tuple[str, str] | None, cat_uuids: Container[str]) -> tuple[str, str] | None:
+    ''' Active item reference as (cat_id, uuid). Older data (pickled) stored it as (uuid, cat_id). '''
+    if ref is not None and ref[0] not in cat_uuids and ref[1] in cat_uuids:
+        return ref[1], ref[0]
+    return ref
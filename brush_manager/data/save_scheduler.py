@@ -0,0 +1,98 @@
+''' Saves the libraries of the items whose datablocks changed in short timer steps,
+    then commits the stores, so saving the .blend file doesn't wait for them.
+
+    Only the brushes reported by the dirty tracker (rna_sub) are queued,
+    the number of items in the libraries doesn't matter.
+'''
+import bpy
+
+from math import inf
+from time import time
+
+from brush_manager.rna_sub import dirty_tracker
+from .items import Item
+
+
+# Seconds of work per timer step.
+SAVE_STEP_BUDGET = 0.008
+# Seconds between timer steps.
+SAVE_STEP_INTERVAL = 0.05
+
+
+class SaveScheduler:
+    def __init__(self) -> None:
+        # uuid -> Item, in the order they were queued.
+        self.queue: dict[str, Item] = {}
+        # mode -> AddonDataByMode, whose store is committed once the queue is empty.
+        self.pending: dict[str, object] = {}
+
+    @property
+    def is_saving(self) -> bool:
+        return bool(self.queue or self.pending)
+
+    def enqueue_changes(self, addon_data) -> None:
+        ''' Queue the (loaded) items of the context mode whose datablocks changed. '''
+        item_index = addon_data.item_index
+        for brush_name in dirty_tracker.get_changed_brushes():
+            if item := item_index.get(brush_name, load=False):
+                self.queue[item.uuid] = item
+
+    def schedule(self, addon_data) -> None:
+        ''' Save the changed items and the store of the context mode in the background. '''
+        self.enqueue_changes(addon_data)
+        self.pending[addon_data.mode] = addon_data
+        if not bpy.app.timers.is_registered(_save_step):
+            bpy.app.timers.register(_save_step, first_interval=SAVE_STEP_INTERVAL)
+
+    def step(self, budget: float = SAVE_STEP_BUDGET) -> bool:
+        ''' Returns True once everything is saved. '''
+        deadline = time() + budget
+        queue = self.queue
+        while queue:
+            uuid = next(iter(queue))
+            item = queue.pop(uuid)
+            # The item could have been removed meanwhile ('Item_Collection._unlink' clears its owner).
+            if item.owner is not None:
+                item.save()
+            if time() >= deadline:
+                return not queue and not self.pending
+
+        pending = list(self.pending.values())
+        self.pending.clear()
+        for addon_data in pending:
+            addon_data.commit()
+        return True
+
+    def flush(self) -> None:
+        ''' Save everything that is queued right now. '''
+        self.step(budget=inf)
+
+    def cancel(self) -> None:
+        ''' Drop everything that is queued without saving it, eg. before the data is removed. '''
+        if bpy.app.timers.is_registered(_save_step):
+            bpy.app.timers.unregister(_save_step)
+        self.queue.clear()
+        self.pending.clear()
+
+    def flush_stores(self) -> None:
+        ''' Commit the pending stores without saving the queued items,
+            for when the datablocks are gone already (at exit). '''
+        if self.queue:
+            print(f"[brush_manager] WARN! {len(self.queue)} changed items could not be saved before exit")
+            self.queue.clear()
+        self.step(budget=inf)
+
+
+save_scheduler = SaveScheduler()
+
+
+def _save_step() -> float | None:
+    if save_scheduler.step():
+        return None
+    return SAVE_STEP_INTERVAL
+
+
+def unregister():
+    if bpy.app.timers.is_registered(_save_step):
+        bpy.app.timers.unregister(_save_step)
+    save_scheduler.flush()
@@ -0,0 +1,560 @@
+''' Search of brushes and textures by name, type and tags (item flags), across every category.
+
+    Every word of the searchable fields is indexed by itself, its 1-2 letter prefixes, its first trigram
+    and all its trigrams, each key keeps the items that have it (per field, in the order they were indexed,
+    and in any field). Matches are ranked by field (name > type > tag) and by how the query word matches
+    an item word: same word > prefix > substring > fuzzy (a word at one edit of it, see '_get_fuzzy_words').
+
+    A single word query goes through the ranked groups of candidates and stops once it has enough
+    results, so broad queries don't score every item. Queries with several words intersect the keys
+    of every word, smallest first, and only score what is left.
+
+    The index is built from the store, a few categories at every timer step ('SearchIndex.start'),
+    categories that were not loaded are read from their records without loading their items.
+'''
+from collections import deque
+from heapq import heappush, heappushpop
+from itertools import islice, product
+from math import inf
+from time import time
+from typing import Iterable, Iterator
+
+import bpy
+
+from .items import (
+    Item, callback__ItemsAdd, callback__ItemsAddBatch, callback__ItemsRemove, callback__ItemsMovePost, callback__ItemsUpdate
+)
+from .cats import Category, callback__CatsRemove
+
+
+# Fields.
+NAME = 0
+TYPE = 1
+TAG = 2
+# Any of them (postings only).
+ANY = 3
+
+FIELD_WEIGHTS = (3.0, 1.5, 1.0)
+
+# Match quality of a query word against an indexed word.
+EXACT = 0
+PREFIX = 1
+SUBSTRING = 2
+FUZZY = 3
+
+MATCH_QUALITY = (1.0, 0.8, 0.5, 0.3)
+
+# Query words shorter than this are not matched fuzzily, too many words are at one edit of them.
+FUZZY_MIN_LENGTH = 4
+
+# (score, field, match) from the best to the worst (fuzzy matches are not part of it).
+RANKED_MATCHES = sorted(
+    ((FIELD_WEIGHTS[field] * MATCH_QUALITY[match], field, match) for field in (NAME, TYPE, TAG) for match in (EXACT, PREFIX, SUBSTRING)),
+    key=lambda ranked_match: (-ranked_match[0], ranked_match[1], ranked_match[2])
+)
+
+# Seconds of indexing per timer step while the index is built, and seconds between steps.
+BUILD_STEP_BUDGET = 0.008
+BUILD_STEP_INTERVAL = 0.02
+
+SEPARATORS = str.maketrans({c: ' ' for c in '_.|-/()[]'})
+
+_EMPTY: dict = {}
+
+
+def split_words(text: str) -> list[str]:
+    return text.translate(SEPARATORS).lower().split()
+
+
+def get_trigrams(word: str) -> list[str]:
+    return [word[i:i + 3] for i in range(len(word) - 2)]
+
+
+def get_word_keys(word: str) -> set[str]:
+    keys = {'w' + word, 'p' + word[:1], 'p' + word[:2]}
+    if len(word) >= 3:
+        keys.add('^' + word[:3])
+        keys.update('t' + gram for gram in get_trigrams(word))
+    return keys
+
+
+def get_deletions(word: str) -> set[str]:
+    ''' The word with one letter less, at every position. '''
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def is_one_edit(a: str, b: str) -> bool:
+    ''' The words are the same but for an inserted, removed or replaced letter, or two swapped (adjacent) ones. '''
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > 1:
+        return False
+    i = 0
+    while i < len_a and i < len_b and a[i] == b[i]:
+        i += 1
+    if len_a == len_b:
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < len_a and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    if len_a > len_b:
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+    ''' Incremental search index of the items of a context mode.
+        It is built in the background once it is needed ('start'), and kept updated from the item callbacks. '''
+
+    @property
+    def is_built(self) -> bool:
+        return self.is_started and not self._pending_cats and not self._pending_rows
+
+    def __init__(self, owner=None) -> None:
+        self.owner = owner
+        self.is_started = False
+        # Categories (cat_type, uuid) that are not indexed yet, and the item records of the one being indexed.
+        self._pending_cats: deque[tuple[str, str]] = deque()
+        self._pending_rows: deque[tuple] = deque()
+        self._pending_rows_cat: tuple[str, str] | None = None
+
+        # uuid -> item kind ('BRUSH' or 'TEXTURE').
+        self._kinds: dict[str, str] = {}
+        # uuid -> words of every field, joined by spaces and between spaces (' word word ').
+        self._texts: dict[str, tuple[str, str, str]] = {}
+        # key -> uuids per field (dicts used as ordered sets), and the uuids of any field.
+        self._postings: dict[str, tuple[dict[str, None], dict[str, None], dict[str, None], set[str]]] = {}
+        # word -> number of items that have it, and deletion (see 'get_deletions') -> words, for the fuzzy matches.
+        # NOTE: most deletions come from a single word, kept as is instead of in a set (less objects for the GC).
+        self._vocabulary: dict[str, int] = {}
+        self._deletions: dict[str, str | set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    @staticmethod
+    def _get_texts(name: str, type: str, flags: Iterable[str]) -> tuple[str, str, str]:
+        return tuple(
+            ' %s ' % ' '.join(dict.fromkeys(split_words(text)))
+            for text in (name, type, ' '.join(sorted(flags)))
+        )
+
+    @classmethod
+    def _get_item_texts(cls, item) -> tuple[str, str, str]:
+        return cls._get_texts(item.name, getattr(item, 'type', ''), item.flags)
+
+    # ----------------------------------------------------------------
+    # Build.
+
+    def start(self) -> None:
+        ''' Index every item of the context mode, in timer steps (see 'finish' to do it right away). '''
+        if self.is_started:
+            return
+        self.is_started = True
+        owner = self.owner
+        self._pending_cats.extend((cat.cat_type, cat.uuid) for cat_coll in (owner.brush_cats, owner.texture_cats) for cat in cat_coll)
+        _building.append(self)
+        if not bpy.app.timers.is_registered(_build_step):
+            bpy.app.timers.register(_build_step, first_interval=BUILD_STEP_INTERVAL)
+
+    def _get_cat(self, cat_key: tuple[str, str]) -> Category | None:
+        cat_type, cat_uuid = cat_key
+        return (self.owner.brush_cats if cat_type == 'BRUSH' else self.owner.texture_cats).get(cat_uuid)
+
+    def step(self, deadline: float) -> bool:
+        ''' Index items until the deadline. Returns True once every item is indexed. '''
+        pending_cats, pending_rows = self._pending_cats, self._pending_rows
+        while pending_rows or pending_cats:
+            if pending_rows:
+                cat_key = self._pending_rows_cat
+                cat = self._get_cat(cat_key)
+                if cat is None or cat.is_loaded:
+                    # Removed or loaded since the last step, the records may be outdated then (see the callbacks).
+                    pending_rows.clear()
+                    if cat is not None:
+                        pending_cats.appendleft(cat_key)
+                    continue
+                cat_type = cat.cat_type
+                while pending_rows:
+                    row = pending_rows.popleft()
+                    # NOTE: the uuid, name, type and flags come first in the item records (see 'records.ITEM_FIELDS').
+                    self.add_entry(row[0], cat_type, row[1], row[2], row[3])
+                    if time() >= deadline:
+                        return self.is_built
+            if not pending_cats:
+                break
+            cat_key = pending_cats.popleft()
+            if (cat := self._get_cat(cat_key)) is None:
+                # Removed meanwhile.
+                continue
+            if cat.is_loaded:
+                for item in cat.items:
+                    self.add(item)
+            elif (rows := self.owner.store.read_unloaded_item_rows(cat_key)) is not None:
+                self._pending_rows_cat = cat_key
+                pending_rows.extend(rows)
+            if time() >= deadline:
+                break
+        return self.is_built
+
+    def finish(self) -> None:
+        ''' Index the items that are not indexed yet, right away. '''
+        self.start()
+        self.step(inf)
+
+    def clear(self) -> None:
+        self.is_started = False
+        self._pending_cats.clear()
+        self._pending_rows.clear()
+        self._pending_rows_cat = None
+        self._kinds.clear()
+        self._texts.clear()
+        self._postings.clear()
+        self._vocabulary.clear()
+        self._deletions.clear()
+
+    # ----------------------------------------------------------------
+    # Entries.
+
+    def add(self, item) -> None:
+        self.add_entry(item.uuid, item.cat.cat_type, item.name, getattr(item, 'type', ''), item.flags)
+
+    def add_entry(self, uuid: str, kind: str, name: str, type: str, flags: Iterable[str]) -> None:
+        if uuid in self._kinds:
+            self.remove_entry(uuid)
+        texts = self._get_texts(name, type, flags)
+        self._kinds[uuid] = kind
+        self._texts[uuid] = texts
+        postings = self._postings
+        for field, text in enumerate(texts):
+            for word in text.split():
+                for key in get_word_keys(word):
+                    if (field_uuids := postings.get(key)) is None:
+                        field_uuids = postings[key] = ({}, {}, {}, set())
+                    field_uuids[field][uuid] = None
+                    field_uuids[ANY].add(uuid)
+                self._add_word(word)
+
+    def remove(self, item) -> None:
+        self.remove_entry(item.uuid)
+
+    def remove_entry(self, uuid: str) -> None:
+        if self._kinds.pop(uuid, None) is None:
+            return
+        postings = self._postings
+        keys = set()
+        for field, text in enumerate(self._texts.pop(uuid)):
+            for word in text.split():
+                for key in get_word_keys(word):
+                    postings[key][field].pop(uuid, None)
+                    keys.add(key)
+                self._remove_word(word)
+        # A key can come from words of several fields of the item.
+        for key in keys:
+            field_uuids = postings[key]
+            field_uuids[ANY].discard(uuid)
+            if not field_uuids[ANY]:
+                del postings[key]
+
+    def update(self, item) -> None:
+        ''' Re-index the item if its name, type or tags changed. '''
+        if (texts := self._texts.get(item.uuid)) is not None and texts != self._get_item_texts(item):
+            self.add(item)
+
+    def _add_word(self, word: str) -> None:
+        vocabulary = self._vocabulary
+        if (count := vocabulary.get(word, 0)) == 0 and len(word) >= FUZZY_MIN_LENGTH - 1:
+            deletions = self._deletions
+            for deletion in get_deletions(word) | {word}:
+                if (words := deletions.get(deletion)) is None:
+                    deletions[deletion] = word
+                elif isinstance(words, str):
+                    deletions[deletion] = {words, word}
+                else:
+                    words.add(word)
+        vocabulary[word] = count + 1
+
+    def _remove_word(self, word: str) -> None:
+        vocabulary = self._vocabulary
+        if (count := vocabulary.get(word, 0)) > 1:
+            vocabulary[word] = count - 1
+            return
+        if vocabulary.pop(word, None) is None or len(word) < FUZZY_MIN_LENGTH - 1:
+            return
+        deletions = self._deletions
+        for deletion in get_deletions(word) | {word}:
+            if (words := deletions.get(deletion)) is None:
+                continue
+            if isinstance(words, str):
+                if words == word:
+                    del deletions[deletion]
+                continue
+            words.discard(word)
+            if len(words) == 1:
+                deletions[deletion] = words.pop()
+
+    # ----------------------------------------------------------------
+    # Search.
+
+    def _get_postings(self, key: str, field: int) -> dict[str, None] | set[str]:
+        ''' UUIDs of the items with the key in the field, or in any field (ANY). '''
+        if field_uuids := self._postings.get(key):
+            return field_uuids[field]
+        return _EMPTY
+
+    @staticmethod
+    def _intersect(word_postings: list[list]) -> set[str] | dict[str, None]:
+        ''' Items in every posting, given by query word. The postings of a word have mostly the same items,
+            so the smallest of every word are intersected first (the smallest first), the rest only filter what is left.
+            NOTE: it can be one of the postings, it must not be changed. '''
+        word_postings = [sorted(postings, key=len) for postings in word_postings]
+        postings = sorted((postings[0] for postings in word_postings), key=len)
+        postings += [posting for postings in word_postings for posting in postings[1:]]
+        uuids = postings[0]
+        for other in postings[1:]:
+            if not uuids:
+                break
+            if not isinstance(uuids, set):
+                # Keeps the order of the items, the first of a rank are the first indexed ones.
+                uuids = {uuid: None for uuid in uuids if uuid in other}
+            elif isinstance(other, set):
+                uuids = uuids & other
+            else:
+                uuids = {uuid for uuid in uuids if uuid in other}
+        return uuids
+
+    @staticmethod
+    def _get_word_keys(query_word: str) -> list[str]:
+        ''' Keys that every item word that starts with or contains the query word has. '''
+        if len(query_word) < 3:
+            return ['p' + query_word]
+        return ['t' + gram for gram in get_trigrams(query_word)]
+
+    def _get_candidates(self, query_word: str, field: int, match: int) -> Iterable[str]:
+        ''' Items that may match the query word in the field. Exact matches (and prefix ones of short words)
+            don't need to be checked, the rest do (trigrams could come from different words). '''
+        if match == EXACT:
+            return self._get_postings('w' + query_word, field)
+        if len(query_word) < 3:
+            return self._get_postings('p' + query_word, field) if match == PREFIX else _EMPTY
+        keys = self._get_word_keys(query_word)
+        if match == PREFIX:
+            keys.append('^' + query_word[:3])
+        return self._intersect([[self._get_postings(key, field) for key in keys]])
+
+    def _get_fuzzy_words(self, query_word: str) -> set[str]:
+        ''' Indexed words at one edit of the query word. Words at one edit share one of their deletions
+            (or one is a deletion of the other), so only those are checked. '''
+        if len(query_word) < FUZZY_MIN_LENGTH:
+            return set()
+        deletions = self._deletions
+        words = set()
+        for deletion in get_deletions(query_word) | {query_word}:
+            if isinstance(deletion_words := deletions.get(deletion, ()), str):
+                words.add(deletion_words)
+            else:
+                words.update(deletion_words)
+        return {word for word in words if word != query_word and is_one_edit(query_word, word)}
+
+    @staticmethod
+    def _get_match(text: str, query_word: str) -> int | None:
+        ''' How the query word matches the best of the words of a field text. '''
+        if query_word not in text:
+            return None
+        if ' %s ' % query_word in text:
+            return EXACT
+        if ' ' + query_word in text:
+            return PREFIX
+        return SUBSTRING
+
+    def _iter_ranked(self, query_word: str) -> Iterator[str]:
+        ''' UUIDs of the items that match the query word, the best matches first. '''
+        texts = self._texts
+        seen: set[str] = set()
+        for _score, field, match in RANKED_MATCHES:
+            candidates = self._get_candidates(query_word, field, match)
+            needs_check = not (match == EXACT or (match == PREFIX and len(query_word) < 3))
+            for uuid in candidates:
+                if uuid in seen:
+                    continue
+                if needs_check and self._get_match(texts[uuid][field], query_word) != match:
+                    continue
+                seen.add(uuid)
+                yield uuid
+
+        if not seen and (fuzzy_words := self._get_fuzzy_words(query_word)):
+            for field in (NAME, TYPE, TAG):
+                for word in fuzzy_words:
+                    for uuid in self._get_postings('w' + word, field):
+                        if uuid not in seen:
+                            seen.add(uuid)
+                            yield uuid
+
+    def _score(self, uuid: str, query_word: str, fuzzy_words: Iterable[str]) -> float:
+        best = 0.0
+        for field, text in enumerate(self._texts[uuid]):
+            if (match := self._get_match(text, query_word)) is None:
+                if not any(' %s ' % word in text for word in fuzzy_words):
+                    continue
+                match = FUZZY
+            elif match == SUBSTRING and len(query_word) < 3:
+                continue
+            best = max(best, FIELD_WEIGHTS[field] * MATCH_QUALITY[match])
+        return best
+
+    def search(self, query: str, limit: int = 50, kind: str = '') -> list[str]:
+        ''' UUIDs of the items ('BRUSH', 'TEXTURE' or '' for both) that match every word of the query,
+            best matches first. Items that are not indexed yet are not found, see 'is_built'. '''
+        query_words = list(dict.fromkeys(split_words(query)))
+        if not query_words:
+            return []
+        kinds = self._kinds
+
+        if len(query_words) == 1:
+            uuids = self._iter_ranked(query_words[0])
+            if kind:
+                uuids = (uuid for uuid in uuids if kinds[uuid] == kind)
+            return list(islice(uuids, limit))
+
+        # The keys of every word, in any field. Words without direct matches use the items of their fuzzy words.
+        postings = []
+        fuzzy_words: dict[str, set[str]] = {}
+        for query_word in query_words:
+            word_postings = [self._get_postings(key, ANY) for key in self._get_word_keys(query_word)]
+            if min(map(len, word_postings)) == 0:
+                if not (words := self._get_fuzzy_words(query_word)):
+                    return []
+                fuzzy_words[query_word] = words
+                word_postings = [set().union(*(self._get_postings('w' + word, ANY) for word in words))]
+            postings.append(word_postings)
+        candidates = self._intersect(postings)
+
+        # Scoring is the slow part, so the candidates are split by the best score they could get for every word,
+        # from what their name has (the word, a word that starts like it, or none), and scored group by group
+        # (the best groups first) until the rest can't beat the results.
+        exact_bound = FIELD_WEIGHTS[NAME] * MATCH_QUALITY[EXACT]
+        prefix_bound = FIELD_WEIGHTS[NAME] * MATCH_QUALITY[PREFIX]
+        other_bound = max(FIELD_WEIGHTS[NAME] * MATCH_QUALITY[SUBSTRING], FIELD_WEIGHTS[TYPE] * MATCH_QUALITY[EXACT])
+        word_groups = []
+        for query_word in query_words:
+            if query_word in fuzzy_words:
+                word_groups.append([(FIELD_WEIGHTS[NAME] * MATCH_QUALITY[FUZZY], candidates)])
+                continue
+            exact = self._get_postings('w' + query_word, NAME).keys() & candidates
+            prefix_key = 'p' + query_word if len(query_word) < 3 else '^' + query_word[:3]
+            prefix = (self._get_postings(prefix_key, NAME).keys() & candidates) - exact
+            other = candidates - exact - prefix
+            word_groups.append([(bound, uuids) for bound, uuids in ((exact_bound, exact), (prefix_bound, prefix), (other_bound, other)) if uuids])
+        groups = sorted(
+            ((sum(bound for bound, _uuids in group), group) for group in product(*word_groups)),
+            key=lambda bound_group: -bound_group[0]
+        )
+
+        score = self._score
+        best: list[tuple[float, int, str]] = []
+        order = 0
+        for bound, group in groups:
+            if len(best) == limit and best[0][0] >= bound:
+                break
+            for uuid in set.intersection(*(uuids for _bound, uuids in group)):
+                if kind and kinds[uuid] != kind:
+                    continue
+                total = 0.0
+                for query_word in query_words:
+                    if not (word_score := score(uuid, query_word, fuzzy_words.get(query_word, ()))):
+                        break
+                    total += word_score
+                else:
+                    # NOTE: ties are kept in the order they are found.
+                    order -= 1
+                    if len(best) < limit:
+                        heappush(best, (total, order, uuid))
+                    else:
+                        heappushpop(best, (total, order, uuid))
+        return [uuid for _total, _order, uuid in sorted(best, reverse=True)]
+
+
+# ----------------------------------------------------------------
+# Build the search indices in the background.
+
+
+_building: list[SearchIndex] = []
+
+
+def _build_step() -> float | None:
+    deadline = time() + BUILD_STEP_BUDGET
+    while _building:
+        if not _building[0].is_started or _building[0].step(deadline):
+            _building.pop(0)
+        if time() >= deadline:
+            break
+    return BUILD_STEP_INTERVAL if _building else None
+
+
+# ----------------------------------------------------------------
+# Keep the search index of every context mode updated.
+
+
+def _get_search_index(item: Item) -> SearchIndex | None:
+    if item.owner is None or (cat := item.collection.owner) is None or (cat_coll := cat.owner) is None or cat_coll.owner is None:
+        return None
+    search_index: SearchIndex | None = getattr(cat_coll.owner, 'search_index', None)
+    if search_index is not None and search_index.is_started:
+        return search_index
+    return None
+
+
+def _on_items_add(item: Item) -> None:
+    if search_index := _get_search_index(item):
+        search_index.add(item)
+
+
+def _on_items_add_batch(items: list[Item]) -> None:
+    if items and (search_index := _get_search_index(items[0])):
+        for item in items:
+            search_index.add(item)
+
+
+def _on_items_remove(item: Item) -> None:
+    if search_index := _get_search_index(item):
+        search_index.remove(item)
+
+
+def _on_items_move_post(item: Item) -> None:
+    # Moving an item removes it from its category first (callback__ItemsRemove).
+    _on_items_add(item)
+
+
+def _on_items_update(item: Item) -> None:
+    if search_index := _get_search_index(item):
+        search_index.update(item)
+
+
+def _on_cats_remove(cat: Category) -> None:
+    # NOTE: items of a removed category are cleared without notifying each of them.
+    if (cat_coll := cat.owner) is None or cat_coll.owner is None:
+        return
+    search_index: SearchIndex | None = getattr(cat_coll.owner, 'search_index', None)
+    if search_index is not None and search_index.is_started:
+        # They are loaded to be removed anyway.
+        for item in cat.items:
+            search_index.remove(item)
+
+
+def register():
+    callback__ItemsAdd.add(_on_items_add)
+    callback__ItemsAddBatch.add(_on_items_add_batch)
+    callback__ItemsRemove.add(_on_items_remove)
+    callback__ItemsMovePost.add(_on_items_move_post)
+    callback__ItemsUpdate.add(_on_items_update)
+    callback__CatsRemove.add(_on_cats_remove)
+
+
+def unregister():
+    if bpy.app.timers.is_registered(_build_step):
+        bpy.app.timers.unregister(_build_step)
+    _building.clear()
+    callback__ItemsAdd.remove(_on_items_add)
+    callback__ItemsAddBatch.remove(_on_items_add_batch)
+    callback__ItemsRemove.remove(_on_items_remove)
+    callback__ItemsMovePost.remove(_on_items_move_post)
+    callback__ItemsUpdate.remove(_on_items_update)
+    callback__CatsRemove.remove(_on_cats_remove)
@@ -0,0 +1,428 @@
+''' Incremental on-disk storage for AddonDataByMode.
+
+    Layout of the store of a context mode:
+        store/<MODE>/index                  -> mode header and category headers.
+        store/<MODE>/<CAT_TYPE>/<cat_uuid>  -> item records of a single category.
+        store/<MODE>/journal                -> append-only log of changes since the last compaction.
+
+    Saving only appends the categories and items that were tagged as dirty to the journal.
+    When the journal grows too big, the categories it touches are folded back into
+    their own files and the journal is truncated (compaction).
+
+    Index and category files are replaced atomically and checksummed, keeping previous generations
+    to fall back to, and journal records are CRC framed (see 'utils/atomic_file.py').
+    Categories and items are stored as versioned records (see 'records.py').
+'''
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from brush_manager.paths import Paths
+from brush_manager.utils.atomic_file import (
+    write_generations, read_generations, generations_exist, remove_generations,
+    append_record, iter_records
+)
+from .cats import Category, BrushCat, TextureCat
+from .items import Item, BrushItem, TextureItem, BrushItem_Collection, TextureItem_Collection
+from .records import RECORD_VERSION, CAT, SCHEMAS, dumps, loads, get_layout, upgrade, upgrade_row
+
+
+StorePath = Paths.Data.STORE
+
+# Once the journal is bigger than this (in bytes), it is compacted on save.
+JOURNAL_COMPACT_SIZE = 1 << 20
+
+# Versions kept of the index and category files.
+INDEX_GENERATIONS = 3
+SEGMENT_GENERATIONS = 2
+
+# Journal operations.
+OP_META = 0
+OP_CAT = 1
+OP_CAT_REMOVE = 2
+OP_ITEM = 3
+OP_ITEM_REMOVE = 4
+
+CatKey = tuple[str, str]            # (cat_type, cat_uuid)
+ItemKey = tuple[str, str, str]      # (cat_type, cat_uuid, item_uuid)
+
+get_cat_type = {
+    'BRUSH': (BrushCat, BrushItem_Collection, BrushItem),
+    'TEXTURE': (TextureCat, TextureItem_Collection, TextureItem),
+}
+
+
+class _CatEntry:
+    ''' Raw (not yet built) category as read from the index and the journal. '''
+    def __init__(self, row: tuple, active_item: str, has_segment: bool, segment_uuids: list[str] = ()) -> None:
+        self.row = row
+        self.active_item = active_item
+        self.has_segment = has_segment
+        # UUIDs of the items in the category file.
+        self.segment_uuids = segment_uuids
+        self.item_ops: list[tuple[int, str, tuple | None]] = []
+
+
+class DataStore:
+    mode: str
+    path: Path
+
+    @property
+    def index_path(self) -> Path:
+        return self.path / 'index'
+
+    @property
+    def journal_path(self) -> Path:
+        return self.path / 'journal'
+
+    @property
+    def exists(self) -> bool:
+        return generations_exist(self.index_path, INDEX_GENERATIONS)
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._dirty_meta or bool(self._dirty_cats or self._removed_cats or self._dirty_items or self._removed_items)
+
+    def __init__(self, mode: str) -> None:
+        self.mode = mode
+        self.path = StorePath(mode, as_path=True)
+
+        self._dirty_meta: bool = False
+        self._dirty_cats: dict[CatKey, Category] = {}
+        self._removed_cats: set[CatKey] = set()
+        self._dirty_items: dict[ItemKey, Item] = {}
+        self._removed_items: set[ItemKey] = set()
+
+        # Item UUID -> content hash of the removed textures, their shared files are released once it is saved.
+        # NOTE: a texture moved to another category is tagged again and so it is not released.
+        self._released_blobs: dict[str, str] = {}
+
+        # Categories with changes in the journal that are not yet in their own file.
+        self._journal_cats: set[CatKey] = set()
+
+        # Categories whose items were not loaded yet.
+        self._unloaded: dict[CatKey, _CatEntry] = {}
+        # Item UUID -> CatKey of the items in '_unloaded', built the first time an item is looked up there.
+        self._unloaded_items: dict[str, CatKey] | None = None
+
+    def _segment_path(self, cat_key: CatKey) -> Path:
+        return self.path.joinpath(*cat_key)
+
+    # ----------------------------------------------------------------
+    # Dirty tracking.
+
+    def tag_meta(self) -> None:
+        self._dirty_meta = True
+
+    def tag_cat(self, cat: Category) -> None:
+        self._dirty_cats[(cat.cat_type, cat.uuid)] = cat
+        self._dirty_meta = True
+
+    def tag_cat_removed(self, cat: Category) -> None:
+        cat_key = (cat.cat_type, cat.uuid)
+        self._dirty_cats.pop(cat_key, None)
+        self._removed_cats.add(cat_key)
+        self._dirty_items = {key: item for key, item in self._dirty_items.items() if key[:2] != cat_key}
+        self._removed_items = {key for key in self._removed_items if key[:2] != cat_key}
+        self._dirty_meta = True
+        if cat.cat_type == 'TEXTURE':
+            self._released_blobs.update((item.uuid, item.content_hash) for item in cat.items if item.content_hash)
+
+    def tag_item(self, cat: Category, item: Item) -> None:
+        self._dirty_items[(cat.cat_type, cat.uuid, item.uuid)] = item
+        self._released_blobs.pop(item.uuid, None)
+
+    def tag_item_removed(self, cat: Category, item: Item) -> None:
+        item_key = (cat.cat_type, cat.uuid, item.uuid)
+        self._dirty_items.pop(item_key, None)
+        self._removed_items.add(item_key)
+        if content_hash := getattr(item, 'content_hash', ''):
+            self._released_blobs[item.uuid] = content_hash
+
+    def _release_blobs(self) -> None:
+        for item_uuid, content_hash in self._released_blobs.items():
+            TextureItem.release_content(content_hash, item_uuid)
+        self._released_blobs.clear()
+
+    def _clear_tags(self) -> None:
+        self._dirty_meta = False
+        self._dirty_cats.clear()
+        self._removed_cats.clear()
+        self._dirty_items.clear()
+        self._removed_items.clear()
+
+    # ----------------------------------------------------------------
+    # Read.
+
+    def _read_segment(self, cat_key: CatKey) -> OrderedDict[str, tuple]:
+        data = read_generations(self._segment_path(cat_key), SEGMENT_GENERATIONS)
+        if data is None:
+            return OrderedDict()
+        version, names, rows = loads(data)
+        return OrderedDict((row[0], row) for row in upgrade(version, cat_key[0], names, rows))
+
+    def _read_journal(self) -> list[tuple]:
+        try:
+            data = self.journal_path.read_bytes()
+        except OSError:
+            return []
+        records = []
+        end = 0
+        for payload, end in iter_records(data):
+            records.extend(self._upgrade_records(loads(payload)))
+        if end != len(data):
+            # Torn record at the end (eg. crash while saving). Keep what we have,
+            # and cut it so the next records are not appended after it.
+            print(f"[brush_manager] WARN! Discarding corrupted journal tail of BM_DATA.{self.mode}: {len(data) - end} bytes")
+            os.truncate(self.journal_path, end)
+        return records
+
+    @staticmethod
+    def _upgrade_records(batch: tuple) -> list[tuple]:
+        ''' Records of a journal batch, with the categories and items as current rows. '''
+        version, layout, records = batch
+        if version == RECORD_VERSION and layout == get_layout():
+            return records
+        upgraded = []
+        for record in records:
+            op = record[0]
+            if op == OP_CAT:
+                record = (op, record[1], upgrade_row(version, CAT, layout[CAT], record[2]), record[3])
+            elif op == OP_ITEM:
+                kind = record[1][0]
+                record = (op, record[1], upgrade_row(version, kind, layout[kind], record[2]))
+            upgraded.append(record)
+        return upgraded
+
+    def _read_entries(self) -> tuple[dict, OrderedDict[CatKey, _CatEntry]]:
+        if (data := read_generations(self.index_path, INDEX_GENERATIONS)) is not None:
+            index: dict = loads(data)
+        else:
+            print(f"[brush_manager] ERROR! No valid index was found for BM_DATA.{self.mode}, only the journal can be recovered")
+            index = {
+                'version': RECORD_VERSION,
+                'layout': get_layout(),
+                'meta': {'active_brush': None, 'active_texture': None, 'BRUSH': '', 'TEXTURE': ''},
+                'cats': [],
+                'item_uuids': {},
+            }
+
+        meta: dict = index['meta']
+        item_uuids: dict[CatKey, list[str]] = index['item_uuids']
+        cat_rows = upgrade(index['version'], CAT, index['layout'][CAT], [cat_row for _cat_key, cat_row, _active_item in index['cats']])
+        entries: OrderedDict[CatKey, _CatEntry] = OrderedDict(
+            (cat_key, _CatEntry(cat_row, active_item, True, item_uuids[cat_key]))
+            for (cat_key, _cat_state, active_item), cat_row in zip(index['cats'], cat_rows)
+        )
+
+        for record in self._read_journal():
+            op = record[0]
+            if op == OP_META:
+                meta = record[1]
+                continue
+
+            cat_key = record[1][:2]
+            self._journal_cats.add(cat_key)
+
+            if op == OP_CAT:
+                if entry := entries.get(cat_key):
+                    entry.row, entry.active_item = record[2], record[3]
+                else:
+                    entries[cat_key] = _CatEntry(record[2], record[3], False)
+            elif op == OP_CAT_REMOVE:
+                entries.pop(cat_key, None)
+            elif entry := entries.get(cat_key):
+                entry.item_ops.append((op, record[1][2], record[2] if op == OP_ITEM else None))
+
+        return meta, entries
+
+    def _read_items(self, cat_key: CatKey, entry: _CatEntry) -> OrderedDict[str, tuple]:
+        items = self._read_segment(cat_key) if entry.has_segment else OrderedDict()
+        for op, item_uuid, item_row in entry.item_ops:
+            if op == OP_ITEM:
+                items[item_uuid] = item_row
+            else:
+                items.pop(item_uuid, None)
+        return items
+
+    def _get_item_uuids(self, cat_key: CatKey, entry: _CatEntry) -> list[str]:
+        item_uuids = dict.fromkeys(entry.segment_uuids) if entry.has_segment else {}
+        for op, item_uuid, _item_row in entry.item_ops:
+            if op == OP_ITEM:
+                item_uuids[item_uuid] = None
+            else:
+                item_uuids.pop(item_uuid, None)
+        return list(item_uuids.keys())
+
+    def find_unloaded_item(self, item_uuid: str) -> CatKey | None:
+        ''' Category of the item, if it is one of the categories whose items were not loaded yet. '''
+        if not self._unloaded:
+            return None
+        if self._unloaded_items is None:
+            # NOTE: entries are only removed from '_unloaded' (once loaded), so this doesn't need to be rebuilt.
+            self._unloaded_items = {
+                uuid: cat_key for cat_key, entry in self._unloaded.items() for uuid in self._get_item_uuids(cat_key, entry)
+            }
+        cat_key = self._unloaded_items.get(item_uuid)
+        return cat_key if cat_key in self._unloaded else None
+
+    def read_unloaded_item_rows(self, cat_key: CatKey) -> list[tuple] | None:
+        ''' Records of the items of a category whose items were not loaded yet, without loading them. '''
+        if (entry := self._unloaded.get(cat_key)) is None:
+            return None
+        return list(self._read_items(cat_key, entry).values())
+
+    def load(self, addon_data) -> None:
+        ''' Fill an empty AddonDataByMode with the stored categories.
+            Their items are loaded later, on demand, by 'load_items'. '''
+        meta, entries = self._read_entries()
+        cat_schema = SCHEMAS[CAT]
+
+        for (cat_type, cat_uuid), entry in entries.items():
+            cat_cls = get_cat_type[cat_type][0]
+            cat_coll = addon_data.brush_cats if cat_type == 'BRUSH' else addon_data.texture_cats
+
+            cat: Category = cat_schema.build(cat_cls, entry.row)
+            cat.owner = cat_coll
+            cat.items = None
+            cat_coll._link(cat)
+
+            self._unloaded[(cat_type, cat_uuid)] = entry
+
+        addon_data._active_brush = meta['active_brush']
+        addon_data._active_texture = meta['active_texture']
+        addon_data.brush_cats._active = meta['BRUSH']
+        addon_data.texture_cats._active = meta['TEXTURE']
+
+    def load_items(self, cat: Category) -> None:
+        cat_key = (cat.cat_type, cat.uuid)
+        item_coll_cls, item_cls = get_cat_type[cat.cat_type][1:]
+
+        cat.items = item_coll = item_coll_cls(cat)
+        if (entry := self._unloaded.pop(cat_key, None)) is None:
+            return
+
+        item_coll._active = entry.active_item
+        build = SCHEMAS[cat.cat_type].build
+        link = item_coll._link
+        for item_row in self._read_items(cat_key, entry).values():
+            item: Item = build(item_cls, item_row)
+            item.owner = item_coll
+            link(item)
+
+    # ----------------------------------------------------------------
+    # Write.
+
+    def _get_active_item(self, cat: Category) -> str:
+        if cat.is_loaded:
+            return cat.items.active_id
+        return self._unloaded[(cat.cat_type, cat.uuid)].active_item
+
+    def _get_item_rows(self, cat: Category) -> list[tuple]:
+        if cat.is_loaded:
+            dump = SCHEMAS[cat.cat_type].dump
+            return [dump(item) for item in cat.items]
+        cat_key = (cat.cat_type, cat.uuid)
+        entry = self._unloaded[cat_key]
+        item_rows = list(self._read_items(cat_key, entry).values())
+        # From now on, the category file has it all.
+        entry.has_segment = True
+        entry.segment_uuids = [item_row[0] for item_row in item_rows]
+        entry.item_ops.clear()
+        return item_rows
+
+    def _get_cat_item_uuids(self, cat: Category) -> list[str]:
+        if cat.is_loaded:
+            return list(cat.items.items.keys())
+        cat_key = (cat.cat_type, cat.uuid)
+        return self._get_item_uuids(cat_key, self._unloaded[cat_key])
+
+    @staticmethod
+    def _get_meta(addon_data) -> dict:
+        return {
+            'active_brush': addon_data._active_brush,
+            'active_texture': addon_data._active_texture,
+            'BRUSH': addon_data.brush_cats.active_id,
+            'TEXTURE': addon_data.texture_cats.active_id,
+        }
+
+    def _collect_records(self, addon_data) -> list[tuple]:
+        records: list[tuple] = []
+        records.extend((OP_CAT_REMOVE, cat_key) for cat_key in self._removed_cats)
+        records.extend((OP_ITEM_REMOVE, item_key) for item_key in self._removed_items)
+        records.extend((OP_CAT, cat_key, SCHEMAS[CAT].dump(cat), self._get_active_item(cat)) for cat_key, cat in self._dirty_cats.items())
+        records.extend((OP_ITEM, item_key, SCHEMAS[item_key[0]].dump(item)) for item_key, item in self._dirty_items.items())
+        if self._dirty_meta:
+            records.append((OP_META, self._get_meta(addon_data)))
+        return records
+
+    def commit(self, addon_data) -> None:
+        ''' Persist the changes since the last commit. '''
+        if not self.exists:
+            self.compact(addon_data, full=True)
+            return
+
+        records = self._collect_records(addon_data)
+        if not records:
+            return
+
+        append_record(self.journal_path, dumps((RECORD_VERSION, get_layout(), records)))
+
+        self._journal_cats.update(record[1][:2] for record in records if record[0] != OP_META)
+        self._clear_tags()
+        self._release_blobs()
+
+        if self.journal_path.stat().st_size > JOURNAL_COMPACT_SIZE:
+            self.compact(addon_data)
+
+    def compact(self, addon_data, full: bool = False) -> None:
+        ''' Fold the journal into the index and category files.
+            When 'full' is True, every category file is written again. '''
+        print(f"[brush_manager] Compacting BM_DATA.{self.mode} store at '{str(self.path)}'")
+
+        live_cats: dict[CatKey, Category] = {
+            (cat.cat_type, cat.uuid): cat for cat_coll in (addon_data.brush_cats, addon_data.texture_cats) for cat in cat_coll
+        }
+
+        for cat_type in get_cat_type.keys():
+            self.path.joinpath(cat_type).mkdir(parents=True, exist_ok=True)
+
+        if full:
+            self._clear_tags()
+            cat_keys = set(live_cats.keys())
+            # Remove leftovers of categories that no longer exist (with their generations).
+            for cat_type in get_cat_type.keys():
+                for segment_path in self.path.joinpath(cat_type).iterdir():
+                    if (cat_type, segment_path.name.split('.')[0]) not in live_cats:
+                        segment_path.unlink()
+        else:
+            # Changes that are not in the journal yet must be in it first.
+            if self.is_dirty:
+                self.commit(addon_data)
+                if not self._journal_cats:
+                    return
+            cat_keys = self._journal_cats
+
+        for cat_key in cat_keys:
+            segment_path = self._segment_path(cat_key)
+            if cat := live_cats.get(cat_key):
+                segment = (RECORD_VERSION, SCHEMAS[cat_key[0]].names, self._get_item_rows(cat))
+                write_generations(segment_path, dumps(segment), SEGMENT_GENERATIONS)
+            else:
+                remove_generations(segment_path, SEGMENT_GENERATIONS)
+
+        # NOTE: if it crashes before the journal is removed, its records are applied again on load, which is harmless.
+        cat_dump = SCHEMAS[CAT].dump
+        index = {
+            'version': RECORD_VERSION,
+            'layout': get_layout(),
+            'meta': self._get_meta(addon_data),
+            'cats': [(cat_key, cat_dump(cat), self._get_active_item(cat)) for cat_key, cat in live_cats.items()],
+            # So items can be found by UUID without loading their category.
+            'item_uuids': {cat_key: self._get_cat_item_uuids(cat) for cat_key, cat in live_cats.items()},
+        }
+        write_generations(self.index_path, dumps(index), INDEX_GENERATIONS)
+
+        self.journal_path.unlink(missing_ok=True)
+        self._journal_cats.clear()
+        self._release_blobs()
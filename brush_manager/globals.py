@@ -1,6 +1,5 @@
 from bpy.types import Context
 
-from .paths import Paths
 
 
 ui_context_mode: str = 'SCULPT'
@@ -18,7 +17,7 @@ class _GLOBALS:
     @property
     def is_importing_a_library(self) -> bool:
         global _is_importing_a_library
-        return _is_importing_a_library or Paths.Scripts.CHECK__WRITE_LIBS(as_path=True).exists()
+        return _is_importing_a_library
 
     @is_importing_a_library.setter
     def is_importing_a_library(self, value: bool) -> None:
@@ -11,11 +11,19 @@ def initialize(*args):
     print("[brush_manager] load_post")
 
 
+@handlers.persistent
+def on_load_pre(*args):
+    # The datablocks of the changed items are about to be replaced.
+    from .data.save_scheduler import save_scheduler
+    save_scheduler.flush()
+
+
 @handlers.persistent
 def on_save_post(*args):
     print("[brush_manager] save_post")
     from .data import AddonData
-    AddonData.save_all(save_items_id_data=True)
+    # Libraries are saved after the .blend file, in the background.
+    AddonData.save_all(save_items_id_data=True, background=True)
 
 
 @atexit.register
@@ -25,6 +33,9 @@ def on_quit():
         return
     print("[brush_manager] atexit")
     first_time = False
+    # Blender frees its data before Python exits, only the stores can be saved here.
+    from .data.save_scheduler import save_scheduler
+    save_scheduler.flush_stores()
     # from .data import AddonData
     # AddonData.save_all(save_items_id_data=False)
 
@@ -34,11 +45,14 @@ def on_quit():
 
 def register():
     handlers.load_post.append(initialize)
+    handlers.load_pre.append(on_load_pre)
     handlers.save_post.append(on_save_post)
 
 
 def unregister():
     if on_save_post in handlers.save_post:
         handlers.save_post.remove(on_save_post)
+    if on_load_pre in handlers.load_pre:
+        handlers.load_pre.remove(on_load_pre)
     if initialize in handlers.load_post:
         handlers.load_post.remove(initialize)
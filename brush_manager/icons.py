@@ -9,18 +9,154 @@ import numpy as np
 from os.path import splitext, exists, isfile
 import glob
 from os.path import basename
-from os import remove
+from os import remove, walk
+from os.path import join
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from time import time
+from typing import Iterable, Callable
 
 from .paths import Paths
+from .utils.callback import CallbackSetCollection
+from .utils.thumbnail import make_thumbnail, is_supported as is_thumbnail_supported, ThumbnailError
+from .utils.png import PNGError
 
 preview_collections: dict[str, previews.ImagePreviewCollection] = {}
 
+# Called with the uuid of an icon whose preview changed or was released (icon ID is not valid anymore).
+callback__IconsChange = CallbackSetCollection.init('Icons', 'icons.change')
+
 
 # icon_previews: previews.ImagePreviewCollection = None
 icon_gputex: dict[str, GPUTexture] = {}
 
 GPUTEX_ICON_SIZE = 128, 128
 
+# Icon previews are loaded on demand, the ones that are about to be drawn can be prefetched in the background.
+PREFETCH_INTERVAL = 0.05
+PREFETCH_BUDGET = 0.004 # seconds per step.
+prefetch_queue: deque[tuple[str, str]] = deque()
+
+# Icon files in the user icons folder, so drawing doesn't need to check the filesystem for every icon.
+# Filled the first time it is needed, then kept in sync by the code that writes and removes icons.
+ICONS_DIR = Paths.Icons._ICONS()
+_icon_files: set[str] | None = None
+
+# Thumbnails of the icons asigned by the user are made in a background thread,
+# their previews are created from a timer once they are done.
+THUMBNAIL_POLL_INTERVAL = 0.1
+_thumbnail_executor: ThreadPoolExecutor | None = None
+_thumbnail_jobs: list[tuple[Future, str, str, str]] = []
+
+# Memory budgets for the item and category icons (see 'set_icon_cache_budget').
+PREVIEW_CACHE_MAX_ENTRIES = 2048
+PREVIEW_CACHE_MAX_BYTES = 64 << 20
+GPUTEX_CACHE_MAX_ENTRIES = 512
+GPUTEX_CACHE_MAX_BYTES = 64 << 20
+
+# Estimated memory of a preview (image + icon), actual size is not known until Blender loads it.
+PREVIEW_BYTES = (128 * 128 + 32 * 32) * 4
+
+
+class IconCache:
+    ''' Least recently used icons, evicted when the entry or byte budget is exceeded.
+        Pinned icons (eg. the ones of the active category) are never evicted. '''
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, on_evict: Callable[[str], None]) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+
+        self.entries: OrderedDict[str, int] = OrderedDict() # uuid -> bytes.
+        self.pinned: set[str] = set()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'pinned': len(self.pinned),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def touch(self, uuid: str) -> None:
+        ''' Icon was requested and is in memory. '''
+        self.hits += 1
+        self.entries.move_to_end(uuid)
+
+    def add(self, uuid: str, nbytes: int) -> None:
+        ''' Icon was requested and it had to be loaded. '''
+        self.misses += 1
+        self.size += nbytes - self.entries.pop(uuid, 0)
+        self.entries[uuid] = nbytes
+        self.evict()
+
+    def discard(self, uuid: str) -> None:
+        self.size -= self.entries.pop(uuid, 0)
+
+    def evict(self) -> None:
+        if len(self.entries) <= self.max_entries and self.size <= self.max_bytes:
+            return
+        # NOTE: the most recent icon is never evicted, it is about to be used.
+        for uuid in list(self.entries.keys())[:-1]:
+            if len(self.entries) <= self.max_entries and self.size <= self.max_bytes:
+                break
+            if uuid in self.pinned:
+                continue
+            self.discard(uuid)
+            self.evictions += 1
+            self.on_evict(uuid)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.pinned.clear()
+        self.size = 0
+
+
+def _evict_preview(uuid: str) -> None:
+    if (pcoll := preview_collections.get('runtime', None)) is not None and uuid in pcoll:
+        # NOTE: ImagePreviewCollection releases the preview on item deletion.
+        del pcoll[uuid]
+        callback__IconsChange(uuid)
+
+
+def _evict_gputex(uuid: str) -> None:
+    icon_gputex.pop(uuid, None)
+
+
+preview_cache = IconCache('previews', PREVIEW_CACHE_MAX_ENTRIES, PREVIEW_CACHE_MAX_BYTES, _evict_preview)
+gputex_cache = IconCache('gputex', GPUTEX_CACHE_MAX_ENTRIES, GPUTEX_CACHE_MAX_BYTES, _evict_gputex)
+
+
+def set_icon_cache_budget(max_previews: int | None = None, max_preview_bytes: int | None = None,
+                          max_gputex: int | None = None, max_gputex_bytes: int | None = None) -> None:
+    for cache, max_entries, max_bytes in ((preview_cache, max_previews, max_preview_bytes), (gputex_cache, max_gputex, max_gputex_bytes)):
+        if max_entries is not None:
+            cache.max_entries = max_entries
+        if max_bytes is not None:
+            cache.max_bytes = max_bytes
+        cache.evict()
+
+
+def pin_icons(uuids: Iterable[str]) -> None:
+    ''' Keep these icons in memory (replaces the previous pinned icons). '''
+    pinned = set(uuids)
+    for cache in (preview_cache, gputex_cache):
+        cache.pinned = pinned
+        cache.evict()
+
+
+def get_icon_cache_stats() -> dict[str, dict[str, int]]:
+    return {cache.name: cache.stats for cache in (preview_cache, gputex_cache)}
+
 
 class Icons(Enum):
     BRUSH_PLACEHOLDER = auto()
@@ -45,6 +181,30 @@ class Icons(Enum):
         layout.label(text=text, icon_value=self.icon_id)
 
 
+def refresh_icon_files() -> None:
+    ''' Scan the icons folder again, eg. after icons were written by another process. '''
+    global _icon_files
+    _icon_files = {join(dirpath, filename) for dirpath, _dirnames, filenames in walk(ICONS_DIR) for filename in filenames}
+
+
+def tag_icon_file(filepath: str, present: bool = True) -> None:
+    ''' Keep the icon files index up to date when an icon file is written or removed. '''
+    if _icon_files is None:
+        return
+    if present:
+        _icon_files.add(filepath)
+    else:
+        _icon_files.discard(filepath)
+
+
+def icon_file_exists(filepath: str) -> bool:
+    if not filepath.startswith(ICONS_DIR):
+        return exists(filepath) and isfile(filepath)
+    if _icon_files is None:
+        refresh_icon_files()
+    return filepath in _icon_files
+
+
 def create_preview_from_filepath(uuid: str, input_filepath: str, output_filepath: str):
     if not isinstance(input_filepath, str) or not isinstance(output_filepath, str):
         raise TypeError("path should be string, bytes, os.PathLike or integer, not ", type(input_filepath), type(output_filepath))
@@ -52,6 +212,23 @@ def create_preview_from_filepath(uuid: str, input_filepath: str, output_filepath
     if exists(output_filepath):
         remove(output_filepath)
 
+    if is_thumbnail_supported(input_filepath):
+        # Decoding a big image takes a while, the preview is created once it is done ('_poll_thumbnail_jobs').
+        global _thumbnail_executor
+        if _thumbnail_executor is None:
+            _thumbnail_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='brush_manager_thumbnail')
+        future = _thumbnail_executor.submit(make_thumbnail, input_filepath, output_filepath, (92, 92))
+        _thumbnail_jobs.append((future, uuid, input_filepath, output_filepath))
+        if not bpy.app.timers.is_registered(_poll_thumbnail_jobs):
+            bpy.app.timers.register(_poll_thumbnail_jobs, first_interval=THUMBNAIL_POLL_INTERVAL)
+        return
+
+    _make_thumbnail_with_bpy(input_filepath, output_filepath)
+    _on_thumbnail_done(uuid, output_filepath)
+
+
+def _make_thumbnail_with_bpy(input_filepath: str, output_filepath: str) -> None:
+    # Fallback to Blender's image loading.
     image = bpy.data.images.load(input_filepath)
     image.scale(92, 92)
     image.filepath_raw = output_filepath
@@ -59,7 +236,33 @@ def create_preview_from_filepath(uuid: str, input_filepath: str, output_filepath
     bpy.data.images.remove(image)
     del image
 
+
+def _on_thumbnail_done(uuid: str, output_filepath: str) -> None:
+    tag_icon_file(output_filepath)
+
     new_preview(uuid, output_filepath, collection='runtime', force_reload=True)
+    callback__IconsChange(uuid)
+
+
+def _poll_thumbnail_jobs() -> float | None:
+    for job in [job for job in _thumbnail_jobs if job[0].done()]:
+        _thumbnail_jobs.remove(job)
+        future, uuid, input_filepath, output_filepath = job
+        # A failed job must not stop the timer, the other jobs are done too.
+        try:
+            future.result()
+        except (ThumbnailError, PNGError) as e:
+            print(f"[brush_manager] WARN! Could not make the icon '{output_filepath}' without bpy: {e}")
+            try:
+                _make_thumbnail_with_bpy(input_filepath, output_filepath)
+            except RuntimeError as e:
+                print(f"[brush_manager] ERROR! Could not make the icon '{output_filepath}': {e}")
+                continue
+        except (OSError, MemoryError) as e:
+            print(f"[brush_manager] ERROR! Could not write the icon '{output_filepath}': {e}")
+            continue
+        _on_thumbnail_done(uuid, output_filepath)
+    return THUMBNAIL_POLL_INTERVAL if _thumbnail_jobs else None
 
 
 def new_preview(uuid: str, filepath: str, collection: str = 'runtime', force_reload: bool = True) -> None:
@@ -67,15 +270,18 @@ def new_preview(uuid: str, filepath: str, collection: str = 'runtime', force_rel
     if preview := preview_collections[collection].get(uuid, None):
         del preview
         del preview_collections[collection][uuid]
-    return preview_collections[collection].load(
+    preview = preview_collections[collection].load(
         uuid, # basename(filepath)[:-4],
         filepath,
         'IMAGE',
         force_reload=force_reload
     )
+    if collection == 'runtime':
+        preview_cache.add(uuid, PREVIEW_BYTES)
+    return preview
 
 def get_preview(uuid: str, filepath: str, collection: str = 'runtime') -> int:
-    if not exists(filepath) or not isfile(filepath):
+    if not icon_file_exists(filepath):
         # print("\t>", uuid, " DOES NOT EXIST > ", filepath)
         return 0
     # bpy.utils.user_resource('SCRIPTS', path='Brush Manager\icons', create=False)
@@ -83,8 +289,11 @@ def get_preview(uuid: str, filepath: str, collection: str = 'runtime') -> int:
     if uuid not in pcoll:
         # if filepath in pcoll:
         #     return pcoll[filepath].icon_id
-        new_preview(uuid, filepath, collection)
-    p: ImagePreview = pcoll[uuid]
+        p: ImagePreview = new_preview(uuid, filepath, collection)
+    else:
+        p: ImagePreview = pcoll[uuid]
+        if collection == 'runtime':
+            preview_cache.touch(uuid)
     return p.icon_id
 
 
@@ -109,19 +318,45 @@ def get_preview(uuid: str, filepath: str, collection: str = 'runtime') -> int:
     return 0
 
 
+def prefetch_previews(icons: Iterable[tuple[str, str]]) -> None:
+    ''' Load the previews of the given (uuid, filepath) icons in small steps, without blocking the UI.
+        Replaces any previous prefetch request. '''
+    prefetch_queue.clear()
+    prefetch_queue.extend(icons)
+    if prefetch_queue and not bpy.app.timers.is_registered(_prefetch_previews_step):
+        bpy.app.timers.register(_prefetch_previews_step, first_interval=PREFETCH_INTERVAL)
+
+
+def _prefetch_previews_step() -> float | None:
+    pcoll = preview_collections.get('runtime', None)
+    if pcoll is None:
+        prefetch_queue.clear()
+        return None
+
+    deadline = time() + PREFETCH_BUDGET
+    while prefetch_queue and time() < deadline:
+        uuid, filepath = prefetch_queue.popleft()
+        if uuid not in pcoll:
+            get_preview(uuid, filepath)
+
+    return PREFETCH_INTERVAL if prefetch_queue else None
+
+
 def new_gputex(uuid: str, filepath: str) -> GPUTexture:
     image: Image = bpy.data.images.load(filepath)
     gputex = texture.from_image(image)
     bpy.data.images.remove(image)
     del image
     icon_gputex[uuid] = gputex
+    gputex_cache.add(uuid, gputex.width * gputex.height * 4)
     return gputex
 
 
 def get_gputex(uuid: str, filepath: str, fallback: GPUTexture | None = None) -> GPUTexture:
     if gputex := icon_gputex.get(uuid, None):
+        gputex_cache.touch(uuid)
         return gputex
-    if not exists(filepath) or not isfile(filepath):
+    if not icon_file_exists(filepath):
         # print("\t>", uuid, " DOES NOT EXIST > ", filepath)
         return fallback
     return new_gputex(uuid, filepath)
@@ -132,18 +367,24 @@ def clear_icon(uuid: str, icon_filepath: str) -> None:
         raise TypeError("path should be string, bytes, os.PathLike or integer, not ", type(icon_filepath))
 
     if not exists(icon_filepath) or not isfile(icon_filepath):
+        tag_icon_file(icon_filepath, present=False)
+        callback__IconsChange(uuid)
         return
     
     remove(icon_filepath)
+    tag_icon_file(icon_filepath, present=False)
 
     if gputex := icon_gputex.get(uuid, None):
         del gputex
         del icon_gputex[uuid]
+    gputex_cache.discard(uuid)
 
     if preview_coll := preview_collections.get('runtime', None):
         if preview := preview_coll.get(uuid, None):
             del preview
             del preview_coll[uuid]
+    preview_cache.discard(uuid)
+    callback__IconsChange(uuid)
 
 
 def register_icons():
@@ -151,14 +392,12 @@ def register_icons():
         bpy.utils.previews.remove(preview_collections['builtin'])
         bpy.utils.previews.remove(preview_collections['runtime'])
         preview_collections.clear()
+    preview_cache.clear()
     preview_collections['builtin'] = previews.new()
     preview_collections['runtime'] = previews.new()
     from .paths import Paths
 
-    for filepath in glob.glob(Paths.Icons._ICONS('**', '*.png')):
-        uuid, ext = splitext(basename(filepath))
-        new_preview(uuid, filepath, collection='runtime')
-        # new_gputex(uuid, filepath)
+    # NOTE: item and category icons ('runtime' collection) are loaded on demand by 'get_preview'.
 
     for filepath in glob.glob(Paths.Images._IMAGES('**', '*.png')):
         uuid, ext = splitext(basename(filepath))
@@ -170,7 +409,22 @@ def register():
 
 
 def unregister():
+    global _thumbnail_executor
+    prefetch_queue.clear()
+    if bpy.app.timers.is_registered(_prefetch_previews_step):
+        bpy.app.timers.unregister(_prefetch_previews_step)
+
+    if bpy.app.timers.is_registered(_poll_thumbnail_jobs):
+        bpy.app.timers.unregister(_poll_thumbnail_jobs)
+    _thumbnail_jobs.clear()
+    if _thumbnail_executor is not None:
+        _thumbnail_executor.shutdown(wait=True, cancel_futures=True)
+        _thumbnail_executor = None
+
     # icon_previews.close()
     bpy.utils.previews.remove(preview_collections['builtin'])
     bpy.utils.previews.remove(preview_collections['runtime'])
     preview_collections.clear()
+    preview_cache.clear()
+    gputex_cache.clear()
+    icon_gputex.clear()
@@ -87,3 +87,4 @@ class RenameCategory(Reg.Ops.INVOKE_PROPS_POPUP):
 
     def action(self, *args) -> None:
         self.cat.name = self.cat_name
+        self.cat.tag_dirty()
@@ -43,14 +43,18 @@ class SelectAll(Reg.Ops.ACTION):
         if self.select_action == 'TOGGLE':
             for item in cat.items:
                 item.select = not item.select
+                item.tag_dirty()
 
         elif self.select_action == 'DESELECT_ALL':
             for item in cat.items.selected:
                 item.select = False
+                item.tag_dirty()
 
         elif self.select_action == 'SELECT_ALL':
             for item in cat.items:
-                item.select = True
+                if not item.select:
+                    item.select = True
+                    item.tag_dirty()
 
 
 @Reg.Ops.setup
@@ -67,6 +71,7 @@ class SelectItem(Reg.Ops.ACTION):
             return
         if item := cat.items.get(self.item_uuid):
             item.select = not item.select
+            item.tag_dirty()
 
 
 @Reg.Ops.setup
@@ -115,7 +120,7 @@ class AsignIconToBrush(Reg.Ops.Import.PNG):
     brush_uuid: StringProperty(default='', options={'HIDDEN', 'SKIP_SAVE'})
 
     def get_data(self, _ui_props: UIProps, addon_data: AddonDataByMode) -> bm_types.Category:
-        return addon_data.active_category.items.get(self.brush_uuid) if self.brush_uuid != '' else addon_data.active_brush
+        return addon_data.get_item(self.brush_uuid) if self.brush_uuid != '' else addon_data.active_brush
 
     def action(self, brush: bm_types.BrushItem | None) -> None:
         if brush is not None:
@@ -132,16 +137,7 @@ class RenameItem(Reg.Ops.INVOKE_PROPS_POPUP):
     def get_item(self, ui_props: UIProps, addon_data: AddonDataByMode) -> bm_types.Category:
         if self.item_uuid == '':
             return addon_data.active_item
-
-        if ui_props.is_ctx_brush:
-            cat = addon_data.brush_cats.active
-        else:
-            cat = addon_data.texture_cats.active
-
-        if cat is None:
-            return None
-
-        return cat.items.get(self.item_uuid)
+        return addon_data.get_item(self.item_uuid)
     
     def invoke(self, context: Context, event: Event):
         bm_data = AddonData.get_data_by_context(context)
@@ -154,6 +150,7 @@ class RenameItem(Reg.Ops.INVOKE_PROPS_POPUP):
 
     def action(self, *args) -> None:
         self.item.name = self.item_name
+        self.item.tag_dirty()
         
         # If we have id_data, we need to update its custom_prop 'name'.
         if bl_id := self.item.id_data:
@@ -167,9 +164,8 @@ class DuplicateBrush(Reg.Ops.ACTION):
     brush_uuid : StringProperty(default='', options={'HIDDEN', 'SKIP_SAVE'})
 
     def action(self, context: Context, ui_props: UIProps, bm_data: AddonDataByMode):
-        cat = bm_data.brush_cats.active
-        brush = cat.items.get(self.brush_uuid)
+        brush = bm_data.get_item(self.brush_uuid)
         if brush is None:
             return
 
-        cat.items.duplicate(brush)
+        brush.collection.duplicate(brush)
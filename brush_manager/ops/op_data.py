@@ -7,6 +7,10 @@ from shutil import rmtree
 @Reg.Ops.setup
 class ClearData(Reg.Ops.ACTION):
     def action(self, *args) -> None:
+        # Pending saves would write the removed data again.
+        from brush_manager.data.save_scheduler import save_scheduler
+        save_scheduler.cancel()
+
         data_path = Paths.DATA
         if data_path.exists() and data_path.is_dir():
             rmtree(data_path)
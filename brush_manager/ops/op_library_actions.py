@@ -4,63 +4,158 @@ from bpy.types import Event, Context
 from bpy.props import StringProperty, BoolProperty
 
 from os.path import basename
+from os import cpu_count, environ
 from pathlib import Path
-from time import time, sleep
+from time import time
+from math import ceil
+import hmac
 import json
+import secrets
+import socket
 import subprocess
+import tempfile
 from collections import deque
-from typing import Type
+from typing import Type, Iterator, Iterable
 
 from ..paths import Paths
+from ..icons import refresh_icon_files
 from ..types import UIProps, AddonDataByMode, BrushItem, TextureItem, Item
 from brush_manager.addon_utils import Reg
 from brush_manager.globals import GLOBALS
 
 
+# Seconds to wait for the export subprocess to send the library data.
+EXPORT_TIMEOUT = 60
+# Seconds to wait for the export subprocess to finish the icons, once the data was received.
+EXPORT_FINISH_TIMEOUT = 300
 
-@Reg.Ops.setup
-class ImportLibrary(Reg.Ops.Import.BLEND):
-    bl_idname = 'brushmanager.import_library'
-    bl_label = "Import a .blend Library"
+# Timer intervals (seconds) while waiting for the export data and while adding the items.
+WAIT_INTERVAL = 0.1
+INGEST_INTERVAL = 0.0
 
-    # INTERNAL PROPERTY... MUST HAVE ENABLED.
-    create_category: BoolProperty(
-        default=True,
-        name="Setup Category",
-        description="Create a category from",
-        options={'HIDDEN'}
-    )
+# Time (seconds) spent adding items at every step, so the UI keeps responsive.
+INGEST_BUDGET = 0.005
 
-    custom_uuid: StringProperty(default='')
+# Library files are written by several background Blender processes (workers), each one with a shard of the items.
+# Every worker loads the whole source .blend so we avoid using many of them for small libraries.
+MIN_ITEMS_PER_WORKER = 16
+MAX_WORKERS = 8
+# Times a shard is written before giving up on its items.
+SHARD_MAX_ATTEMPTS = 2
 
-    exclude_defaults: BoolProperty(default=True, options={'HIDDEN', 'SKIP_SAVE'})
 
-    use_modal: BoolProperty(default=True, options={'HIDDEN', 'SKIP_SAVE'})
+import_jobs: list['LibraryImportJob'] = []
 
-    def action(self, context: Context, ui_props: UIProps, addon_data: AddonDataByMode) -> None:
-        print("[brush_manager] ImportLibrary:", self.filepath)
 
-        if self.filepath == '':
-            self.report({'WARNING'}, "[brush_manager] ImportLibrary: filepath is empty")
-            return {'CANCELLED'}
+def get_import_job(filepath: str, addon_data: AddonDataByMode) -> 'LibraryImportJob | None':
+    # Every mode imports the same default library, a job is of a single mode.
+    for job in import_jobs:
+        if job.filepath == filepath and job.addon_data is addon_data:
+            return job
+    return None
 
-        blendpath = Path(self.filepath)
-        if not blendpath.is_file() or not blendpath.exists():
-            self.report({'WARNING'}, "[brush_manager] ImportLibrary: Invalid file-path: %s" % self.filepath)
-            return {'CANCELLED'}
 
-        if addon_data.get_brush_cat(self.custom_uuid) is not None:
-            self.report({'WARNING'}, "[brush_manager] ImportLibrary: a custom cat already exist with UUID: %s" % self.custom_uuid)
-            return {'CANCELLED'}
+def take_until(queue: deque, deadline: float) -> Iterator[dict]:
+    ''' Pops elements from the queue until it is empty or the deadline is reached. '''
+    while queue and time() < deadline:
+        yield queue.popleft()
+
+
+def get_workers_count(items_count: int) -> int:
+    return max(1, min((cpu_count() or 1) - 1, MAX_WORKERS, ceil(items_count / MIN_ITEMS_PER_WORKER)))
 
-        GLOBALS.is_importing_a_library = True
 
-        export_json: Path = Paths.Scripts._SCRIPTS(f'export_{blendpath.stem}.json', as_path=True)
-        if export_json.exists():
-            export_json.unlink(missing_ok=True)
+class ShardWorker:
+    ''' Background Blender that writes the library files of a shard of the imported items. '''
 
+    def __init__(self, index: int, blendpath: str, brush_uuids: list[str], texture_uuids: list[str], attempt: int = 1) -> None:
+        self.index = index
+        self.blendpath = blendpath
+        self.brush_uuids = brush_uuids
+        self.texture_uuids = texture_uuids
+        self.attempt = attempt
+
+        fd, self.shard_filepath = tempfile.mkstemp(prefix='brush_manager_shard_', suffix='.json')
+        with open(fd, 'w') as shard_file:
+            json.dump({'brushes': brush_uuids, 'textures': texture_uuids}, shard_file)
+
+        self.process = subprocess.Popen(
+            [
+                bpy.app.binary_path,
+                blendpath,
+                '--background',
+                '--python',
+                Paths.Scripts.WRITE_LIBS(),
+                '-',
+                self.shard_filepath,
+            ],
+            stdout=None,
+            stderr=None,
+            shell=False
+        )
+
+    def poll(self) -> int | None:
+        ''' Returns the exit code of the worker, None if it is still running. '''
+        returncode = self.process.poll()
+        if returncode is not None:
+            Path(self.shard_filepath).unlink(missing_ok=True)
+        return returncode
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.wait()
+        self.poll()
+
+    def retry(self) -> 'ShardWorker':
+        return ShardWorker(self.index, self.blendpath, self.brush_uuids, self.texture_uuids, self.attempt + 1)
+
+
+class LibraryImportJob:
+    ''' Imports the brushes and textures of a .blend library without blocking the UI.
+        A background Blender exports the library data and sends it back through a local socket,
+        then the items are added to BM_DATA, a bit at every step. '''
+
+    filepath: str
+    error: str
+    on_finish: list[callable]
+
+    @property
+    def is_waiting(self) -> bool:
+        return self.libdata is None
+
+    @property
+    def is_ingesting(self) -> bool:
+        return self.libdata is not None and bool(self.brushes or self.textures)
+
+    def __init__(self, filepath: str, addon_data: AddonDataByMode, custom_uuid: str = '', exclude_defaults: bool = True) -> None:
+        self.filepath = filepath
+        self.addon_data = addon_data
+        self.custom_uuid = custom_uuid
+        self.exclude_defaults = exclude_defaults
+
+        self.error = ''
+        self.on_finish = []
+
+        self.process: subprocess.Popen | None = None
+        self.server: socket.socket | None = None
+        self.connection: socket.socket | None = None
+        self.token = secrets.token_hex(16).encode('ascii')
+        self.is_authenticated = False
+        self.buffer = bytearray()
+        self.timeout = 0.0
+
+        self.libdata: dict[str, list[dict]] | None = None
+
+        self.workers: list[ShardWorker] = []
+        self.failed_shards: list[ShardWorker] = []
+
+    def start(self) -> None:
         print("[brush_manager] ImportLibrary: Start Subprocess")
 
+        # The export subprocess connects to this socket to send its data.
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.server.setblocking(False)
+
         self.process = subprocess.Popen(
             [
                 bpy.app.binary_path,
@@ -69,70 +164,110 @@ class ImportLibrary(Reg.Ops.Import.BLEND):
                 '--python',
                 Paths.Scripts.EXPORT(),
                 '-',
-                str(export_json),
-                ui_props.ui_context_mode,
+                str(self.server.getsockname()[1]),
+                self.addon_data.mode,
                 str(int(self.exclude_defaults)),
             ],
+            # The subprocess sends the token first, so connections from anyone else are dropped.
+            # NOTE: through the environment, as the command line is visible to other users.
+            env={**environ, 'BM_EXPORT_TOKEN': self.token.decode('ascii')},
             stdout=None,
             stderr=None,
             shell=False
         )
 
-        timeout = time() + 60 # 1 minute timeout
-        ## print("Wait until timeout or export json completion")
-        while 1:
-            if self.process.poll() is not None:
-                self.end()
-                raise TimeoutError("[brush_manager] ImportLibrary: Subprocess failed!")
-            if export_json.exists():
-                ## print("WE CAN NOW IMPORT JSON DATA")
-                break
-            if time() > timeout:
-                self.end()
-                raise TimeoutError("[brush_manager] ImportLibrary: Timeout expired for checking json existence")
-
-        sleep(0.1)
-
-        timeout = time() + 30 # 30 seconds timeout
-        libdata = None
-        while libdata is None:
-            with export_json.open('r') as f:
-                raw_data = f.read()
-                if not raw_data:
-                    print("\t> No raw data in export.json")
-                    sleep(0.1)
-                    break
-                libdata: dict[str, dict] = json.loads(raw_data)
-
-            if time() > timeout:
-                raise TimeoutError("[brush_manager] ImportLibrary: Timeout expired for reading json")
-
-        if libdata is None:
-            print("\t> Invalid data in export.json")
-            self.end()
-            return {'CANCELLED'}
+        self.timeout = time() + EXPORT_TIMEOUT
+        GLOBALS.is_importing_a_library = True
+        import_jobs.append(self)
+
+    def _receive(self) -> bool:
+        ''' Non-blocking read of the export data. Returns True once all of it was received. '''
+        if self.connection is None:
+            try:
+                self.connection, _address = self.server.accept()
+            except BlockingIOError:
+                if self.process.poll() is not None:
+                    self.cancel("Subprocess failed!")
+                elif time() > self.timeout:
+                    self.cancel("Timeout expired for receiving the library data")
+                return False
+            self.connection.setblocking(False)
 
-        export_json.unlink()
+        while 1:
+            try:
+                chunk = self.connection.recv(1 << 16)
+            except BlockingIOError:
+                if time() > self.timeout:
+                    self.cancel("Timeout expired for receiving the library data")
+                return False
+            except OSError as e:
+                self.cancel(f"Connection with the subprocess failed! {e}")
+                return False
+            if not chunk:
+                if not self.is_authenticated:
+                    self._drop_connection()
+                    return False
+                # The subprocess closed the connection. We have it all.
+                return True
+            self.buffer.extend(chunk)
+
+            if not self.is_authenticated and len(self.buffer) >= len(self.token):
+                if not hmac.compare_digest(bytes(self.buffer[:len(self.token)]), self.token):
+                    print("WARN! [brush_manager] ImportLibrary: Dropped a connection with an invalid token")
+                    self._drop_connection()
+                    return False
+                del self.buffer[:len(self.token)]
+                self.is_authenticated = True
+
+    def _drop_connection(self) -> None:
+        # Not from our subprocess. Wait for another one.
+        self.connection.close()
+        self.connection = None
+        self.buffer.clear()
+
+    def _close_socket(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def _setup(self) -> bool:
+        try:
+            libdata: dict[str, list[dict]] = json.loads(self.buffer)
+        except ValueError:
+            self.cancel("Invalid library data")
+            return False
+        finally:
+            self._close_socket()
+            self.buffer.clear()
+
+        # The export subprocess goes on with the icons.
+        self.timeout = time() + EXPORT_FINISH_TIMEOUT
 
         # PREPARE queue FOR MODAL ITERATION.
+        self.libdata = libdata
         self.brushes = deque(libdata['brushes'])
         self.textures = deque(libdata['textures'])
 
-        self.brushes_count = brushes_count = len(self.brushes)
-        self.textures_count = textures_count = len(self.textures)
+        brushes_count = len(self.brushes)
+        textures_count = len(self.textures)
 
-        print(f"[brush_manager] ImportLibrary: export.json -> brushes_count {brushes_count}; textures_count {textures_count}")
+        print(f"[brush_manager] ImportLibrary: brushes_count {brushes_count}; textures_count {textures_count}")
 
         if brushes_count == 0 and textures_count == 0:
-            print("WARN: [brush_manager] ImportLibrary: No data in export.json")
-            self.end()
-            return {'CANCELLED'}
+            self.cancel("No data in the library")
+            return False
+
+        self._start_workers(self.brushes, self.textures)
 
         # Create category.
         brush_cat = None
         texture_cat = None
 
-        ui_props = UIProps.get_data(context)
+        addon_data = self.addon_data
+        ui_props = UIProps.get_data(bpy.context)
 
         lib_name = Path(self.filepath).stem.title()
 
@@ -147,77 +282,238 @@ class ImportLibrary(Reg.Ops.Import.BLEND):
             brush_cat = addon_data.new_brush_cat(lib_name, self.custom_uuid)
 
         # Util functions to add data items.
-        brush_cat_items_add = brush_cat.items.add if brushes_count != 0 else None
-        texture_cat_items_add = texture_cat.items.add if textures_count != 0 else None
+        brush_cat_items_add_batch = brush_cat.items.add_batch if brushes_count != 0 else None
+        texture_cat_items_add_batch = texture_cat.items.add_batch if textures_count != 0 else None
 
         texture_items: dict[str, object] = {}
 
-        def _add_brush_to_data(item_data: dict):
-            tex_item = texture_items.get(item_data.pop('texture_uuid', ''), None)
-            brush_cat_items_add(texture=tex_item, **item_data) # item_data['uuid']
+        def _with_texture(brushes_data: Iterator[dict]) -> Iterator[dict]:
+            for item_data in brushes_data:
+                item_data['texture'] = texture_items.get(item_data.pop('texture_uuid', ''), None)
+                yield item_data
+
+        def _add_brushes_to_data(deadline: float):
+            brush_cat_items_add_batch(_with_texture(take_until(self.brushes, deadline)))
+
+        def _add_textures_to_data(deadline: float):
+            for tex_item in texture_cat_items_add_batch(take_until(self.textures, deadline)):
+                texture_items[tex_item.uuid] = tex_item
+
+        self.add_brushes_to_data = _add_brushes_to_data
+        self.add_textures_to_data = _add_textures_to_data
+        return True
+
+    def _start_workers(self, brushes_data: Iterable[dict], textures_data: Iterable[dict]) -> None:
+        # NOTE: the export subprocess saved the library .blend with the UUIDs before sending the data.
+        brush_uuids = [item['uuid'] for item in brushes_data]
+
+        # Textures with the same image (content hash) write a single shared library,
+        # so they are kept together in the same shard.
+        texture_groups_by_hash: dict[str, list[str]] = {}
+        for item in textures_data:
+            texture_groups_by_hash.setdefault(item.get('content_hash') or item['uuid'], []).append(item['uuid'])
+        texture_groups = list(texture_groups_by_hash.values())
+
+        n_workers = get_workers_count(len(brush_uuids) + len(texture_groups))
+        print(f"[brush_manager] ImportLibrary: Write libraries with {n_workers} workers")
+        self.workers = [
+            ShardWorker(
+                index,
+                self.filepath,
+                brush_uuids[index::n_workers],
+                [uuid for group in texture_groups[index::n_workers] for uuid in group]
+            )
+            for index in range(n_workers)
+        ]
+        self.workers_count = n_workers
+
+    def _poll_workers(self) -> None:
+        for worker in list(self.workers):
+            returncode = worker.poll()
+            if returncode is None:
+                continue
+            self.workers.remove(worker)
+            if returncode != 0:
+                print(f"ERROR: [brush_manager] ImportLibrary: shard {worker.index + 1}/{self.workers_count} failed with code {returncode}")
+                if worker.attempt < SHARD_MAX_ATTEMPTS:
+                    print(f"[brush_manager] ImportLibrary: retrying shard {worker.index + 1}/{self.workers_count}")
+                    self.workers.append(worker.retry())
+                else:
+                    self.failed_shards.append(worker)
+            else:
+                print(f"[brush_manager] ImportLibrary: shard {worker.index + 1}/{self.workers_count} done")
+
+    def step(self) -> bool:
+        ''' Returns True when the job is done (finished or cancelled). '''
+        if self.error:
+            return True
+
+        if self.is_waiting:
+            if not self._receive():
+                return bool(self.error)
+            return not self._setup()
+
+        if self.workers:
+            self._poll_workers()
+
+        # Add as many items as fit in the time budget.
+        # Textures go first since brushes link to them.
+        deadline = time() + INGEST_BUDGET
+
+        if self.textures:
+            self.add_textures_to_data(deadline)
+            if self.textures:
+                return False
+
+        if self.brushes:
+            self.add_brushes_to_data(deadline)
+            if self.brushes:
+                return False
+
+        # Items are in, now wait for the libraries and the icons to be written.
+        if self.process.poll() is None:
+            if time() < self.timeout:
+                return False
+            # Icons that are not done by now are missing, the items don't need them.
+            print("ERROR: [brush_manager] ImportLibrary: Timeout expired for the export subprocess, killing it")
+            self._kill_process()
+        if self.workers:
+            return False
+
+        refresh_icon_files()
+
+        self.finish()
+        return True
+
+    @property
+    def step_interval(self) -> float:
+        return INGEST_INTERVAL if self.is_ingesting else WAIT_INTERVAL
+
+    def timer_step(self) -> float | None:
+        ''' To be used as a bpy.app.timers function. '''
+        if self.step():
+            return None
+        return self.step_interval
+
+    def _kill_process(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    def end(self) -> None:
+        self._close_socket()
+        self._kill_process()
+        for worker in self.workers:
+            worker.kill()
+        self.workers.clear()
+        if self in import_jobs:
+            import_jobs.remove(self)
+        GLOBALS.is_importing_a_library = len(import_jobs) != 0
+
+    def _remove_failed_items(self) -> int:
+        ''' Removes the items of the shards without library files. Returns how many were removed. '''
+        removed_count = 0
+        for worker in self.failed_shards:
+            for uuid in worker.brush_uuids + worker.texture_uuids:
+                if (item := self.addon_data.get_item(uuid)) is not None:
+                    item.remove()
+                    removed_count += 1
+        return removed_count
+
+    def finish(self) -> None:
+        self.end()
+        if self.failed_shards:
+            removed_count = self._remove_failed_items()
+            self.error = f"{len(self.failed_shards)} of {self.workers_count} shards failed to write their libraries, {removed_count} items were not imported"
+            print(f"ERROR: [brush_manager] ImportLibrary: {self.error}")
+        self.addon_data.save()
+        for on_finish in self.on_finish:
+            on_finish()
+
+    def cancel(self, error: str) -> None:
+        print(f"ERROR: [brush_manager] ImportLibrary: {error}")
+        self.error = error
+        self.end()
 
-        def _add_tex_to_data(item_data: dict):
-            texture_items[item_data['uuid']] = texture_cat_items_add(**item_data)
 
-        self.add_brush_to_data = _add_brush_to_data
-        self.add_texture_to_data = _add_tex_to_data
+@Reg.Ops.setup
+class ImportLibrary(Reg.Ops.Import.BLEND):
+    bl_idname = 'brushmanager.import_library'
+    bl_label = "Import a .blend Library"
 
-        self.refresh_timer = time() + .2
-        self.addon_data = addon_data
+    # INTERNAL PROPERTY... MUST HAVE ENABLED.
+    create_category: BoolProperty(
+        default=True,
+        name="Setup Category",
+        description="Create a category from",
+        options={'HIDDEN'}
+    )
+
+    custom_uuid: StringProperty(default='')
+
+    exclude_defaults: BoolProperty(default=True, options={'HIDDEN', 'SKIP_SAVE'})
+
+    use_modal: BoolProperty(default=True, options={'HIDDEN', 'SKIP_SAVE'})
+
+    def action(self, context: Context, ui_props: UIProps, addon_data: AddonDataByMode) -> None:
+        print("[brush_manager] ImportLibrary:", self.filepath)
+
+        if self.filepath == '':
+            self.report({'WARNING'}, "[brush_manager] ImportLibrary: filepath is empty")
+            return {'CANCELLED'}
+
+        blendpath = Path(self.filepath)
+        if not blendpath.is_file() or not blendpath.exists():
+            self.report({'WARNING'}, "[brush_manager] ImportLibrary: Invalid file-path: %s" % self.filepath)
+            return {'CANCELLED'}
+
+        if addon_data.get_brush_cat(self.custom_uuid) is not None:
+            self.report({'WARNING'}, "[brush_manager] ImportLibrary: a custom cat already exist with UUID: %s" % self.custom_uuid)
+            return {'CANCELLED'}
+
+        self.job = job = LibraryImportJob(self.filepath, addon_data, self.custom_uuid, self.exclude_defaults)
+        job.start()
 
         if self.use_modal:
             # print("Create Modal Handler and Timer!")
             if not context.window_manager.modal_handler_add(self):
-                print("ERROR: [brush_manager] ImportLibrary: Window Manager was unable to add a modal handler")
-                self.end()
+                job.cancel("Window Manager was unable to add a modal handler")
                 return {'CANCELLED'}
-            self._timer = context.window_manager.event_timer_add(0.000001, window=context.window)
+            self.refresh_timer = time() + .2
+            self._timer = context.window_manager.event_timer_add(WAIT_INTERVAL, window=context.window)
             self.tag_redraw()
             return {'RUNNING_MODAL'}
 
-        while 1:
-            if 'FINISHED' in self.modal(None, None):
-                break
-        self.end()
+        # No window to run modal, the job goes on in a timer.
+        bpy.app.timers.register(job.timer_step, first_interval=WAIT_INTERVAL)
         return {'FINISHED'}
 
-
-    def end(self):
-        ## self.process.wait()
-        GLOBALS.is_importing_a_library = False
-
     def modal(self, context: Context, event: Event):
         # print(event.type, event.value)
 
-        if event is not None and event.type != 'TIMER':
+        if event.type != 'TIMER':
             return {'PASS_THROUGH'}
 
-        # print("Modal Timer Event...", self.brushes_count, self.textures_count)
-        if context is not None:
+        job: LibraryImportJob = self.job
+        step_interval = job.step_interval
+
+        if not job.step():
+            if job.step_interval != step_interval:
+                # Step faster while adding the items, slower while waiting for the subprocesses.
+                context.window_manager.event_timer_remove(self._timer)
+                self._timer = context.window_manager.event_timer_add(job.step_interval or 0.000001, window=context.window)
             if time() > self.refresh_timer:
                 # Don't over-refresh!
                 self.refresh_timer = time() + .2
                 self.tag_redraw()
-
-        if self.textures_count != 0:
-            self.textures_count -= 1
-            self.add_texture_to_data(self.textures.popleft())
-
             return {'RUNNING_MODAL'}
 
-        if self.brushes_count != 0:
-            self.brushes_count -= 1
-            self.add_brush_to_data(self.brushes.popleft())
-
-            return {'RUNNING_MODAL'}
+        ## print("FINISHED!")
+        context.window_manager.event_timer_remove(self._timer)
+        del self._timer
+        self.tag_redraw()
 
-        if self.brushes_count == 0 and self.textures_count == 0:
-            ## print("FINISHED!")
-            if context is not None:
-                context.window_manager.event_timer_remove(self._timer)
-                del self._timer
-            self.end()
-            self.addon_data.save()
-            return {'FINISHED'}
-
-        return {'RUNNING_MODAL'}
+        if job.error:
+            self.report({'ERROR'}, "[brush_manager] ImportLibrary: " + job.error)
+            return {'CANCELLED'}
+        return {'FINISHED'}
@@ -99,8 +99,6 @@ class Paths: # (_Path, Enum)
         EXPORT = _SCRIPTS / 'export_brushes.py'
         EXPORT_JSON = _SCRIPTS / 'export.json'
         WRITE_LIBS = _SCRIPTS / 'write_libraries.py'
-        
-        CHECK__WRITE_LIBS = _SCRIPTS / 'check_write_libraries.txt'
 
     class Data(_Path_Enum):
         _DATA = user_data
@@ -110,6 +108,11 @@ class Paths: # (_Path, Enum)
         CAT_BRUSH = _DATA / "cat_brushes"
         CAT_TEXTURE = _DATA / "cat_textures"
 
+        STORE = _DATA / "store"
+
+        # Content-addressed texture libraries (shared by items with the same image).
+        CAS_TEXTURE = _DATA / "cas_textures"
+
     class Icons(_Path_Enum):
         _ICONS = user_data / "icons"
 
@@ -118,17 +121,22 @@ class Paths: # (_Path, Enum)
         CAT_BRUSH = _ICONS / "cat_brushes"
         CAT_TEXTURE = _ICONS / "cat_textures"
 
+        CAS_TEXTURE = _ICONS / "cas_textures"
+
 
 Paths.DATA.mkdir(parents=True, exist_ok=True)
 Paths.Data.BRUSH.value.mkdir(exist_ok=True)
 Paths.Data.TEXTURE.value.mkdir(exist_ok=True)
 Paths.Data.CAT_BRUSH.value.mkdir(exist_ok=True)
 Paths.Data.CAT_TEXTURE.value.mkdir(exist_ok=True)
+Paths.Data.STORE.value.mkdir(exist_ok=True)
+Paths.Data.CAS_TEXTURE.value.mkdir(exist_ok=True)
 Paths.Icons._ICONS.value.mkdir(exist_ok=True)
 Paths.Icons.BRUSH.value.mkdir(exist_ok=True)
 Paths.Icons.TEXTURE.value.mkdir(exist_ok=True)
 Paths.Icons.CAT_BRUSH.value.mkdir(exist_ok=True)
 Paths.Icons.CAT_TEXTURE.value.mkdir(exist_ok=True)
+Paths.Icons.CAS_TEXTURE.value.mkdir(exist_ok=True)
 
 '''
 for path_cls in _Path_Enum.__subclasses__():
@@ -1,66 +1,122 @@
+''' Tracks the changes of the active brush (and its texture slot) through RNA subscriptions.
+
+    Notifications only record (brush name, property) pairs, a debounced timer flushes them
+    once the changes stop (eg. after a slider is released), tagging the datablocks as dirty.
+    The changed properties are kept until the brush is saved ('consume_changes').
+'''
 import bpy
-from bpy.types import Brush as BlBrush, Texture as BlTexture
+from bpy.types import Brush as BlBrush
 
+from time import time
 from uuid import uuid4
 
-from brush_manager.utils.tool_settings import get_ts, get_ts_brush, get_ts_brush_texture_slot
+from brush_manager.utils.tool_settings import get_ts_brush
 
 
-sub_owners = {}
+# Print every flushed change.
+DEBUG = False
 
+# Seconds without changes before flushing them.
+DEBOUNCE_DELAY = 0.5
 
-def on_brush_update(brush: BlBrush, key: str):
-    if brush is None:
-        return
-    print("Brush '%s' Datablock -> '%s' value was changed!" % (brush.name, key))
+# Prefix of the properties of the brush texture slot.
+TEXTURE_SLOT_PREFIX = 'texture_slot.'
 
-    brush['dirty'] = True
 
+sub_owners = {}
 
-def on_brush_texture_slot_update(brush: BlBrush, key: str):
-    if brush is None:
-        return
-    texture_slot = brush.texture_slot
-    if texture_slot is None:
-        return
-    print("BrushTextureSlot '%s' Datablock -> '%s' value was changed!" % (texture_slot.name, key))
 
-    brush['dirty'] = True
+class DirtyTracker:
+    def __init__(self) -> None:
+        # (brush name, property) since the last flush.
+        self.pending: set[tuple[str, str]] = set()
+        # brush name -> properties changed since its last save.
+        self.changes: dict[str, set[str]] = {}
+        self._last_change_time = 0.0
+
+    def tag(self, brush: BlBrush | None, prop: str) -> None:
+        if brush is None:
+            return
+        self.pending.add((brush.name, prop))
+        self._last_change_time = time()
+        if not bpy.app.timers.is_registered(_flush_timer):
+            bpy.app.timers.register(_flush_timer, first_interval=DEBOUNCE_DELAY)
+
+    def on_timer(self) -> float | None:
+        elapsed = time() - self._last_change_time
+        if elapsed < DEBOUNCE_DELAY:
+            # Still changing.
+            return DEBOUNCE_DELAY - elapsed
+        self.flush()
+        return None
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, set()
+
+        flushed: dict[str, set[str]] = {}
+        for brush_name, prop in pending:
+            flushed.setdefault(brush_name, set()).add(prop)
+
+        brushes = bpy.data.brushes
+        for brush_name, props in flushed.items():
+            self.changes.setdefault(brush_name, set()).update(props)
+            if (brush := brushes.get(brush_name)) is None:
+                continue
+            if DEBUG:
+                print("[brush_manager] Brush '%s' changed: %s" % (brush_name, ', '.join(sorted(props))))
+            brush['dirty'] = True
+            if 'texture' in props or any(prop.startswith(TEXTURE_SLOT_PREFIX) for prop in props):
+                self._update_texture(brush)
+
+    @staticmethod
+    def _update_texture(brush: BlBrush) -> None:
+        texture = brush.texture
+        if texture is None:
+            brush['texture_uuid'] = ''
+            return
+        if 'uuid' not in texture:
+            texture['uuid'] = uuid4().hex
+            texture['dirty'] = True
+        brush['texture_uuid'] = texture['uuid']
 
-    texture = texture_slot.texture
-    if texture and 'uuid' not in texture:
-        texture['uuid'] = uuid4().hex
-        texture['dirty'] = True
+    def get_changed_brushes(self) -> list[str]:
+        ''' Names of the brushes that changed since they were saved. '''
+        self.flush()
+        return list(self.changes.keys())
 
+    def get_changes(self, brush_name: str) -> set[str]:
+        ''' Properties of the brush that changed since it was saved. '''
+        self.flush()
+        return self.changes.get(brush_name, set())
 
-def on_brush_texture_update(brush: BlBrush, _key: str):
-    if brush is None:
-        return
-    print("Brush '%s' Datablock -> texture value was changed!" % brush.name)
-    texture = brush.texture
-    if texture is None:
-        brush['texture_uuid'] = ''
+    def consume_changes(self, brush_name: str) -> set[str]:
+        ''' Same as 'get_changes', forgetting them (the brush is being saved). '''
+        self.flush()
+        return self.changes.pop(brush_name, set())
 
-        brush['dirty'] = True
-    else:
-        if 'uuid' not in texture:
-            texture['uuid'] = uuid4().hex
-            texture['dirty'] = True
+    def clear(self) -> None:
+        self.pending.clear()
+        self.changes.clear()
 
-        brush['texture_uuid'] = texture['uuid']
 
-        brush['dirty'] = True
+dirty_tracker = DirtyTracker()
 
 
-def register_prop(type, attr, notify: callable, get_data: callable):
+def _flush_timer() -> float | None:
+    return dirty_tracker.on_timer()
+
+
+def register_prop(type, attr, prop_id: str):
     owner = object()
-    sub_owners[owner] = attr
+    sub_owners[owner] = prop_id
 
     bpy.msgbus.subscribe_rna(
         key=(type, attr),
         owner=owner,
         args=(),
-        notify=lambda *args: notify(get_data(), sub_owners[owner]),
+        notify=lambda *args: dirty_tracker.tag(get_ts_brush(), prop_id),
         options={'PERSISTENT'}
     )
 
@@ -75,17 +131,14 @@ def register():
         for key, prop in brush.rna_type.properties.items():
             if prop.type in {'POINTER', 'COLLECTION'}:
                 continue
-            #### print("[brush_manager] Info! RNA Subscription to bpy.types.Brush." + key)
-            register_prop(bpy.types.Brush, key, on_brush_update, get_ts_brush)
+            register_prop(bpy.types.Brush, key, key)
 
         for key, prop in brush.texture_slot.rna_type.properties.items():
             if prop.type in {'POINTER', 'COLLECTION'}:
                 continue
-            #### print("[brush_manager] Info! RNA Subscription to bpy.types.BrushTextureSlot." + key)
-            register_prop(bpy.types.BrushTextureSlot, key, on_brush_texture_slot_update, get_ts_brush)
+            register_prop(bpy.types.BrushTextureSlot, key, TEXTURE_SLOT_PREFIX + key)
 
-        #### print("[brush_manager] Info! RNA Subscription to bpy.types.Brush.texture")
-        register_prop(bpy.types.BrushTextureSlot, 'texture', on_brush_texture_update, get_ts_brush)
+        register_prop(bpy.types.BrushTextureSlot, 'texture', 'texture')
 
     bpy.app.timers.register(_register_after_load, first_interval=1)
 
@@ -93,3 +146,8 @@ def register():
 def unregister():
     for owner in sub_owners.keys():
         bpy.msgbus.clear_by_owner(owner)
+    sub_owners.clear()
+
+    if bpy.app.timers.is_registered(_flush_timer):
+        bpy.app.timers.unregister(_flush_timer)
+    dirty_tracker.flush()
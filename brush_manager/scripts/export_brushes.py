@@ -2,64 +2,56 @@ import bpy
 import sys
 import json
 from uuid import uuid4
-from time import time
+from time import time, sleep as time_sleep
 import string
 from os.path import isfile, exists, splitext
-# import socket
+import socket
+import os
 import subprocess
+from math import ceil
 
 from bpy.path import abspath as bpy_abspath
 from bpy.types import Image, ImageTexture, Brush, Texture
 
 from brush_manager.paths import Paths
+from brush_manager.utils.cas import hash_bytes, hash_file, link_blob
+from brush_manager.utils.atomic_file import atomic_write
+from brush_manager.utils import thumbnail as thumbnail_module
+from brush_manager.utils.thumbnail import is_supported as is_thumbnail_supported
 
 import bpy.utils.previews
 # from bpy.utils import previews
 
 
-EXPORT_JSON = sys.argv[-3]
+EXPORT_PORT = int(sys.argv[-3])
+EXPORT_TOKEN = os.environ['BM_EXPORT_TOKEN'].encode('ascii')
 CONTEXT_MODE = sys.argv[-2].lower()
 EXCLUDE_DEFAULTS = bool(int(sys.argv[-1]))
 
 
 # print(sys.argv)
 
-# image_previews = previews.new()
-'''
-try:
-    import PIL
-    from PIL import Image as PILImage
-
-    from PIL import __version__
-    PIL_VERSION = float(''.join(__version__.split('.')[:-1]))
-    if PIL_VERSION >= 9.0 and hasattr(PILImage, 'Resampling'):
-        PIL_RESAMPLING_NEAREST = PILImage.Resampling.NEAREST
-    else:
-        PIL_RESAMPLING_NEAREST = PILImage.NEAREST
-
-    if hasattr(PILImage, 'Transpose'):
-        PIL_FLIP_TOP_BOTTOM = PILImage.Transpose.FLIP_TOP_BOTTOM
-    else:
-        PIL_FLIP_TOP_BOTTOM = PILImage.FLIP_TOP_BOTTOM
-
-    HAS_PIL = True
+ICON_SIZE = 92, 92
 
-except ImportError as e:
-    PILImage = None
-    PIL_RESAMPLING_NEAREST = None
-    PIL_FLIP_TOP_BOTTOM = None
+# Thumbnail generation.
+# Images that can be decoded without bpy are done by worker processes ('utils/thumbnail.py' standalone),
+# a few jobs each. Workers that take longer than the timeout of their jobs are killed.
+THUMBNAIL_MAX_WORKERS = 8
+THUMBNAIL_MAX_JOBS_PER_WORKER = 16
+THUMBNAIL_JOB_TIMEOUT = 30.0 # seconds.
+THUMBNAIL_POLL_INTERVAL = 0.01
 
-    HAS_PIL = False
-'''
-PILImage = None
-PIL_RESAMPLING_NEAREST = None
-PIL_FLIP_TOP_BOTTOM = None
-HAS_PIL = False
 
-ICON_SIZE = 92, 92
+valid_filename_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
 
 
-valid_filename_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
+def get_image_hash(image: Image) -> str:
+    ''' Hash of the image content, empty if the image data is not available. '''
+    if image.packed_file is not None:
+        return hash_bytes(image.packed_file.data)
+    if image.source != 'FILE':
+        return ''
+    return hash_file(bpy_abspath(image.filepath, library=image.library))
 
 
 data_brushes: list[Brush] = bpy.data.brushes
@@ -125,13 +117,15 @@ for texture in textures:
         texture['uuid'] = uuid
         texture['brush_manager'] = 1
     texture['name'] = texture.name
+    texture['content_hash'] = content_hash = get_image_hash(texture.image)
 
     # Pack texture.
     textures_data.append(
         {
             'uuid': uuid,
             'name': texture.image.name,
-            'type': texture.type
+            'type': texture.type,
+            'content_hash': content_hash
         }
     )
 ## print("\t> Pack textures data: %.2fs" % (time() - _start_time))
@@ -168,20 +162,24 @@ for brush in brushes:
 # print("[DEBUG::TIME] Prepare data to export: %.2fs" % (time() - start_time))
 
 
+# The library writers (started by the add-on once it gets the data) load this .blend, with the UUIDs.
+start_time = time()
+bpy.ops.wm.save_mainfile()
+# print("[DEBUG::TIME] Save .blend: %.2fs" % (time() - start_time))
+
+
 # start_time = time()
-with open(EXPORT_JSON, 'w') as file:
-    file.write(json.dumps(
+# Send the data to the add-on, closing the connection tells it that it is complete.
+# NOTE: the token goes first, so the add-on knows that the data comes from us.
+with socket.create_connection(('127.0.0.1', EXPORT_PORT)) as connection:
+    connection.sendall(EXPORT_TOKEN)
+    connection.sendall(json.dumps(
         {
             'brushes': brushes_data,
             'textures': textures_data
         }
-    ))
-# print("[DEBUG::TIME] Write export.json: %.2fs" % (time() - start_time))
-
-
-start_time = time()
-bpy.ops.wm.save_mainfile()
-# print("[DEBUG::TIME] Save .blend: %.2fs" % (time() - start_time))
+    ).encode('utf-8'))
+# print("[DEBUG::TIME] Send export data: %.2fs" % (time() - start_time))
 
 
 # start_time = time()
@@ -208,21 +206,7 @@ for brush in brushes:
     # brush.name = brush['name']
     # brush.texture = brush_texture'''
 
-# print(sys.argv)
-process = subprocess.Popen(
-    [
-        bpy.app.binary_path,
-        sys.argv[1],
-        '--background',
-        '--python',
-        Paths.Scripts.WRITE_LIBS(),
-    ],
-    stdout=None,
-    stderr=None,
-    shell=False
-)
-
-# print("[DEBUG::TIME] Save brush lib .blend: %.2fs" % (time() - start_time))
+# NOTE: library files are written by the add-on workers (write_libraries.py), in parallel shards.
 
 
 # -----------------------------------------------------------------------------------
@@ -258,20 +242,51 @@ context_override = {
 
 BrushIcon = Paths.Icons.BRUSH
 TextureIcon = Paths.Icons.TEXTURE
+TextureIconBlob = Paths.Icons.CAS_TEXTURE
 
 data_images = bpy.data.images
 
-tagged_images_to_generate_with_pil = []
+tagged_images_to_generate_with_numpy = []
 tagged_images_to_generate_with_bpy = []
 
 
-def generate_thumbnail__pil(in_image_path: str, out_image_path: str) -> str:
-    # filename = ''.join(c for c in filename if c in valid_filename_chars)
-    ## print("PIL ->", in_image_path, out_image_path)
-    with PILImage.open(in_image_path) as image:
-        image.thumbnail(ICON_SIZE, PIL_RESAMPLING_NEAREST) # PIL_RESAMPLING_NEAREST # image.resize(ICON_SIZE, PIL_RESAMPLING_NEAREST)
-        image.save(out_image_path, 'PNG')
-    return out_image_path
+# Thumbnail cache: maps every generated icon to the signature of its source image,
+# so icons are only generated again when their source changes.
+thumbnail_cache_path = Paths.Icons._ICONS('thumbnails.json', as_path=True)
+try:
+    with thumbnail_cache_path.open('r') as cache_file:
+        thumbnail_cache: dict[str, list] = json.load(cache_file)
+except (OSError, ValueError):
+    thumbnail_cache: dict[str, list] = {}
+thumbnail_cache_updates: dict[str, list] = {}
+# Icons that were generated without errors, only their signatures are updated.
+thumbnail_succeeded: set[str] = set()
+
+
+def get_source_signature(in_image_path: str | ImageTexture) -> list | None:
+    ''' (source path, mtime, size) of the source image, or the content hash if the image is packed. '''
+    if isinstance(in_image_path, ImageTexture):
+        texture: ImageTexture = in_image_path
+        image: Image = texture.image
+        if image.packed_file is not None:
+            return ['packed', texture.get('content_hash', '') or hash_bytes(image.packed_file.data)]
+        in_image_path = bpy_abspath(image.filepath_from_user(image_user=texture.image_user), library=image.library)
+    try:
+        stat = os.stat(in_image_path)
+    except OSError:
+        return None
+    return [in_image_path, stat.st_mtime_ns, stat.st_size]
+
+
+def save_thumbnail_cache() -> None:
+    for out_image_path, signature in thumbnail_cache_updates.items():
+        # A failed job may leave the old icon behind, which doesn't match the new signature.
+        if out_image_path in thumbnail_succeeded and exists(out_image_path):
+            thumbnail_cache[out_image_path] = signature
+    # Forget icons that were removed.
+    for out_image_path in [path for path in thumbnail_cache.keys() if not exists(path)]:
+        del thumbnail_cache[out_image_path]
+    atomic_write(thumbnail_cache_path, json.dumps(thumbnail_cache).encode('utf-8'))
 
 
 def generate_thumbnail__bpy(in_image_path: str | ImageTexture, out_image_path: str):
@@ -306,6 +321,15 @@ def generate_thumbnail__bpy(in_image_path: str | ImageTexture, out_image_path: s
 
 
 def tag_generate_thumbnail(in_image_path: str | ImageTexture, out_image_path: str):
+    if isinstance(in_image_path, ImageTexture) and in_image_path.image is None:
+        return
+    signature = get_source_signature(in_image_path)
+    if signature is not None:
+        if exists(out_image_path) and thumbnail_cache.get(out_image_path) == signature:
+            # Icon is up to date.
+            return
+        thumbnail_cache_updates[out_image_path] = signature
+
     if isinstance(in_image_path, ImageTexture):
         texture: ImageTexture = in_image_path
         image: Image = texture.image
@@ -314,18 +338,19 @@ def tag_generate_thumbnail(in_image_path: str | ImageTexture, out_image_path: st
         if image.source != 'FILE':
             return
         image_user = texture.image_user
-        if HAS_PIL and image.file_format in {'PNG', 'JPEG'}:
-            tagged_images_to_generate_with_pil.append((image.filepath_from_user(image_user=image_user), out_image_path))
+        image_path = bpy_abspath(image.filepath_from_user(image_user=image_user), library=image.library)
+        if image.packed_file is None and is_thumbnail_supported(image_path) and isfile(image_path):
+            tagged_images_to_generate_with_numpy.append((image_path, out_image_path))
         else:
             # if image.file_format not in {'PNG', 'JPEG'}:
             #     image.file_format = 'PNG'
             tagged_images_to_generate_with_bpy.append((texture, out_image_path))
     elif isinstance(in_image_path, str):
         root, ext = splitext(in_image_path)
-        if ext.lower() not in {'.png', '.jpg', 'jpeg'}:
+        if ext.lower() not in {'.png', '.jpg', '.jpeg'}:
             return
-        if HAS_PIL and ext in {'.png', '.jpg', 'jpeg'}:
-            tagged_images_to_generate_with_pil.append((in_image_path, out_image_path))
+        if is_thumbnail_supported(in_image_path):
+            tagged_images_to_generate_with_numpy.append((in_image_path, out_image_path))
         else:
             tagged_images_to_generate_with_bpy.append((in_image_path, out_image_path))
 
@@ -343,60 +368,10 @@ for _brush in brushes:
 ## print("[DEBUG::TIME] Tag brush icons: %.2fs" % (time() - start_time))
 
 # ----------------------------------------------------------------
-## start_time = time()
-
-# temporal. first brush thumnails, then WILL TRY textures...
-if HAS_PIL and len(tagged_images_to_generate_with_pil) != 0:
-    import threading
-    from multiprocessing import cpu_count
-    from math import floor
-
-    n_threads = int((cpu_count() / 5) * 3)
-    n_images = len(tagged_images_to_generate_with_pil)
-    n_images_per_thread_float = n_images / n_threads
-    n_images_per_thread = floor(n_images_per_thread_float)
-
-    def multi_generate_thumbnail__pil(images):
-        for image in images:
-            generate_thumbnail__pil(*image)
-        return None
-
-    threads: list[threading.Thread] = []
-
-    def add_thread(images):
-        thread = threading.Thread(target=multi_generate_thumbnail__pil, args=(images,))
-        thread.start()
-        # thread.daemon = True
-        threads.append(thread)
-
-    start_index = 0
-    for cpu_index in range(n_threads-1):
-        add_thread(
-            tagged_images_to_generate_with_pil[start_index:start_index+n_images_per_thread]
-        )
-        start_index += n_images_per_thread
-
-    add_thread(tagged_images_to_generate_with_pil[start_index:])
-
-    # for (in_image_path, out_image_path) in tagged_images_to_generate_with_pil:
-
-    for thread in threads:
-        thread.join()
 
-    # while 1:
-    #     for thread in threads:
-    #         if thread.is_alive:
-    #             sleep(.1)
-    #             continue
-    #     break
-
-if len(tagged_images_to_generate_with_bpy) != 0:
-    for (in_image, out_image) in tagged_images_to_generate_with_bpy:
-        generate_thumbnail__bpy(in_image, out_image)
-
-# ----------------------------------------------------------------
-
-tagged_images_to_generate_with_bpy.clear()
+# Textures with the same image share the icon, it is generated once and then linked to every texture.
+tagged_texture_icon_links: list[tuple[str, str]] = []
+tagged_texture_icon_hashes: set[str] = set()
 
 for _texture in textures:
     if _texture.type != 'IMAGE':
@@ -405,33 +380,107 @@ for _texture in textures:
         continue
     if _texture.image is None:
         continue
-    tag_generate_thumbnail(_texture, TextureIcon(_texture['uuid'] + '.png'))
+    content_hash = _texture['content_hash']
+    if not content_hash:
+        tag_generate_thumbnail(_texture, TextureIcon(_texture['uuid'] + '.png'))
+        continue
+    if content_hash not in tagged_texture_icon_hashes and not exists(TextureIconBlob(content_hash + '.png')):
+        tag_generate_thumbnail(_texture, TextureIconBlob(content_hash + '.png'))
+    tagged_texture_icon_hashes.add(content_hash)
+    tagged_texture_icon_links.append((content_hash, _texture['uuid']))
+
+
+# ----------------------------------------------------------------
+# Generate every tagged thumbnail (brushes and textures) in a single stage.
+# Images that can be decoded without bpy run in worker processes while the main thread does the bpy jobs (bpy is not thread-safe).
+
+class ThumbnailWorker:
+    ''' Python process that makes the thumbnails of a few (input, output) jobs. '''
+
+    def __init__(self, jobs: list[tuple[str, str]]) -> None:
+        self.jobs = jobs
+        self.deadline = time() + THUMBNAIL_JOB_TIMEOUT * len(jobs)
+        self.process = subprocess.Popen(
+            [sys.executable, thumbnail_module.__file__, *(path for job in jobs for path in job)],
+            stdout=subprocess.PIPE,
+            stderr=None,
+            text=True,
+            shell=False
+        )
+
+    def poll(self) -> bool:
+        ''' Returns True once the worker is done (or killed, when it timed out). '''
+        if self.process.poll() is not None:
+            return True
+        if time() > self.deadline:
+            self.process.kill()
+            return True
+        return False
+
+    def results(self) -> list[tuple[str, str | None]]:
+        ''' (output path, error) of every job, jobs that were not reported timed out. '''
+        stdout, _stderr = self.process.communicate()
+        errors: dict[str, str | None] = {out_image_path: "Timed out" for _in_image_path, out_image_path in self.jobs}
+        for line in stdout.splitlines():
+            status, out_image_path, *error = line.split('\t')
+            if out_image_path in errors:
+                errors[out_image_path] = None if status == 'OK' else ('\t'.join(error) or "Failed")
+        return list(errors.items())
+
+
+def generate_thumbnails() -> None:
+    n_jobs = len(tagged_images_to_generate_with_numpy) + len(tagged_images_to_generate_with_bpy)
+    if n_jobs == 0:
+        return
 
+    n_done = 0
 
-# GENERATE IMAGE THUMBNAILS WITH PIL.
-if HAS_PIL and len(tagged_images_to_generate_with_pil) != 0:
-    print("Generating with PIL...")
-    from concurrent.futures import ProcessPoolExecutor
-    from concurrent.futures import as_completed, wait
+    def report_progress(out_image_path: str, error: str | None = None) -> None:
+        nonlocal n_done
+        n_done += 1
+        if error:
+            print(f"[brush_manager] Thumbnails [{n_done}/{n_jobs}] ERROR! {error}: {out_image_path}")
+        else:
+            thumbnail_succeeded.add(out_image_path)
+            print(f"[brush_manager] Thumbnails [{n_done}/{n_jobs}] {out_image_path}")
+
+    numpy_jobs = tagged_images_to_generate_with_numpy
+    n_workers = max(1, min(THUMBNAIL_MAX_WORKERS, (os.cpu_count() or 1) - 1, len(numpy_jobs)))
+    chunk_size = max(1, min(THUMBNAIL_MAX_JOBS_PER_WORKER, ceil(len(numpy_jobs) / n_workers)))
+    pending_chunks = [numpy_jobs[i:i + chunk_size] for i in range(0, len(numpy_jobs), chunk_size)]
+    workers: list[ThumbnailWorker] = []
+
+    def poll_workers() -> None:
+        for worker in [worker for worker in workers if worker.poll()]:
+            workers.remove(worker)
+            for out_image_path, error in worker.results():
+                report_progress(out_image_path, error)
+        while pending_chunks and len(workers) < n_workers:
+            workers.append(ThumbnailWorker(pending_chunks.pop(0)))
+
+    poll_workers()
+
+    for (in_image, out_image) in tagged_images_to_generate_with_bpy:
+        try:
+            generate_thumbnail__bpy(in_image, out_image)
+        except Exception as e:
+            report_progress(out_image, str(e))
+        else:
+            report_progress(out_image)
+        poll_workers()
 
-    # create the process pool.
-    with ProcessPoolExecutor() as exe:
-        # submit tasks.
-        futures = [exe.submit(generate_thumbnail__pil, in_image_path, out_image_path)
-                   for (in_image_path, out_image_path) in tagged_images_to_generate_with_pil]
+    while workers or pending_chunks:
+        poll_workers()
+        time_sleep(THUMBNAIL_POLL_INTERVAL)
 
-        # report progress.
-        for future in as_completed(futures):
-            # get the output path that was saved.
-            outpath = future.result()
-            # report progress.
-            print(f'.saved {outpath}')
 
-        # wait(futures)
+generate_thumbnails()
 
+for (content_hash, uuid) in tagged_texture_icon_links:
+    blob_path = TextureIconBlob(content_hash + '.png', as_path=True)
+    if blob_path.exists():
+        link_blob(blob_path, TextureIcon(uuid + '.png', as_path=True))
 
-# FINALLY, GENERATE IMAGE THUMBNAILS WITH BPY.
-for (in_image, out_image) in tagged_images_to_generate_with_bpy:
-    generate_thumbnail__bpy(in_image, out_image)
+save_thumbnail_cache()
 
 print("[DEBUG::TIME] Generate brush icons: %.2fs" % (time() - start_time))
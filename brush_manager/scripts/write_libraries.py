@@ -1,21 +1,47 @@
 import bpy
-from bpy.types import ImageTexture
+import sys
+import json
+from bpy.types import Image, ImageTexture
 from brush_manager.paths import Paths
+from brush_manager.utils.cas import add_blob_ref
 
 from os.path import exists
 
 
-bpy.ops.file.make_paths_absolute()
-bpy.ops.file.pack_all()
+# Shard of items that this worker should write.
+with open(sys.argv[-1], 'r') as shard_file:
+    shard = json.load(shard_file)
+BRUSH_UUIDS = set(shard['brushes'])
+TEXTURE_UUIDS = set(shard['textures'])
 
 
-write_lib = bpy.data.libraries.write
+def write_lib(filepath: str, datablocks: set, **kwargs) -> None:
+    # Libraries are stored away from the source file, so relative paths would break.
+    bpy.data.libraries.write(filepath, datablocks, path_remap='ABSOLUTE', **kwargs)
 
 
-checkfile = Paths.Scripts.CHECK__WRITE_LIBS(as_path=True)
+def write_texture_lib(filepath: str, texture: ImageTexture) -> None:
+    ''' Writes the texture with its image packed. '''
+    write_image_lib(filepath, texture.image, texture)
 
-checkfile.touch(exist_ok=True)
 
+def write_image_lib(filepath: str, image: Image, *datablocks) -> None:
+    ''' Writes the image packed (and the datablocks that use it).
+        Images are packed one at a time, and freed once written, so memory usage does not grow with the source file. '''
+    pack_image = image.packed_file is None and image.source in {'FILE', 'SEQUENCE', 'TILED'}
+    if pack_image:
+        try:
+            image.pack()
+        except RuntimeError as e:
+            # Image file is missing or can't be read. Write it anyway, with its (absolute) path.
+            print(f"[brush_manager] WARN! Could not pack image '{image.name}': {e}")
+            pack_image = False
+
+    write_lib(filepath, {image, *datablocks}, fake_user=True, compress=True)
+
+    if pack_image:
+        image.unpack(method='REMOVE')
+    image.buffers_free()
 
 
 for brush in bpy.data.brushes:
@@ -24,11 +50,13 @@ for brush in bpy.data.brushes:
     # As well as match the brush name with its UUID.
     if 'brush_manager' not in brush:
         continue
+    if brush['uuid'] not in BRUSH_UUIDS:
+        continue
 
     uuid = brush['uuid']
     brush.name = uuid
     brush.texture = None
-    write_lib(Paths.Data.BRUSH(uuid + '.blend'), {brush}, fake_user=True, compress=True)
+    # NOTE: only the default is written, the working copy (<uuid>.blend) is written when the brush is modified.
     write_lib(Paths.Data.BRUSH(uuid + '.default.blend'), {brush}, fake_user=True, compress=True)
 
 
@@ -37,6 +65,8 @@ for texture in bpy.data.textures:
     # NOTE: that we match the texture name with its UUID.
     if 'brush_manager' not in texture:
         continue
+    if texture['uuid'] not in TEXTURE_UUIDS:
+        continue
     if texture.type != 'IMAGE':
         continue
     if not isinstance(texture, ImageTexture):
@@ -46,15 +76,24 @@ for texture in bpy.data.textures:
     # if not exists(texture.image.filepath_raw):
     #     continue
 
-    image = texture.image
-    # image.pack()
-
     uuid = texture['uuid']
-    texture_libpath = Paths.Data.TEXTURE(uuid + '.blend')
-    texture.name = uuid
-    write_lib(texture_libpath, {texture, image}, fake_user=True, compress=True)
-
-    # image.unpack()
-
+    content_hash = texture.get('content_hash', '')
+    if not content_hash:
+        texture_libpath = Paths.Data.TEXTURE(uuid + '.blend')
+        texture.name = uuid
+        write_texture_lib(texture_libpath, texture)
+        continue
 
-checkfile.unlink()
+    # Textures with the same image share it, written once in its own library where it is named after the content hash.
+    # Each texture keeps its own library (with its own settings) without the image, like brushes without their texture.
+    # NOTE: textures with the same hash always go to the same shard.
+    blob_path = Paths.Data.CAS_TEXTURE(content_hash + '.blend', as_path=True)
+    image = texture.image
+    if not blob_path.exists():
+        image.name = content_hash
+        write_image_lib(str(blob_path), image)
+    add_blob_ref(Paths.Data.CAS_TEXTURE(content_hash + '.refs', as_path=True), uuid)
+    texture.name = uuid
+    texture.image = None
+    write_lib(Paths.Data.TEXTURE(uuid + '.blend'), {texture}, fake_user=True, compress=True)
+    texture.image = image
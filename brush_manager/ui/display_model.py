@@ -0,0 +1,155 @@
+''' Per-category display data for the content panel, so redraws read precomputed values only.
+
+    Models are invalidated by the item callbacks (add, remove, move, update),
+    display names are computed once per item and icon IDs once they are available
+    (until the icon changes or its preview is released, see 'icons.callback__IconsChange').
+'''
+from typing import Iterator
+
+from ..types import Item, BrushItem, Category
+from ..data.cats import callback__CatsRemove
+from ..data.items import (
+    callback__ItemsAdd, callback__ItemsAddBatch, callback__ItemsRemove,
+    callback__ItemsMovePre, callback__ItemsMovePost, callback__ItemsUpdate
+)
+from ..icons import Icons, pin_icons, callback__IconsChange
+from ..images import get_default_brush_icon_by_type
+
+
+def get_display_name(name: str) -> str:
+    if len(name) > 5:
+        if name[1] == '|':
+            name = name[2:] if name[2] != ' ' else name[3:]
+        name = name.replace('_', ' ').replace('.', ' .')
+    return name
+
+
+class ItemDisplay:
+    __slots__ = ('item', 'name', '_icon_id')
+
+    def __init__(self, item: Item) -> None:
+        self.item = item
+        self.name = get_display_name(item.name)
+        self._icon_id = 0
+
+    @property
+    def icon_id(self) -> int:
+        if self._icon_id != 0:
+            return self._icon_id
+        item = self.item
+        icon_id = item.icon_id
+        if icon_id != 0:
+            # Item icon is loaded, keep it.
+            self._icon_id = icon_id
+            return icon_id
+        # Placeholder until the icon is loaded (if it has any).
+        if isinstance(item, BrushItem):
+            return get_default_brush_icon_by_type(item.type).icon_id
+        return Icons.TEXTURE_PLACEHOLDER.icon_id
+
+
+class CategoryDisplayModel:
+    def __init__(self, cat: Category) -> None:
+        self.cat_uuid = cat.uuid
+        self.items: list[ItemDisplay] = [ItemDisplay(item) for item in cat.items]
+        self.items_by_uuid: dict[str, ItemDisplay] = {item_display.item.uuid: item_display for item_display in self.items}
+        self._items = cat.items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[ItemDisplay]:
+        return iter(self.items)
+
+    @property
+    def selected_count(self) -> int:
+        return self._items.selected_count
+
+    def clear_icons(self) -> None:
+        for item_display in self.items:
+            item_display._icon_id = 0
+
+
+_models: dict[str, CategoryDisplayModel] = {}
+_active_model: CategoryDisplayModel | None = None
+
+
+def get_display_model(cat: Category) -> CategoryDisplayModel:
+    ''' Display model of the category, it is built again only after its items changed. '''
+    global _active_model
+    model = _models.get(cat.uuid)
+    if model is None:
+        model = _models[cat.uuid] = CategoryDisplayModel(cat)
+    if model is not _active_model:
+        # Icons of other categories could have been released meanwhile,
+        # the ones of the drawn category are kept in memory.
+        _active_model = model
+        model.clear_icons()
+        pin_icons(item_display.item.uuid for item_display in model.items)
+    return model
+
+
+def invalidate(cat_uuid: str | None = None) -> None:
+    global _active_model
+    if cat_uuid is None:
+        _models.clear()
+        _active_model = None
+        return
+    if _models.pop(cat_uuid, None) is _active_model:
+        _active_model = None
+
+
+def _invalidate_item_cat(item: Item) -> None:
+    if item is None or item.owner is None or item.collection.owner is None:
+        invalidate()
+        return
+    invalidate(item.cat_id)
+
+
+def _on_items_update(item: Item) -> None:
+    # NOTE: names are the only item changes the model cares about,
+    # the selection count comes from the item collection.
+    if item is None or item.owner is None or item.collection.owner is None:
+        invalidate()
+        return
+    if model := _models.get(item.cat_id):
+        if item_display := model.items_by_uuid.get(item.uuid):
+            item_display.name = get_display_name(item.name)
+
+
+def _on_items_add_batch(items: list[Item]) -> None:
+    for cat_uuid in {item.cat_id for item in items}:
+        invalidate(cat_uuid)
+
+
+def _on_cats_remove(cat: Category) -> None:
+    invalidate(cat.uuid)
+
+
+def _on_icons_change(uuid: str) -> None:
+    for model in _models.values():
+        if item_display := model.items_by_uuid.get(uuid):
+            item_display._icon_id = 0
+
+
+def register():
+    callback__CatsRemove.add(_on_cats_remove)
+    callback__ItemsAdd.add(_invalidate_item_cat)
+    callback__ItemsAddBatch.add(_on_items_add_batch)
+    callback__ItemsRemove.add(_invalidate_item_cat)
+    callback__ItemsMovePre.add(_invalidate_item_cat)
+    callback__ItemsMovePost.add(_invalidate_item_cat)
+    callback__ItemsUpdate.add(_on_items_update)
+    callback__IconsChange.add(_on_icons_change)
+
+
+def unregister():
+    callback__CatsRemove.remove(_on_cats_remove)
+    callback__ItemsAdd.remove(_invalidate_item_cat)
+    callback__ItemsAddBatch.remove(_on_items_add_batch)
+    callback__ItemsRemove.remove(_invalidate_item_cat)
+    callback__ItemsMovePre.remove(_invalidate_item_cat)
+    callback__ItemsMovePost.remove(_invalidate_item_cat)
+    callback__ItemsUpdate.remove(_on_items_update)
+    callback__IconsChange.remove(_on_icons_change)
+    invalidate()
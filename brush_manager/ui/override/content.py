@@ -5,6 +5,7 @@ from blf import dimensions
 from mathutils import Vector
 
 from math import floor, ceil
+from itertools import islice
 
 from brush_manager.types import AddonDataByMode, UIProps
 
@@ -13,7 +14,51 @@ from .base_ui import *
 from ...ops import SelectAll, MoveSelectedToCategory, RemoveSelectedFromCategory
 from ...types import AddonData, UIProps, Item, TextureItem, BrushItem, BrushCat, TextureCat, Category
 from ...icons import Icons
-from ...images import get_default_brush_icon_by_type
+from ..display_model import get_display_model, ItemDisplay
+
+
+# Vertical scale of the item boxes content ('draw_lib_item').
+ITEM_SCALE_Y = 2.5
+# Box padding and grid spacing around the item content, in pixels at ui_scale 1.0.
+# NOTE: this is an estimate. Blender doesn't expose the box spacing nor the height of a drawn layout to Python,
+# so it is the value that gives the rows measured on screen (59.33 px at ui_scale 1.0).
+ITEM_MARGIN_Y = 28 / 3
+# Rows drawn beyond the visible ones, so scrolling doesn't show empty space before the next redraw.
+# The hidden rows are replaced by spacers of the estimated height, so the first drawn row is always in place,
+# but the count of rows that fit in the region can be off: 3 rows cover a ~15% error of the row height.
+OVERSCAN_ROWS = 3
+
+
+def get_widget_unit(context: Context) -> float:
+    ''' Height in pixels of a regular UI element (same as Blender's U.widget_unit). '''
+    system = context.preferences.system
+    return round(18 * system.ui_scale) + 2 * system.pixel_size
+
+
+# Layout values only change with the region width or the UI scale.
+_layout_cache: dict[tuple[int, float], tuple[int, int]] = {}
+
+
+def get_grid_layout(context: Context) -> tuple[int, int]:
+    ''' (n_cols, max_text_width) for the current region. '''
+    ui_scale = context.preferences.system.ui_scale
+    key = (context.region.width, ui_scale)
+    if (grid_layout := _layout_cache.get(key)) is None:
+        if len(_layout_cache) > 16:
+            _layout_cache.clear()
+        n_cols = max(int((context.region.width / 3) / (ui_scale * 80)), 1)
+        max_text_width = int((context.region.width / 3 * 0.75 * .75 * .92) / dimensions(0, 'a')[0])
+        grid_layout = _layout_cache[key] = (n_cols, max_text_width)
+    return grid_layout
+
+
+def draw_spacer(layout: UILayout, height: float, widget_unit: float) -> None:
+    ''' Empty element with the given height in pixels. '''
+    if height <= 0:
+        return
+    spacer = layout.column()
+    spacer.scale_y = height / widget_unit
+    spacer.label(text='')
 
 
 
@@ -33,36 +78,25 @@ class USERPREF_PT_brush_manager_content(Panel, BaseUI):
             _row.scale_y = 1.0
             _row.label(text="", icon_value=icon_id)
 
-    def draw_lib_item(self, layout: UILayout, item: BrushItem | TextureItem):
-        item_icon: int = item.icon_id
-        if item_icon == 0:
-            if isinstance(item, BrushItem):
-                item_icon = get_default_brush_icon_by_type(item.type).icon_id
-            else:
-                item_icon = Icons.TEXTURE_PLACEHOLDER.icon_id
+    def draw_lib_item(self, layout: UILayout, item_display: ItemDisplay):
+        item = item_display.item
 
         col1 = layout.split(factor=0.25, align=True)
-        col1.scale_y = 2.5
-        self.draw_icon(col1, item_icon)
+        col1.scale_y = ITEM_SCALE_Y
+        self.draw_icon(col1, item_display.icon_id)
         col2 = col1.split(factor=0.99, align=True)
         col2.alignment = 'EXPAND'
 
-        item_name = item.name
-        if len(item_name) > 5:
-            if item_name[1] == '|':
-                item_name = item_name[2:] if item_name[2] != ' ' else item_name[3:]
-            item_name = item_name.replace('_', ' ').replace('.', ' .')
-
         # col2.prop(item, 'select', text=item_name, icon='CHECKBOX_HLT' if item.select else 'CHECKBOX_DEHLT')
         bm_ops.SelectItem.draw_in_layout(col2,
-                                         text=item_name,
+                                         text=item_display.name,
                                          depress=item.select,
                                          icon='CHECKBOX_HLT' if item.select else 'CHECKBOX_DEHLT').item_uuid = item.uuid
 
-    def draw_cat_item(self, layout: UILayout, item: Item):
-        self.draw_lib_item(layout, item)
+    def draw_cat_item(self, layout: UILayout, item_display: ItemDisplay):
+        self.draw_lib_item(layout, item_display)
 
-    def draw_items_actions(self, region: Region, layout: UILayout, ui_props: UIProps, active_cat: Category) -> None:
+    def draw_items_actions(self, region: Region, layout: UILayout, ui_props: UIProps, selected_count: int) -> None:
         h = region.height
         w = region.width
         tr = region.view2d.region_to_view(w, h)
@@ -76,9 +110,7 @@ class USERPREF_PT_brush_manager_content(Panel, BaseUI):
         layout = layout.column(align=True)
         layout.scale_y = 2.0
 
-        sel_brushes = active_cat.items.selected
-
-        no_selection = sel_brushes == []
+        no_selection = selected_count == 0
         SelectAll.draw_in_layout(layout, text='', icon='CHECKBOX_DEHLT' if no_selection else 'CHECKBOX_HLT').select_action = ('SELECT_ALL' if no_selection else 'DESELECT_ALL')
 
         layout.separator()
@@ -91,44 +123,41 @@ class USERPREF_PT_brush_manager_content(Panel, BaseUI):
 
     def draw_ui(self, context: Context, layout: UILayout, addon_data: AddonDataByMode, ui_props: UIProps):
         self.scale = context.preferences.system.ui_scale
-        self.max_text_width = int((context.region.width / 3 * 0.75 * .75 * .92) / dimensions(0, 'a')[0])
-
-        n_cols = max(int((context.region.width / 3) / (context.preferences.system.ui_scale * 80)), 1)
+        n_cols, self.max_text_width = get_grid_layout(context)
 
         main_row = layout.split(factor=0.9)
 
-        grid = main_row.grid_flow(row_major=True, columns=n_cols, even_columns=True, even_rows=True, align=True)
-
         draw = self.draw_cat_item
         active_cat = addon_data.active_category
         if active_cat is None:
             return
 
-        items = active_cat.items
+        items = get_display_model(active_cat)
 
-        n_rows = ceil(items.count / n_cols)
+        n_rows = ceil(len(items) / n_cols)
         region = context.region
         h = region.height
-        scroll = top = abs(region.view2d.region_to_view(0, h)[1])
+        top = abs(region.view2d.region_to_view(0, h)[1])
         bottom = abs(region.view2d.region_to_view(0, 0)[1])
 
-        ui_scale = context.preferences.system.ui_scale
+        ''' calculates the (estimated) height of the item rows in the UI in pixels. '''
+        widget_unit = get_widget_unit(context)
+        item_height = ITEM_SCALE_Y * widget_unit + ITEM_MARGIN_Y * context.preferences.system.ui_scale
+
+        # Only the visible rows are drawn, hidden rows are replaced by a spacer above and another below.
+        first_row = min(max(floor(top / item_height) - OVERSCAN_ROWS, 0), n_rows)
+        last_row = min(max(ceil(bottom / item_height) + OVERSCAN_ROWS, first_row), n_rows)
 
-        ''' calculates the height of the item in the UI in pixels. '''
-        item_height = 59.33 * ui_scale # we don't know exactly the height... just try and error lol
+        grid_col = main_row.column(align=True)
+        draw_spacer(grid_col, first_row * item_height, widget_unit)
 
-        above_hidden_rows = floor(top / item_height) - 1
-        below_hidden_rows = ceil(bottom / item_height)
+        grid = grid_col.grid_flow(row_major=True, columns=n_cols, even_columns=True, even_rows=True, align=True)
+        for item_display in islice(items, first_row * n_cols, last_row * n_cols):
+            draw(grid.box(), item_display)
 
-        for item_index, item in enumerate(items):
-            row_index = max(floor(item_index / n_cols), 0)
-            if row_index <= above_hidden_rows or  row_index >= below_hidden_rows:
-                dummy_box = grid.box()
-                dummy_box.scale_y = 2.5
-                continue
-            draw(grid.box(), item)
+        draw_spacer(grid_col, (n_rows - last_row) * item_height, widget_unit)
 
-        self.draw_items_actions(context.region, main_row.column(align=True), ui_props, active_cat)
+        self.draw_items_actions(context.region, main_row.column(align=True), ui_props, items.selected_count)
 
     @classmethod
     def toggle(cls):
@@ -0,0 +1,135 @@
+''' Crash-safe files: a crash or a full disk in the middle of a write never leaves a truncated file behind.
+
+    - Whole files are written to a temporary file, synced to disk and then renamed over the old one.
+    - Checksummed files start with a header (magic, CRC32, size) that is verified when they are read,
+      the previous versions are kept as '<name>.1', '<name>.2'... (generations) to fall back to.
+    - Append-only logs are written as CRC32 framed records, so a torn record at the end is detected
+      and only that record is lost.
+'''
+from pathlib import Path
+from typing import Iterator
+import os
+import struct
+import zlib
+
+
+CHECKSUM_MAGIC = b'BMCK'
+CHECKSUM_HEADER = struct.Struct('<4sIQ') # magic, crc32, size.
+
+RECORD_MAGIC = b'BMRC'
+RECORD_HEADER = struct.Struct('<4sII') # magic, crc32, size.
+
+
+class ChecksumError(ValueError):
+    pass
+
+
+def _fsync_dir(dirpath: Path) -> None:
+    # Directories can't be opened on Windows, where the rename is already durable.
+    if os.name == 'nt':
+        return
+    fd = os.open(dirpath, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    ''' Write the whole file, or nothing at all. '''
+    tmp_path = path.with_name(path.name + '.tmp')
+    with tmp_path.open('wb') as tmp_file:
+        tmp_file.write(data)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path.parent)
+
+
+# ----------------------------------------------------------------
+# Checksummed files with generations.
+
+
+def pack_checksummed(payload: bytes) -> bytes:
+    return CHECKSUM_HEADER.pack(CHECKSUM_MAGIC, zlib.crc32(payload), len(payload)) + payload
+
+
+def unpack_checksummed(data: bytes) -> bytes:
+    if len(data) < CHECKSUM_HEADER.size:
+        raise ChecksumError("Truncated header")
+    magic, crc, size = CHECKSUM_HEADER.unpack_from(data)
+    if magic != CHECKSUM_MAGIC:
+        raise ChecksumError("Missing header")
+    payload = data[CHECKSUM_HEADER.size:]
+    if len(payload) != size:
+        raise ChecksumError(f"Expected {size} bytes but got {len(payload)}")
+    if zlib.crc32(payload) != crc:
+        raise ChecksumError("Checksum mismatch")
+    return payload
+
+
+def get_generation_path(path: Path, generation: int) -> Path:
+    return path if generation == 0 else path.with_name(f'{path.name}.{generation}')
+
+
+def generations_exist(path: Path, generations: int) -> bool:
+    return any(get_generation_path(path, generation).exists() for generation in range(generations))
+
+
+def write_generations(path: Path, payload: bytes, generations: int) -> None:
+    ''' Atomically write the checksummed payload, keeping the previous (generations - 1) versions. '''
+    for generation in reversed(range(1, generations)):
+        older_path = get_generation_path(path, generation - 1)
+        if older_path.exists():
+            os.replace(older_path, get_generation_path(path, generation))
+    atomic_write(path, pack_checksummed(payload))
+
+
+def read_generations(path: Path, generations: int) -> bytes | None:
+    ''' Payload of the newest generation that is valid, None if there is none.
+        NOTE: files written by older versions have no header, they are returned as they are. '''
+    for generation in range(generations):
+        generation_path = get_generation_path(path, generation)
+        try:
+            data = generation_path.read_bytes()
+        except OSError:
+            continue
+        if not data:
+            continue
+        if not data.startswith(CHECKSUM_MAGIC):
+            return data
+        try:
+            return unpack_checksummed(data)
+        except ChecksumError as e:
+            print(f"[brush_manager] WARN! Discarding corrupted file '{str(generation_path)}': {e}")
+    return None
+
+
+def remove_generations(path: Path, generations: int) -> None:
+    for generation in range(generations):
+        get_generation_path(path, generation).unlink(missing_ok=True)
+
+
+# ----------------------------------------------------------------
+# Append-only logs.
+
+
+def append_record(path: Path, payload: bytes) -> None:
+    ''' Append the payload as a framed record, synced to disk. '''
+    with path.open('ab') as log_file:
+        log_file.write(RECORD_HEADER.pack(RECORD_MAGIC, zlib.crc32(payload), len(payload)) + payload)
+        log_file.flush()
+        os.fsync(log_file.fileno())
+
+
+def iter_records(data: bytes) -> Iterator[tuple[bytes, int]]:
+    ''' (payload, end offset) of every valid record, stops at the first one that is not. '''
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        magic, crc, size = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + size]
+        if magic != RECORD_MAGIC or len(payload) != size or zlib.crc32(payload) != crc:
+            return
+        offset = start + size
+        yield payload, offset
@@ -0,0 +1,69 @@
+''' Content-addressed storage for data shared between items (eg. texture images and icons).
+
+    Blobs are stored once by the hash of their content. The items that use a blob are listed in a refs file
+    next to it ('add_blob_ref' / 'release_blob_ref'), the blob is removed along with the last of them.
+    Items that need the blob as a file of their own get a hard link to it (or a copy, see 'link_blob').
+'''
+from hashlib import blake2b
+from pathlib import Path
+from shutil import copyfile
+import os
+
+from .atomic_file import atomic_write
+
+
+# Read files in chunks to keep memory bounded with big images.
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_bytes(data: bytes) -> str:
+    return blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_file(filepath: str | Path) -> str:
+    ''' Returns the content hash of the file, or an empty string if it can't be read. '''
+    hasher = blake2b(digest_size=16)
+    try:
+        with open(filepath, 'rb') as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+    except OSError:
+        return ''
+    return hasher.hexdigest()
+
+
+def link_blob(blob_path: Path, dst_path: Path) -> None:
+    ''' Make 'dst_path' point to the blob content. Falls back to a copy if hard links are not supported. '''
+    if dst_path.exists():
+        dst_path.unlink()
+    try:
+        os.link(blob_path, dst_path)
+    except OSError:
+        copyfile(blob_path, dst_path)
+
+
+def _read_refs(refs_path: Path) -> list[str]:
+    try:
+        return refs_path.read_text(encoding='utf-8').split()
+    except FileNotFoundError:
+        return []
+
+
+def add_blob_ref(refs_path: Path, ref: str) -> None:
+    ''' Register a user of the blob (eg. an item UUID). '''
+    refs = _read_refs(refs_path)
+    if ref not in refs:
+        refs.append(ref)
+        atomic_write(refs_path, '\n'.join(refs).encode('utf-8'))
+
+
+def release_blob_ref(refs_path: Path, ref: str, *blob_paths: Path) -> None:
+    ''' Unregister a user of the blob. The blob files are removed with the last one. '''
+    refs = _read_refs(refs_path)
+    if ref in refs:
+        refs.remove(ref)
+    if refs:
+        atomic_write(refs_path, '\n'.join(refs).encode('utf-8'))
+        return
+    for path in (*blob_paths, refs_path):
+        path.unlink(missing_ok=True)
@@ -0,0 +1,104 @@
+''' Insertion ordered dict that can also be accessed by position.
+
+    Keys keep the order in which they were first added (like an OrderedDict),
+    each key gets an increasing sequence number ('seq') and a SortedDict (seq -> key)
+    resolves positions, so 'key_at', 'value_at' and 'index' don't need to build a list of the keys.
+'''
+from typing import Generic, Iterable, Iterator, TypeVar
+
+from .sortedcontainers import SortedDict
+
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class IndexedDict(Generic[K, V]):
+    __slots__ = ('_data', '_seqs', '_order', '_next_seq')
+
+    def __init__(self, items: Iterable[tuple[K, V]] | dict[K, V] = ()) -> None:
+        self._data: dict[K, V] = {}
+        self._seqs: dict[K, int] = {}
+        self._order: SortedDict = SortedDict() # seq -> key
+        self._next_seq = 0
+        for key, value in (items.items() if isinstance(items, dict) else items):
+            self[key] = value
+
+    def __reduce__(self):
+        return self.__class__, (list(self._data.items()),)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self._data.items())!r})"
+
+    # ----------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator[K]:
+        # NOTE: the dict keeps the insertion order too, and new keys always go to the end.
+        return iter(self._data)
+
+    def __reversed__(self) -> Iterator[K]:
+        return reversed(self._data)
+
+    def __getitem__(self, key: K) -> V:
+        return self._data[key]
+
+    def __setitem__(self, key: K, value: V) -> None:
+        if key not in self._data:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs[key] = seq
+            self._order[seq] = key
+        self._data[key] = value
+
+    def __delitem__(self, key: K) -> None:
+        del self._data[key]
+        del self._order[self._seqs.pop(key)]
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        return self._data.get(key, default)
+
+    def pop(self, key: K, *default: V) -> V:
+        if key not in self._data:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self._data[key]
+        del self[key]
+        return value
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+    def items(self):
+        return self._data.items()
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._seqs.clear()
+        self._order.clear()
+
+    # ----------------------------------------------------------------
+    # Positional access.
+
+    def seq(self, key: K) -> int:
+        ''' Sequence number of the key, it only grows with the insertion order, so it can be used as a sort key. '''
+        return self._seqs[key]
+
+    def index(self, key: K) -> int:
+        return self._order.index(self._seqs[key])
+
+    def key_at(self, index: int) -> K:
+        ''' Raises IndexError if out of range. Negative indices count from the end. '''
+        return self._order.peekitem(index)[1]
+
+    def value_at(self, index: int) -> V:
+        return self._data[self.key_at(index)]
@@ -0,0 +1,239 @@
+''' Minimal PNG reader/writer on top of zlib and NumPy, so icons can be processed without bpy or a GPU.
+
+    Supports non-interlaced images of every color type with a bit depth of 8 or 16
+    (and palette images of any depth). Pixels are returned as an uint8 (height, width, 4) RGBA array,
+    with the first row at the top.
+'''
+from pathlib import Path
+import struct
+import zlib
+
+import numpy as np
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Color types.
+GRAY = 0
+RGB = 2
+PALETTE = 3
+GRAY_ALPHA = 4
+RGBA = 6
+
+CHANNELS = {GRAY: 1, RGB: 3, PALETTE: 1, GRAY_ALPHA: 2, RGBA: 4}
+
+# Working memory (bytes) to decode a block of Average/Paeth lines at once, it is O(width * lines).
+# Bigger blocks take less (vectorized) steps.
+UNFILTER_BLOCK_BYTES = 16 << 20
+
+
+class PNGError(ValueError):
+    pass
+
+
+def _read_chunks(data: bytes):
+    if data[:8] != PNG_SIGNATURE:
+        raise PNGError("Not a PNG file")
+    offset = 8
+    while offset < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[offset:offset + 8])
+        if offset + 12 + length > len(data):
+            raise PNGError(f"Truncated chunk {chunk_type!r}")
+        yield chunk_type, data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+        if chunk_type == b'IEND':
+            break
+
+
+def _unfilter_block(lines: np.ndarray, prev: np.ndarray, paeth: np.ndarray) -> np.ndarray:
+    ''' Reverse the Average (3) and Paeth (4) filters of consecutive (rows, pixels, bpp) lines.
+
+        A pixel depends on the decoded ones at its left, above and above-left, so they can't be
+        done a line at a time. Instead, every pixel of an anti-diagonal is decoded at once:
+        'rows + pixels' vectorized steps instead of a step per pixel.
+        Lines are skewed (line 'r' shifted 'r' columns to the right) so every anti-diagonal is a column. '''
+    n_rows, n_pixels, bpp = lines.shape
+    n_cols = n_rows + n_pixels + 1
+    # Line 'r' pixel 'x' at column 'r + x + 1'. Line 0 is the previous one, column 'r' (left of the line) is 0.
+    skewed = np.zeros((n_rows + 1, n_cols, bpp), dtype=np.int16)
+    skewed_lines = np.zeros((n_rows + 1, n_cols, bpp), dtype=np.int16)
+    skewed[0, 1:n_pixels + 1] = prev
+    for r in range(1, n_rows + 1):
+        skewed_lines[r, r + 1:r + 1 + n_pixels] = lines[r - 1]
+    paeth = np.concatenate(([False], paeth))[:, None]
+
+    for col in range(2, n_cols):
+        r0, r1 = max(1, col - n_pixels), min(n_rows, col - 1) + 1
+        a = skewed[r0:r1, col - 1]          # Left.
+        b = skewed[r0 - 1:r1 - 1, col - 1]  # Above.
+        c = skewed[r0 - 1:r1 - 1, col - 2]  # Above-left.
+        pred = (a + b) >> 1
+        if (is_paeth := paeth[r0:r1]).any():
+            p = a + b - c
+            pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+            pred = np.where(is_paeth, np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)), pred)
+        skewed[r0:r1, col] = (skewed_lines[r0:r1, col] + pred) & 0xFF
+
+    out = np.empty((n_rows, n_pixels, bpp), dtype=np.uint8)
+    for r in range(1, n_rows + 1):
+        out[r - 1] = skewed[r, r + 1:r + 1 + n_pixels]
+    return out
+
+
+def _unfilter(raw: bytes, height: int, stride: int, bpp: int) -> np.ndarray:
+    ''' Reverse the per-scanline filters. Returns an uint8 (height, stride) array. '''
+    rows = np.frombuffer(raw, dtype=np.uint8)
+    if rows.size < height * (stride + 1):
+        raise PNGError("Truncated image data")
+    rows = rows[:height * (stride + 1)].reshape(height, stride + 1)
+    filters = rows[:, 0]
+    if filters.max(initial=0) > 4:
+        raise PNGError(f"Invalid filter type {filters.max()}")
+    out = np.zeros((height, stride), dtype=np.uint8)
+    prev = np.zeros(stride, dtype=np.uint8)
+    # Two int16 (lines, line + lines, bpp) arrays per block.
+    block_rows = max(16, UNFILTER_BLOCK_BYTES // (4 * (stride + bpp)))
+
+    # NOTE: 'stride' is always a multiple of 'bpp', so lines are processed as (pixels, bpp) arrays.
+    y = 0
+    while y < height:
+        filter_type = filters[y]
+        if filter_type >= 3:
+            # Consecutive Average and Paeth lines are decoded together.
+            end = y + 1
+            while end < height and end - y < block_rows and filters[end] >= 3:
+                end += 1
+            lines = rows[y:end, 1:].reshape(end - y, -1, bpp)
+            out[y:end] = _unfilter_block(lines, prev.reshape(-1, bpp), filters[y:end] == 4).reshape(end - y, -1)
+            prev = out[end - 1]
+            y = end
+            continue
+
+        line = rows[y, 1:].reshape(-1, bpp)
+        if filter_type == 0:
+            cur = line
+        elif filter_type == 1:
+            # Sub: add the decoded pixel at the left, which is a cumulative sum (mod 256) along the line.
+            cur = np.cumsum(line, axis=0, dtype=np.uint8)
+        else:
+            cur = line + prev.reshape(-1, bpp)
+        out[y] = prev = cur.reshape(-1)
+        y += 1
+    return out
+
+
+def read_png(filepath: str | Path) -> np.ndarray:
+    ''' Decode a PNG file into an uint8 (height, width, 4) RGBA array. '''
+    with open(filepath, 'rb') as png_file:
+        data = png_file.read()
+    return decode_png(data)
+
+
+def read_png_size(filepath: str | Path) -> tuple[int, int]:
+    ''' (width, height) of a PNG file, from its header. '''
+    with open(filepath, 'rb') as png_file:
+        data = png_file.read(24)
+    if data[:8] != PNG_SIGNATURE or data[12:16] != b'IHDR':
+        raise PNGError("Not a PNG file")
+    return struct.unpack('>II', data[16:24])
+
+
+def decode_png(data: bytes) -> np.ndarray:
+    ''' Raises PNGError if the data is not a valid (or supported) PNG. '''
+    try:
+        return _decode_png(data)
+    except PNGError:
+        raise
+    except (zlib.error, struct.error, ValueError, IndexError) as e:
+        # Truncated or corrupted data.
+        raise PNGError(f"Corrupted PNG data: {e}") from e
+
+
+def _decode_png(data: bytes) -> np.ndarray:
+    header = None
+    palette = None
+    transparency = None
+    idat = []
+    for chunk_type, chunk in _read_chunks(data):
+        if chunk_type == b'IHDR':
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif chunk_type == b'PLTE':
+            palette = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, 3)
+        elif chunk_type == b'tRNS':
+            transparency = chunk
+        elif chunk_type == b'IDAT':
+            idat.append(chunk)
+    if header is None:
+        raise PNGError("Missing IHDR chunk")
+
+    width, height, bit_depth, color_type, _compression, _filter, interlace = header
+    if interlace:
+        raise PNGError("Interlaced PNG files are not supported")
+    if color_type not in CHANNELS or (bit_depth not in {8, 16} and color_type != PALETTE):
+        raise PNGError(f"Unsupported PNG format (color type {color_type}, bit depth {bit_depth})")
+
+    channels = CHANNELS[color_type]
+    bits_per_pixel = channels * bit_depth
+    stride = (width * bits_per_pixel + 7) // 8
+    bpp = max(1, bits_per_pixel // 8)
+    rows = _unfilter(zlib.decompress(b''.join(idat)), height, stride, bpp)
+
+    if color_type == PALETTE:
+        if palette is None:
+            raise PNGError("Missing PLTE chunk")
+        if bit_depth < 8:
+            indices = np.unpackbits(rows, axis=1).reshape(height, -1, bit_depth)
+            weights = 1 << np.arange(bit_depth - 1, -1, -1, dtype=np.uint8)
+            indices = (indices * weights).sum(axis=2, dtype=np.uint8)[:, :width]
+        else:
+            indices = rows[:, :width]
+        alpha = np.full(len(palette), 255, dtype=np.uint8)
+        if transparency is not None:
+            alpha[:len(transparency)] = np.frombuffer(transparency, dtype=np.uint8)[:len(palette)]
+        rgba = np.concatenate((palette, alpha[:, None]), axis=1)
+        return rgba[indices]
+
+    if bit_depth == 16:
+        # Keep the most significant byte.
+        pixels = rows.reshape(height, width, channels, 2)[..., 0]
+    else:
+        pixels = rows.reshape(height, width, channels)
+
+    if color_type == GRAY:
+        rgb, alpha = np.repeat(pixels, 3, axis=2), None
+    elif color_type == GRAY_ALPHA:
+        rgb, alpha = np.repeat(pixels[..., :1], 3, axis=2), pixels[..., 1:]
+    elif color_type == RGB:
+        rgb, alpha = pixels, None
+    else:
+        return np.ascontiguousarray(pixels)
+
+    if alpha is None:
+        alpha = np.full((height, width, 1), 255, dtype=np.uint8)
+    return np.concatenate((rgb, alpha), axis=2)
+
+
+def encode_png(pixels: np.ndarray, compress_level: int = 6) -> bytes:
+    ''' Encode an uint8 (height, width, 4) RGBA array (first row at the top). '''
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width, channels = pixels.shape
+    if channels != 4:
+        raise PNGError("Expected RGBA pixels")
+
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+    return b''.join((
+        PNG_SIGNATURE,
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, RGBA, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level)),
+        chunk(b'IEND', b''),
+    ))
+
+
+def write_png(filepath: str | Path, pixels: np.ndarray, compress_level: int = 6) -> None:
+    with open(filepath, 'wb') as png_file:
+        png_file.write(encode_png(pixels, compress_level))
@@ -0,0 +1,157 @@
+''' Thumbnails without bpy: decode to NumPy, downscale with an area average, write a PNG.
+
+    Doesn't touch 'bpy.data' so it can run in worker threads or processes, or standalone:
+        python thumbnail.py <input> <output> [<input> <output> ...]
+    which prints a line per thumbnail, as soon as it is done: 'OK <tab> output' or 'ERROR <tab> output <tab> error'.
+    PNG files are decoded with 'png.py', JPEG files need PIL (if it is not available, raises ThumbnailError).
+    Images bigger than 'MAX_PIXELS' are left to bpy, decoding them here takes too much time and memory.
+'''
+from pathlib import Path
+import sys
+
+import numpy as np
+
+try:
+    from .png import read_png, read_png_size, write_png, PNGError
+except ImportError:
+    # Standalone.
+    from png import read_png, read_png_size, write_png, PNGError
+
+
+THUMBNAIL_SIZE = 92, 92
+
+# Bigger images are not supported (see 'is_supported').
+MAX_PIXELS = 2048 * 2048
+
+# Input rows converted to float at once while downscaling.
+DOWNSCALE_BAND_ROWS = 256
+
+PNG_EXTENSIONS = {'.png'}
+JPEG_EXTENSIONS = {'.jpg', '.jpeg'}
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def has_pil() -> bool:
+    try:
+        import PIL.Image
+    except ImportError:
+        return False
+    return True
+
+
+def get_image_size(filepath: str | Path) -> tuple[int, int]:
+    ''' (width, height) of the image, without decoding it. '''
+    ext = Path(filepath).suffix.lower()
+    if ext in PNG_EXTENSIONS:
+        try:
+            return read_png_size(filepath)
+        except PNGError as e:
+            raise ThumbnailError(str(e)) from e
+    if ext in JPEG_EXTENSIONS:
+        try:
+            from PIL import Image as PILImage
+        except ImportError as e:
+            raise ThumbnailError("JPEG images need PIL") from e
+        # Only reads the header.
+        with PILImage.open(filepath) as image:
+            return image.size
+    raise ThumbnailError(f"Unsupported image format '{ext}'")
+
+
+def is_supported(filepath: str | Path) -> bool:
+    ''' Images of a supported format, whose size is not bigger than 'MAX_PIXELS'. '''
+    ext = Path(filepath).suffix.lower()
+    if not (ext in PNG_EXTENSIONS or (ext in JPEG_EXTENSIONS and has_pil())):
+        return False
+    try:
+        width, height = get_image_size(filepath)
+    except (ThumbnailError, OSError):
+        # Unreadable, let the caller deal with it.
+        return False
+    return width * height <= MAX_PIXELS
+
+
+def read_image(filepath: str | Path) -> np.ndarray:
+    ''' Decode the image into an uint8 (height, width, 4) RGBA array, first row at the top. '''
+    ext = Path(filepath).suffix.lower()
+    if ext in PNG_EXTENSIONS:
+        try:
+            return read_png(filepath)
+        except PNGError as e:
+            raise ThumbnailError(str(e)) from e
+    if ext in JPEG_EXTENSIONS:
+        try:
+            from PIL import Image as PILImage
+        except ImportError as e:
+            raise ThumbnailError("JPEG images need PIL") from e
+        with PILImage.open(filepath) as image:
+            return np.asarray(image.convert('RGBA'))
+    raise ThumbnailError(f"Unsupported image format '{ext}'")
+
+
+def _area_weights(in_size: int, out_size: int) -> np.ndarray:
+    ''' (out_size, in_size) matrix with the coverage of every input pixel by every output pixel, rows sum 1. '''
+    scale = in_size / out_size
+    starts = np.arange(out_size) * scale
+    ends = starts + scale
+    pixels = np.arange(in_size)
+    coverage = np.clip(np.minimum(ends[:, None], pixels[None, :] + 1) - np.maximum(starts[:, None], pixels[None, :]), 0.0, None)
+    return (coverage / scale).astype(np.float32)
+
+
+def downscale(pixels: np.ndarray, size: tuple[int, int] = THUMBNAIL_SIZE) -> np.ndarray:
+    ''' Fit the RGBA pixels in 'size' (width, height) keeping the aspect ratio, with an area average.
+        Images that already fit are returned as they are. '''
+    height, width = pixels.shape[:2]
+    scale = min(size[0] / width, size[1] / height)
+    if scale >= 1.0:
+        return pixels
+    out_w, out_h = max(1, round(width * scale)), max(1, round(height * scale))
+
+    weights_y = _area_weights(height, out_h)
+    weights_x = _area_weights(width, out_w)
+
+    # A band of rows at a time, so there is no float copy of the whole image.
+    out = np.zeros((out_h, out_w, 4), dtype=np.float32)
+    for y in range(0, height, DOWNSCALE_BAND_ROWS):
+        # Average with premultiplied alpha so transparent pixels don't bleed their color.
+        rgba = pixels[y:y + DOWNSCALE_BAND_ROWS].astype(np.float32) / 255.0
+        rgba[..., :3] *= rgba[..., 3:]
+        out += np.einsum('oy,yxc,px->opc', weights_y[:, y:y + DOWNSCALE_BAND_ROWS], rgba, weights_x, optimize=True)
+
+    alpha = out[..., 3:]
+    np.divide(out[..., :3], alpha, out=out[..., :3], where=alpha > 0)
+    return (np.clip(out, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+def make_thumbnail(in_image_path: str | Path, out_image_path: str | Path, size: tuple[int, int] = THUMBNAIL_SIZE) -> str:
+    ''' Returns the output path. Raises ThumbnailError if the image could not be read, or is too big. '''
+    try:
+        width, height = get_image_size(in_image_path)
+        if width * height > MAX_PIXELS:
+            raise ThumbnailError(f"Image is too big ({width}x{height})")
+        pixels = read_image(in_image_path)
+    except OSError as e:
+        raise ThumbnailError(str(e)) from e
+    write_png(out_image_path, downscale(pixels, size))
+    return str(out_image_path)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if not args or len(args) % 2 != 0:
+        print("Usage: python thumbnail.py <input> <output> [<input> <output> ...]")
+        sys.exit(2)
+    failed = 0
+    for in_path, out_path in zip(args[::2], args[1::2]):
+        try:
+            make_thumbnail(in_path, out_path)
+        except (ThumbnailError, PNGError, OSError, MemoryError) as e:
+            print(f"ERROR\t{out_path}\t{e}", flush=True)
+            failed += 1
+        else:
+            print(f"OK\t{out_path}", flush=True)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,60 @@
+''' Search index tests. They need Blender's Python ('bpy'), e.g.:
+    blender -b --python-expr "import pytest; pytest.main(['tests'])"
+'''
+import pytest
+
+pytest.importorskip('bpy')
+
+from brush_manager.data.search import SearchIndex, is_one_edit  # noqa: E402
+
+
+@pytest.fixture
+def search_index() -> SearchIndex:
+    search_index = SearchIndex()
+    search_index.add_entry('draw', 'BRUSH', 'Draw', 'DRAW', ())
+    search_index.add_entry('draw_sharp', 'BRUSH', 'Draw Sharp', 'DRAW_SHARP', ('hard',))
+    search_index.add_entry('clay_strips', 'BRUSH', 'Clay Strips', 'CLAY_STRIPS', ())
+    search_index.add_entry('wrinkle', 'BRUSH', 'Skin Wrinkle', 'CREASE', ('skin',))
+    search_index.add_entry('noise', 'TEXTURE', 'Noise Clay', 'IMAGE', ())
+    return search_index
+
+
+@pytest.mark.parametrize('a, b', [('draww', 'draw'), ('wrnkle', 'wrinkle'), ('wrinkel', 'wrinkle'), ('clya', 'clay')])
+def test_is_one_edit(a, b):
+    assert is_one_edit(a, b)
+    assert is_one_edit(b, a)
+
+
+@pytest.mark.parametrize('a, b', [('draw', 'drawww'), ('clay', 'lcya'), ('sharp', 'shape')])
+def test_is_not_one_edit(a, b):
+    assert not is_one_edit(a, b)
+
+
+def test_ranking(search_index):
+    assert search_index.search('draw')[:2] == ['draw', 'draw_sharp']
+    assert search_index.search('clay') == ['clay_strips', 'noise']
+    assert search_index.search('clay', kind='TEXTURE') == ['noise']
+    assert search_index.search('skin') == ['wrinkle']
+
+
+@pytest.mark.parametrize('query, uuid', [('draww', 'draw'), ('wrnkle', 'wrinkle'), ('wrinkel', 'wrinkle'), ('skin wrnkle', 'wrinkle')])
+def test_fuzzy(search_index, query, uuid):
+    assert uuid in search_index.search(query)
+
+
+def test_several_words(search_index):
+    assert search_index.search('clay strips') == ['clay_strips']
+    assert search_index.search('strips clay') == ['clay_strips']
+    assert search_index.search('sharp dr') == ['draw_sharp']
+    assert search_index.search('draw zebra') == []
+
+
+def test_update_and_remove(search_index):
+    search_index.add_entry('draw', 'BRUSH', 'Zebra', 'DRAW', ())
+    assert search_index.search('zebra') == ['draw']
+    assert search_index.search('draw') == ['draw_sharp', 'draw']  # By type now.
+
+    for uuid in ('draw', 'draw_sharp', 'clay_strips', 'wrinkle', 'noise'):
+        search_index.remove_entry(uuid)
+    assert len(search_index) == 0
+    assert not search_index._postings and not search_index._vocabulary and not search_index._deletions